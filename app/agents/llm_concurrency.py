@@ -0,0 +1,144 @@
+# agents/llm_concurrency.py
+import os
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from groq import RateLimitError
+
+# --- Groq quota configuration (defaults match the free tier for openai/gpt-oss-120b) ---
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "8000"))
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "4"))
+
+# Rough token model used to reserve TPM budget before a call is made
+CHARS_PER_TOKEN = 4
+DEFAULT_COMPLETION_TOKENS = 300
+MAX_BACKOFF_SECONDS = 30.0
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], completion_tokens: int = DEFAULT_COMPLETION_TOKENS) -> int:
+    """Estimates prompt + completion tokens for a chat request."""
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return prompt_chars // CHARS_PER_TOKEN + completion_tokens
+
+
+class _LoopBound:
+    """Recreates asyncio primitives when used from a different event loop."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._loop = None
+        self._value = None
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._value = self._factory()
+        return self._value
+
+
+class TokenBucket:
+    """Async token bucket that refills continuously at `per_minute` tokens per minute."""
+
+    def __init__(self, per_minute: int, capacity: Optional[int] = None):
+        self.capacity = capacity or per_minute
+        self._rate = per_minute / 60.0
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = _LoopBound(asyncio.Lock)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Empties the bucket and blocks all acquirers for `seconds` (used on HTTP 429)."""
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._paused_until = max(self._paused_until, self._updated + seconds)
+
+    async def acquire(self, amount: int = 1) -> None:
+        amount = min(amount, self.capacity)
+        async with self._lock.get():
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self._rate)
+
+
+class GroqRateLimiter:
+    """
+    Bounds concurrent Groq calls with a semaphore and keeps them under the
+    requests-per-minute and tokens-per-minute quotas with two token buckets.
+    """
+
+    def __init__(self, rpm: int = GROQ_RPM, tpm: int = GROQ_TPM, max_concurrency: int = GROQ_MAX_CONCURRENCY):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._semaphore = _LoopBound(lambda: asyncio.Semaphore(max_concurrency))
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int):
+        async with self._semaphore.get():
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+            yield
+
+    def pause(self, seconds: float) -> None:
+        self.requests.pause(seconds)
+        self.tokens.pause(seconds)
+
+
+def _retry_after_seconds(error: RateLimitError) -> Optional[float]:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+async def call_with_backoff(
+    create: Callable[..., Awaitable[Any]],
+    *,
+    messages: List[Dict[str, Any]],
+    limiter: Optional[GroqRateLimiter] = None,
+    max_retries: int = GROQ_MAX_RETRIES,
+    completion_tokens: int = DEFAULT_COMPLETION_TOKENS,
+    **kwargs: Any,
+) -> Any:
+    """
+    Runs one async chat completion inside a rate-limiter slot.
+    A 429 pauses the shared limiter (honouring Retry-After) and retries with jittered
+    exponential backoff, so concurrent callers wait instead of all falling back.
+    """
+    limiter = limiter or groq_rate_limiter
+    estimated = estimate_tokens(messages, completion_tokens)
+    attempt = 0
+    while True:
+        async with limiter.slot(estimated):
+            try:
+                return await create(messages=messages, **kwargs)
+            except RateLimitError as e:
+                if attempt >= max_retries:
+                    raise
+                delay = _retry_after_seconds(e) or min(2 ** attempt, MAX_BACKOFF_SECONDS)
+                delay *= 1 + random.random() * 0.25
+                limiter.pause(delay)
+                print(f"⚠ Groq rate limit hit. Backing off for {delay:.1f}s (attempt {attempt + 1}/{max_retries}).")
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+# Shared limiter: every agent draws from the same Groq quota
+groq_rate_limiter = GroqRateLimiter()
@@ -0,0 +1,333 @@
+# agents/llm_gateway.py
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from groq import (
+    Groq,
+    AsyncGroq,
+    DefaultHttpxClient,
+    DefaultAsyncHttpxClient,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+)
+from agents.llm_concurrency import call_with_backoff, GroqRateLimiter, groq_rate_limiter
+from utils.metrics import LLM_BREAKER_OPEN, LLM_CALLS, LLM_CALL_SECONDS, LLM_RETRIES, LLM_TOKENS
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Point the agents at another Groq-compatible server (e.g. a local stand-in); None = Groq's default
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+# --- Connection pool ---
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "3"))
+
+# --- Timeouts (seconds) per agent; LLM_TIMEOUT_<AGENT> overrides one agent ---
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "15"))
+AGENT_TIMEOUTS = {
+    "profile_reader": 30.0,  # batch parsing returns many profiles per call
+    "match_scorer": 12.0,
+    "red_flag": 12.0,
+    "wingman": 12.0,
+    "room_hunter": 8.0,      # short one-sentence reasons
+}
+
+# --- Latency budget (ms) of the AI endpoints; past it they answer with the rule-based result ---
+DEFAULT_LATENCY_BUDGET_MS = int(os.getenv("AI_LATENCY_BUDGET_MS", "3000"))
+MAX_LATENCY_BUDGET_MS = 60000
+
+# --- Retries on transient failures (timeouts, connection errors, 5xx); 429s are handled by call_with_backoff ---
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+TRANSIENT_ERRORS = (APITimeoutError, APIConnectionError, InternalServerError)
+
+# --- Circuit breaker ---
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+
+class LLMUnavailableError(Exception):
+    """Raised without calling Groq while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    closed -> open after `failure_threshold` transient failures in a row; while open every
+    call is rejected for `cooldown_seconds`; then a single trial call is let through
+    (half-open) and its outcome closes or re-opens the breaker. A trial that ends without
+    an outcome (cancelled) re-opens it too, so the next trial follows after another cool-down.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, cooldown_seconds: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            # Open and cooling down, or a trial call is already in flight
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_abandoned(self) -> None:
+        """The trial call ended without an outcome; without this no trial would ever be allowed again."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.opened}
+
+
+class _CallStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        succeeded = self.calls - self.errors
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected_by_breaker": self.rejected,
+            "avg_latency_ms": round(1000 * self.latency_seconds / self.calls, 1) if self.calls else 0.0,
+            "max_latency_ms": round(1000 * self.max_latency_seconds, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_total_tokens": round((self.prompt_tokens + self.completion_tokens) / succeeded, 1) if succeeded else 0.0,
+        }
+
+
+class LLMGateway:
+    """
+    Single entry point for every agent's Groq calls.
+    - one pooled keep-alive HTTP client (sync and async), shared by all agents
+    - a timeout per agent, and limited jittered retries on transient failures
+    - a circuit breaker: once Groq keeps failing, calls raise LLMUnavailableError at once,
+      so agents go straight to their rule-based path until the cool-down is over
+    - latency and token accounting per (agent, model)
+    Async calls also go through the shared rate limiter (call_with_backoff).
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = GROQ_API_KEY,
+        base_url: Optional[str] = GROQ_BASE_URL,
+        limiter: GroqRateLimiter = groq_rate_limiter,
+        breaker: Optional[CircuitBreaker] = None,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self._stats: Dict[Tuple[str, str], _CallStats] = defaultdict(_CallStats)
+        self._stats_lock = threading.Lock()
+
+        if not api_key:
+            self.client = None
+            self.async_client = None
+            return
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+        )
+        timeout = httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+        # Retries are done here, not by the SDK
+        self.client = Groq(
+            api_key=api_key, base_url=base_url, max_retries=0,
+            http_client=DefaultHttpxClient(limits=limits, timeout=timeout),
+        )
+        self.async_client = AsyncGroq(
+            api_key=api_key, base_url=base_url, max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=limits, timeout=timeout),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return self.client is not None
+
+    def timeout_for(self, agent: str) -> float:
+        override = os.getenv(f"LLM_TIMEOUT_{agent.upper()}")
+        return float(override) if override else AGENT_TIMEOUTS.get(agent, LLM_TIMEOUT_SECONDS)
+
+    # --- Accounting ---
+    def _record(self, agent: str, model: str, started: float, completion: Any = None, error: bool = False, retries: int = 0) -> None:
+        elapsed = time.perf_counter() - started
+        usage = getattr(completion, "usage", None)
+        prompt_tokens = (getattr(usage, "prompt_tokens", 0) or 0) if usage is not None else 0
+        completion_tokens = (getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+        LLM_CALLS.labels(agent, model, "error" if error else "success").inc()
+        LLM_CALL_SECONDS.labels(agent, model).observe(elapsed)
+        if retries:
+            LLM_RETRIES.labels(agent, model).inc(retries)
+        if prompt_tokens or completion_tokens:
+            LLM_TOKENS.labels(agent, model, "prompt").inc(prompt_tokens)
+            LLM_TOKENS.labels(agent, model, "completion").inc(completion_tokens)
+        with self._stats_lock:
+            stats = self._stats[(agent, model)]
+            stats.calls += 1
+            stats.errors += error
+            stats.retries += retries
+            stats.latency_seconds += elapsed
+            stats.max_latency_seconds = max(stats.max_latency_seconds, elapsed)
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+
+    def _reject(self, agent: str, model: str) -> LLMUnavailableError:
+        LLM_CALLS.labels(agent, model, "rejected").inc()
+        with self._stats_lock:
+            self._stats[(agent, model)].rejected += 1
+        return LLMUnavailableError(f"LLM circuit breaker is open; skipping the {agent} call")
+
+    def _retry_delay(self, attempt: int) -> float:
+        # Full jitter: a random delay up to the exponential cap
+        return random.uniform(0, LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+
+    # --- Calls ---
+    def complete(self, agent: str, **request: Any) -> Any:
+        """Sync chat completion for `agent`. Raises LLMUnavailableError while the breaker is open."""
+        if not self.client:
+            raise LLMUnavailableError("No GROQ_API_KEY configured")
+        model = request.get("model", "")
+        request.pop("completion_tokens", None)
+        if not self.breaker.allow():
+            raise self._reject(agent, model)
+        trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            return self._complete(agent, model, request)
+        except BaseException:
+            if trial:
+                self.breaker.record_abandoned()  # No-op once the trial's outcome is recorded
+            raise
+
+    def _complete(self, agent: str, model: str, request: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                completion = self.client.chat.completions.create(timeout=self.timeout_for(agent), **request)
+            except TRANSIENT_ERRORS:
+                if attempt < self.max_retries:
+                    time.sleep(self._retry_delay(attempt))
+                    attempt += 1
+                    continue
+                self.breaker.record_failure()
+                self._record(agent, model, started, error=True, retries=attempt)
+                raise
+            except Exception:
+                # Groq answered (e.g. 400 or an exhausted 429), so it is reachable
+                self.breaker.record_success()
+                self._record(agent, model, started, error=True, retries=attempt)
+                raise
+            self.breaker.record_success()
+            self._record(agent, model, started, completion, retries=attempt)
+            return completion
+
+    async def acomplete(self, agent: str, **request: Any) -> Any:
+        """Async chat completion for `agent`, rate-limited against the shared Groq quota."""
+        if not self.async_client:
+            raise LLMUnavailableError("No GROQ_API_KEY configured")
+        model = request.get("model", "")
+        if not self.breaker.allow():
+            raise self._reject(agent, model)
+        trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            return await self._acomplete(agent, model, request)
+        except BaseException:
+            # Also covers asyncio.CancelledError (client disconnects, cancelled score tasks)
+            if trial:
+                self.breaker.record_abandoned()  # No-op once the trial's outcome is recorded
+            raise
+
+    async def _acomplete(self, agent: str, model: str, request: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                completion = await call_with_backoff(
+                    self.async_client.chat.completions.create,
+                    limiter=self.limiter,
+                    timeout=self.timeout_for(agent),
+                    **request,
+                )
+            except TRANSIENT_ERRORS:
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self._retry_delay(attempt))
+                    attempt += 1
+                    continue
+                self.breaker.record_failure()
+                self._record(agent, model, started, error=True, retries=attempt)
+                raise
+            except Exception:
+                # Groq answered (e.g. 400 or an exhausted 429), so it is reachable
+                self.breaker.record_success()
+                self._record(agent, model, started, error=True, retries=attempt)
+                raise
+            self.breaker.record_success()
+            self._record(agent, model, started, completion, retries=attempt)
+            return completion
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            per_agent = {f"{agent}/{model}": stats.as_dict() for (agent, model), stats in self._stats.items()}
+        return {
+            "configured": self.configured,
+            "base_url": self.base_url or "default",
+            "breaker": self.breaker.stats(),
+            "agents": per_agent,
+        }
+
+
+# Shared gateway: every agent calls Groq through it
+llm_gateway = LLMGateway()
+LLM_BREAKER_OPEN.set_function(lambda: llm_gateway.breaker.state != CircuitBreaker.CLOSED)
+
+
+def gateway_for(api_key: Optional[str]) -> Optional[LLMGateway]:
+    """The gateway an agent built with `api_key` should use; None means offline."""
+    if not api_key:
+        return None
+    return llm_gateway if api_key == llm_gateway.api_key else LLMGateway(api_key=api_key)
@@ -1,35 +1,57 @@
 import os
 import re
 import json
-from typing import List, Dict, Any, Union
+import time
+import asyncio
+from enum import Enum
+from typing import AsyncIterator, List, Dict, Any, Optional, Union
 from pydantic import BaseModel
-from groq import Groq
-from db.mongo import get_profiles_collection
+from bson import ObjectId
+from db.mongo import get_profiles_collection, get_async_profiles_collection
 from routes.profiles.profiles_response_schemas import ProfileResponse
+from services.compatibility_engine import compatibility_engine
+from agents.llm_gateway import gateway_for
+from services.pair_score_cache import pair_score_cache
+from services.matchmaker import matchmaker
+from utils.metrics import AGENT_FALLBACKS, AGENT_PROVISIONAL, AGENT_REQUESTS
 
 # --- Result Schema ---
 class MatchResult(BaseModel):
     profile_id: str
     score: int
     reasons: List[str]
+    # True when the LLM stage missed the latency budget and this is the rule-based result
+    provisional: bool = False
+
+
+class MergeStrategy(str, Enum):
+    LLM = "llm"      # LLM score replaces the rule-based score
+    BLEND = "blend"  # Average of the rule-based and LLM scores
+    RULE = "rule"    # Keep the rule-based ranking, use the LLM's reasons
 
 # --- Main Agent ---
 class MatchScorerAgent:
     GROQ_MODEL = "openai/gpt-oss-120b"
+    # Bump whenever the scoring prompt changes so cached pair scores are not reused
+    PROMPT_VERSION = "v1"
+    DEFAULT_SHORTLIST_K = 20
+    LLM_AGENT = "match_scorer"
 
     def __init__(self):  # <-- fix here
-        if "GROQ_API_KEY" not in os.environ:
+        # Shared pooled client, timeouts and circuit breaker; None means rule-based only
+        self.llm = gateway_for(os.environ.get("GROQ_API_KEY"))
+        if not self.llm:
             # We don't raise an error here to allow the fallback to work.
             print("⚠ GROQ_API_KEY not found. Agent will use fallback logic.")
-            self.client = None
-        else:
-            self.client = Groq(api_key=os.environ["GROQ_API_KEY"])
+        # LLM scoring calls that outlived their request; they still fill the pair cache
+        self._background: set = set()
 
     def _rule_based_fallback(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
         """
         A simple, rule-based scorer for use when the API is not available.
         This provides a graceful fallback and ensures the system doesn't crash.
         """
+        AGENT_FALLBACKS.labels(self.LLM_AGENT).inc()
         score = 0
         reasons = []
 
@@ -60,10 +82,8 @@ class MatchScorerAgent:
         
         return {"score": min(score, 100), "reasons": reasons}
 
-    def _score_profiles_llm(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Uses Groq LLM to compute a nuanced compatibility score and reasons.
-        """
+    def _scoring_messages(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Builds the chat messages for the LLM compatibility prompt."""
         system_prompt = """
         You are a Roommate Compatibility Analyst. Your task is to analyze two roommate profiles and determine their compatibility.
         Provide a single JSON object as your output. The JSON must contain a 'score' (an integer from 0 to 100) and a list of 'reasons' (strings) for that score.
@@ -72,25 +92,50 @@ class MatchScorerAgent:
         """
         
         user_prompt = f"""
-        Profile A: {json.dumps(profile_a, indent=2)}
+        Profile A: {json.dumps(profile_a, indent=2, default=str)}
         ---
-        Profile B: {json.dumps(profile_b, indent=2)}
+        Profile B: {json.dumps(profile_b, indent=2, default=str)}
         ---
         Based on these two profiles, what is the compatibility score out of 100?
         Provide the score and 2-3 key reasons in a JSON format.
         """
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    def _parse_llm_score(self, content: str) -> Dict[str, Any]:
+        """Ensure the LLM output is a valid number and list."""
+        llm_output = json.loads(content)
+        score = min(max(int(llm_output.get("score", 0)), 0), 100)
+        reasons = llm_output.get("reasons", [])
+        return {"score": score, "reasons": reasons}
+
+    def _score_profiles_llm(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Uses Groq LLM to compute a nuanced compatibility score and reasons.
+        """
+        chat_completion = self.llm.complete(
+            self.LLM_AGENT,
+            model=self.GROQ_MODEL,
+            messages=self._scoring_messages(profile_a, profile_b),
+            response_format={"type": "json_object"},
+            temperature=0.0,
+        )
+
+        return self._parse_llm_score(chat_completion.choices[0].message.content)
 
-        chat_completion = self.client.chat.completions.create(
+    async def _ascore_profiles_llm(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
+        """Async version of _score_profiles_llm, rate-limited against the shared Groq quota."""
+        chat_completion = await self.llm.acomplete(
+            self.LLM_AGENT,
             model=self.GROQ_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+            messages=self._scoring_messages(profile_a, profile_b),
             response_format={"type": "json_object"},
             temperature=0.0,
         )
 
-        return json.loads(chat_completion.choices[0].message.content)
+        return self._parse_llm_score(chat_completion.choices[0].message.content)
 
     def score_profiles(
         self, profile_a: Union[Dict[str, Any], ProfileResponse], profile_b: Dict[str, Any]
@@ -98,16 +143,18 @@ class MatchScorerAgent:
         """
         Compute compatibility score using a tiered approach: LLM first, then rule-based fallback.
         """
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
         profile_a_dict = profile_a.dict() if isinstance(profile_a, ProfileResponse) else profile_a
         
-        if self.client:
+        if self.llm:
             try:
-                # Tier 1: LLM-based scoring
-                llm_output = self._score_profiles_llm(profile_a_dict, profile_b)
-                # Ensure the LLM output is a valid number and list
-                score = min(max(int(llm_output.get("score", 0)), 0), 100)
-                reasons = llm_output.get("reasons", [])
-                return {"score": score, "reasons": reasons}
+                # Tier 1: LLM-based scoring, served from the pair cache when possible
+                cached = pair_score_cache.get(profile_a_dict, profile_b, self.GROQ_MODEL, self.PROMPT_VERSION)
+                if cached is not None:
+                    return cached
+                result = self._score_profiles_llm(profile_a_dict, profile_b)
+                pair_score_cache.set(profile_a_dict, profile_b, self.GROQ_MODEL, self.PROMPT_VERSION, result)
+                return result
             except Exception as e:
                 # Tier 2: Fallback to rule-based scoring on API failure
                 print(f"⚠ Groq API call failed for scoring: {e}. Falling back to rule-based logic.")
@@ -117,33 +164,245 @@ class MatchScorerAgent:
             print("⚠ No Groq client. Using rule-based scoring.")
             return self._rule_based_fallback(profile_a_dict, profile_b)
 
+    def _keep_in_background(self, tasks) -> None:
+        for task in tasks:
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def ascore_profiles(
+        self, profile_a: Union[Dict[str, Any], ProfileResponse], profile_b: Dict[str, Any], timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Async version of score_profiles. If the LLM score does not arrive within `timeout`,
+        the rule-based score is returned with "provisional": True and the call keeps
+        running in the background to fill the pair cache.
+        """
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
+        profile_a_dict = profile_a.dict() if isinstance(profile_a, ProfileResponse) else profile_a
+
+        if not self.llm:
+            return self._rule_based_fallback(profile_a_dict, profile_b)
+        if timeout is None:
+            return await self._ascore_profiles(profile_a_dict, profile_b)
+
+        task = asyncio.ensure_future(self._ascore_profiles(profile_a_dict, profile_b))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            print("⚠ LLM score missed the latency budget. Using rule-based score; the LLM score will be cached when ready.")
+            self._keep_in_background([task])
+            AGENT_PROVISIONAL.labels(self.LLM_AGENT).inc()
+            return {**self._rule_based_fallback(profile_a_dict, profile_b), "provisional": True}
+
+    async def _ascore_profiles(self, profile_a_dict: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
+        """Pair cache, then the LLM; rule-based on failure."""
+        try:
+            cached = await pair_score_cache.aget(profile_a_dict, profile_b, self.GROQ_MODEL, self.PROMPT_VERSION)
+            if cached is not None:
+                return cached
+            result = await self._ascore_profiles_llm(profile_a_dict, profile_b)
+            await pair_score_cache.aset(profile_a_dict, profile_b, self.GROQ_MODEL, self.PROMPT_VERSION, result)
+            return result
+        except Exception as e:
+            print(f"⚠ Groq API call failed for scoring: {e}. Falling back to rule-based logic.")
+            return self._rule_based_fallback(profile_a_dict, profile_b)
+
+    def _rule_based_shortlist(self, user_profile: Dict[str, Any], size: int) -> List[Dict[str, Any]]:
+        """
+        Stage 1: rule-based ranking of every candidate.
+        Served from the materialized match index when it is deep enough, otherwise
+        computed with one vectorized pass over the profiles collection.
+        """
+        if user_profile.get("id"):
+            indexed = matchmaker.get_matches(user_profile["id"], limit=size)
+            if indexed is not None:
+                return indexed
+
+        profiles_collection = get_profiles_collection()
+        candidates = profiles_collection.find({}, compatibility_engine.PROJECTION).sort("_id", 1)
+        return self._top_candidates(user_profile, candidates, size)
+
+    def _top_candidates(self, user_profile: Dict[str, Any], candidates, size: int) -> List[Dict[str, Any]]:
+        """Vectorised rule-based ranking of every candidate (CPU-bound)."""
+        encoded = compatibility_engine.encode(candidates)
+        return compatibility_engine.top_matches(
+            user_profile, encoded, top_n=size, exclude_id=user_profile.get("id")
+        )
+
+    def _fetch_candidates(self, profile_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Loads the full documents for a shortlist, keyed by string id."""
+        object_ids = [ObjectId(pid) if ObjectId.is_valid(pid) else pid for pid in profile_ids]
+        profiles_collection = get_profiles_collection()
+        return {str(doc["_id"]): doc for doc in profiles_collection.find({"_id": {"$in": object_ids}})}
+
+    async def _arule_based_shortlist(self, user_profile: Dict[str, Any], size: int) -> List[Dict[str, Any]]:
+        """Async version of _rule_based_shortlist."""
+        if user_profile.get("id"):
+            indexed = await matchmaker.aget_matches(user_profile["id"], limit=size)
+            if indexed is not None:
+                return indexed
+
+        profiles_collection = get_async_profiles_collection()
+        candidates = await profiles_collection.find({}, compatibility_engine.PROJECTION).sort("_id", 1).to_list(None)
+        # The numpy pass would block the event loop for every other request
+        return await asyncio.to_thread(self._top_candidates, user_profile, candidates, size)
+
+    async def _afetch_candidates(self, profile_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Async version of _fetch_candidates."""
+        object_ids = [ObjectId(pid) if ObjectId.is_valid(pid) else pid for pid in profile_ids]
+        profiles_collection = get_async_profiles_collection()
+        return {str(doc["_id"]): doc async for doc in profiles_collection.find({"_id": {"$in": object_ids}})}
+
+    def _merge(self, rule_match: Dict[str, Any], llm_score: Dict[str, Any], merge: MergeStrategy) -> MatchResult:
+        """Combines the stage-1 rule-based result with the stage-2 LLM result."""
+        if merge == MergeStrategy.BLEND:
+            score = round((rule_match["score"] + llm_score["score"]) / 2)
+        elif merge == MergeStrategy.RULE:
+            score = rule_match["score"]
+        else:
+            score = llm_score["score"]
+        return MatchResult(
+            profile_id=rule_match["profile_id"],
+            score=score,
+            reasons=llm_score["reasons"] or rule_match["reasons"],
+        )
+
     def get_best_matches(
-        self, user_profile: Union[Dict[str, Any], ProfileResponse], top_n: int = 5
+        self,
+        user_profile: Union[Dict[str, Any], ProfileResponse],
+        top_n: int = 5,
+        shortlist_k: int = DEFAULT_SHORTLIST_K,
+        merge: MergeStrategy = MergeStrategy.LLM,
     ) -> List[MatchResult]:
         """
         Returns top N recommended roommate profiles for the given user profile.
         Compares against ALL profiles in the database, skipping the user's own profile.
+
+        Two-stage retrieval: every candidate is ranked by the rule-based scorer, then only
+        the top max(shortlist_k, top_n) are re-scored by the LLM and merged according to
+        `merge`. shortlist_k=0 (or no Groq client) returns the rule-based ranking as is.
         """
         user_profile_dict = user_profile.dict() if isinstance(user_profile, ProfileResponse) else user_profile
 
-        profiles_collection = get_profiles_collection()
-        candidate_profiles = list(profiles_collection.find())
+        if not self.llm or shortlist_k <= 0:
+            if not self.llm:
+                print("⚠ No Groq client. Using rule-based scoring.")
+            shortlist = self._rule_based_shortlist(user_profile_dict, top_n)
+            return [MatchResult(**m) for m in shortlist]
+
+        shortlist = self._rule_based_shortlist(user_profile_dict, max(shortlist_k, top_n))
+        candidates = self._fetch_candidates([m["profile_id"] for m in shortlist])
 
         results: List[MatchResult] = []
+        for rule_match in shortlist:
+            candidate = candidates.get(rule_match["profile_id"])
+            if candidate is None:
+                continue  # Deleted between the two stages
+            llm_score = self.score_profiles(user_profile_dict, candidate)
+            results.append(self._merge(rule_match, llm_score, merge))
+
+        # Stable sort: ties keep the stage-1 order
+        results.sort(key=lambda x: x.score, reverse=True)
+        return results[:top_n]
+
+    async def aget_best_matches(
+        self,
+        user_profile: Union[Dict[str, Any], ProfileResponse],
+        top_n: int = 5,
+        shortlist_k: int = DEFAULT_SHORTLIST_K,
+        merge: MergeStrategy = MergeStrategy.LLM,
+        timeout: Optional[float] = None,
+    ) -> List[MatchResult]:
+        """
+        Async version of get_best_matches: the shortlist's LLM calls run concurrently
+        (bounded by the shared rate limiter), so the LLM stage costs about one round trip.
+
+        `timeout` is the latency budget of the whole call. If any LLM score is still
+        pending when it runs out, the rule-based top N is returned with provisional=True
+        and the pending calls keep running in the background to fill the pair cache.
+        """
+        started = time.monotonic()
+        user_profile_dict = user_profile.dict() if isinstance(user_profile, ProfileResponse) else user_profile
+
+        if not self.llm or shortlist_k <= 0:
+            shortlist = await self._arule_based_shortlist(user_profile_dict, top_n)
+            return [MatchResult(**m) for m in shortlist]
 
-        for candidate in candidate_profiles:
-            if str(candidate["_id"]) == user_profile_dict.get("id"):
-                continue  # Skip the user's own profile
-            score_data = self.score_profiles(user_profile_dict, candidate)
-            results.append(MatchResult(
-                profile_id=str(candidate["_id"]),
-                score=score_data["score"],
-                reasons=score_data["reasons"]
-            ))
+        shortlist = await self._arule_based_shortlist(user_profile_dict, max(shortlist_k, top_n))
+        candidates = await self._afetch_candidates([m["profile_id"] for m in shortlist])
+        shortlist = [m for m in shortlist if m["profile_id"] in candidates]
 
+        tasks = [
+            asyncio.ensure_future(self.ascore_profiles(user_profile_dict, candidates[m["profile_id"]]))
+            for m in shortlist
+        ]
+        remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+        if tasks:
+            try:
+                _, pending = await asyncio.wait(tasks, timeout=remaining)
+            except asyncio.CancelledError:
+                # The request went away before the budget ran out
+                for task in tasks:
+                    task.cancel()
+                raise
+            if pending:
+                print(f"⚠ {len(pending)} LLM scores missed the latency budget. Returning the rule-based ranking.")
+                self._keep_in_background(pending)
+                AGENT_PROVISIONAL.labels(self.LLM_AGENT).inc(len(pending))
+                return [MatchResult(**m, provisional=True) for m in shortlist[:top_n]]
+
+        results = [self._merge(m, task.result(), merge) for m, task in zip(shortlist, tasks)]
+
+        # Stable sort: ties keep the stage-1 order
         results.sort(key=lambda x: x.score, reverse=True)
         return results[:top_n]
 
+    async def astream_best_matches(
+        self,
+        user_profile: Union[Dict[str, Any], ProfileResponse],
+        top_n: int = 5,
+        shortlist_k: int = DEFAULT_SHORTLIST_K,
+        merge: MergeStrategy = MergeStrategy.LLM,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming version of aget_best_matches. Yields, in order:
+            {"event": "provisional", "matches": [...]}  rule-based top N, before any LLM call
+            {"event": "update", "match": {...}}        one per shortlisted candidate, as its LLM score arrives
+            {"event": "done", "matches": [...]}         the settled top N (same as aget_best_matches)
+        """
+        user_profile_dict = user_profile.dict() if isinstance(user_profile, ProfileResponse) else user_profile
+        use_llm = self.llm is not None and shortlist_k > 0
+
+        shortlist = await self._arule_based_shortlist(user_profile_dict, max(shortlist_k, top_n) if use_llm else top_n)
+        provisional = [MatchResult(**m) for m in shortlist[:top_n]]
+        yield {"event": "provisional", "matches": [m.dict() for m in provisional]}
+        if not use_llm:
+            yield {"event": "done", "matches": [m.dict() for m in provisional]}
+            return
+
+        candidates = await self._afetch_candidates([m["profile_id"] for m in shortlist])
+        shortlist = [m for m in shortlist if m["profile_id"] in candidates]
+
+        async def _score(position: int, rule_match: Dict[str, Any]):
+            llm_score = await self.ascore_profiles(user_profile_dict, candidates[rule_match["profile_id"]])
+            return position, self._merge(rule_match, llm_score, merge)
+
+        tasks = [asyncio.ensure_future(_score(i, m)) for i, m in enumerate(shortlist)]
+        results: List[Optional[MatchResult]] = [None] * len(shortlist)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                position, result = await next_done
+                results[position] = result
+                yield {"event": "update", "match": result.dict()}
+        finally:
+            # The client may disconnect mid-stream
+            for task in tasks:
+                task.cancel()
+
+        # Stable sort over the stage-1 order, as in aget_best_matches
+        settled = sorted(results, key=lambda x: x.score, reverse=True)[:top_n]
+        yield {"event": "done", "matches": [m.dict() for m in settled]}
+
 # --- Singleton instance ---
 match_scorer_agent: MatchScorerAgent | None = None
 try:
@@ -0,0 +1,283 @@
+# agents/offline_profile_parser.py
+import re
+import sys
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from models.profile import SleepSchedule, Cleanliness, NoiseTolerance, StudyHabits, FoodPref
+
+# Explicit mentions ("Tidy banda", "Quiet ok") outweigh hints ("party lover", "cook biryani")
+EXPLICIT = 2
+HINT = 1
+
+# Vocabulary: field -> enum member -> [(regex fragment, weight)]. Fragments are matched
+# case-insensitively on word boundaries; include Roman-Urdu phrasing seen in real ads.
+VOCABULARY: Dict[str, Dict[Any, List[Tuple[str, int]]]] = {
+    "sleep_schedule": {
+        SleepSchedule.NIGHT_OWL: [
+            (r"night owl", EXPLICIT),
+            (r"sleep(?:s|ing)?\s*(?:at\s*|around\s*)?(?:12|1|2|3|4)\s*(?::\d\d\s*)?am", EXPLICIT),
+            (r"late sleeper|stays? up late|der se (?:sota|soti|sona)|raat ko jaag(?:ta|ti|na)", EXPLICIT),
+        ],
+        SleepSchedule.EARLY_RISER: [
+            (r"early (?:riser|bird)|morning person|wakes? up early", EXPLICIT),
+            (r"sleep(?:s|ing)?\s*(?:at\s*|around\s*)?(?:8|9|10|11)\s*(?::\d\d\s*)?pm", EXPLICIT),
+            (r"jaldi (?:sota|soti|uth(?:ta|ti|na))|subah jaldi|fajr", HINT),
+        ],
+        SleepSchedule.FLEXIBLE: [
+            (r"sleep(?:s|ing)? flexible|flexible (?:sleep|timings?)", EXPLICIT),
+        ],
+    },
+    "cleanliness": {
+        Cleanliness.TIDY: [
+            (r"tidy(?: banda| with cheezain)?|clean freak|neat freak|very clean|super tidy|saaf suthra|safai pasand", EXPLICIT),
+            (r"(?:don'?t|do not|dont) like (?:gandey|gande|ganday) bartan|(?:don'?t|do not|dont) like messy kamra", EXPLICIT),
+        ],
+        Cleanliness.MESSY: [
+            (r"messy(?: banda| with cheezain| but easy-?going)?|a bit messy|(?:don'?t|dont) mind (?:the )?mess", EXPLICIT),
+            (r"relaxed about clean(?:ing|liness)|gandey bartan", HINT),
+        ],
+        Cleanliness.AVERAGE: [
+            (r"average(?: banda| with cheezain)?", EXPLICIT),
+        ],
+    },
+    "noise_tolerance": {
+        NoiseTolerance.QUIET: [
+            (r"quiet(?: ok| person| environment)?|need quiet|low noise|sukoon", EXPLICIT),
+            (r"no frequent guests|(?:don'?t|dont) like (?:zyada |ziada )?shor(?: sharaba)?|(?:don'?t|dont) like loud[\w ]*", EXPLICIT),
+            (r"focused student|serious type", HINT),
+        ],
+        NoiseTolerance.LOUD_OK: [
+            (r"loud ok|loud music|friends (?:often visit|over)|parties", EXPLICIT),
+            (r"party lover|shor sharaba", HINT),
+        ],
+        NoiseTolerance.MODERATE: [
+            (r"moderate(?: ok)?|dost kabhi kabhi (?:aatay|aate) hain|guests sometimes|occasional guests", EXPLICIT),
+            (r"chill banda", HINT),
+        ],
+    },
+    "study_habits": {
+        StudyHabits.ONLINE_CLASSES: [(r"online (?:classes|class|study)", EXPLICIT)],
+        StudyHabits.LATE_NIGHT: [(r"late[- ]night study|raat ko parh(?:ai|ta|ti)", EXPLICIT)],
+        StudyHabits.ROOM_STUDY: [(r"room study|study in (?:my |the )?room|kamre? (?:main|mein) parh(?:ai|ta|ti)|study on bed", EXPLICIT)],
+        StudyHabits.LIBRARY: [(r"library", EXPLICIT)],
+    },
+    "food_pref": {
+        FoodPref.NON_VEG: [
+            (r"non[- ]?veg(?:etarian)?", EXPLICIT),
+            (r"biryani|karahi|nihari|tikka|bbq|gosht|chicken|mutton|beef|meat", HINT),
+        ],
+        FoodPref.VEG: [(r"veg(?:etarian)?(?: only| food)?|sabzi|daal", EXPLICIT)],
+        FoodPref.FLEXIBLE: [
+            (r"food flexible|flexible with (?:khaana|khana)|kuch bhi kha", EXPLICIT),
+            (r"desi (?:khaana|khana)", HINT),
+        ],
+    },
+}
+
+DEFAULTS = {
+    "sleep_schedule": SleepSchedule.FLEXIBLE,
+    "cleanliness": Cleanliness.AVERAGE,
+    "noise_tolerance": NoiseTolerance.MODERATE,
+    "study_habits": StudyHabits.LIBRARY,
+    "food_pref": FoodPref.FLEXIBLE,
+}
+
+# Gazetteer: city -> known areas
+CITY_AREAS: Dict[str, List[str]] = {
+    "Islamabad": ["Bahria Town", "Blue Area", "F-6", "F-7", "F-8", "F-10", "F-11", "G-9", "G-10", "G-11", "G-13", "H-9", "I-8", "E-11"],
+    "Rawalpindi": ["Chandni Chowk", "Peshawar Road", "Saddar", "Satellite Town", "Bahria Town", "Commercial Market"],
+    "Karachi": ["Clifton", "DHA", "Gulshan-e-Iqbal", "Korangi", "Nazimabad", "North Nazimabad", "Gulistan-e-Johar", "PECHS", "Saddar"],
+    "Lahore": ["DHA", "Gulberg", "Johar Town", "Model Town", "Wapda Town", "Bahria Town", "Iqbal Town", "Faisal Town", "Township"],
+    "Faisalabad": ["D Ground", "Jaranwala Road", "Madina Town", "Peoples Colony", "Satiana Road"],
+    "Multan": ["Cantt", "Chowk Kumharanwala", "Gulgasht Colony", "Shah Rukn-e-Alam", "Bosan Road"],
+    "Peshawar": ["Hayatabad", "Kohat Road", "Saddar", "University Town", "Gulbahar"],
+    "Quetta": ["Jinnah Town", "Satellite Town", "Cantt"],
+    "Hyderabad": ["Latifabad", "Qasimabad", "Saddar"],
+    "Sialkot": ["Cantt", "Paris Road"],
+    "Gujranwala": ["Satellite Town", "Model Town"],
+}
+CITY_ALIASES = {
+    "isb": "Islamabad", "isl": "Islamabad", "pindi": "Rawalpindi", "rwp": "Rawalpindi",
+    "khi": "Karachi", "lhr": "Lahore", "fsd": "Faisalabad", "lyallpur": "Faisalabad", "psh": "Peshawar",
+}
+UNKNOWN_LOCATION = "Unknown"
+
+_UNITS = {"k": 1_000, "thousand": 1_000, "hazar": 1_000, "hazaar": 1_000, "lakh": 100_000, "lac": 100_000}
+_BUDGET_PATTERN = (
+    r"(?:budget|rent|kiraya|rs\.?|pkr)\s*(?:is\s*|of\s*|:\s*)?(?P<b1>\d[\d,]*(?:\.\d+)?)\s*(?P<u1>k|thousand|hazaa?r|lakh|lac)?\b"
+    r"|(?P<b2>\d[\d,]*(?:\.\d+)?)\s*(?P<u2>k|thousand|hazaa?r|lakh|lac|pkr|rs|rupees)\b"
+)
+
+
+def _split_alternatives(fragment: str) -> List[str]:
+    """Splits a regex fragment on its top-level `|`."""
+    parts, current, depth, i = [], "", 0, 0
+    while i < len(fragment):
+        char = fragment[i]
+        if char == "\\":
+            current += fragment[i:i + 2]
+            i += 2
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "|" and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+        i += 1
+    parts.append(current)
+    return parts
+
+
+def _first_chars(fragment: str) -> set:
+    """Characters a (vocabulary-style) fragment can start with."""
+    if fragment.startswith("(?:"):
+        depth = 0
+        for end, char in enumerate(fragment):
+            depth += (char == "(") - (char == ")")
+            if depth == 0:
+                break
+        return set().union(*(_first_chars(alt) for alt in _split_alternatives(fragment[3:end])))
+    if fragment.startswith("\\"):
+        return set("0123456789") if fragment[1] == "d" else {fragment[1]}
+    return {fragment[0]}
+
+
+class OfflineProfileParser:
+    """
+    Rule-based ad parser used when Groq is unavailable, rate-limited or failing.
+    Every vocabulary phrase, city, area and budget expression is compiled into one
+    regex, so each ad is parsed in a single left-to-right scan. Phrases are bucketed
+    by first character behind a lookahead, so at each word start only one bucket is
+    tried. Within a bucket longer phrases come first, so "don't like messy kamra" wins
+    over "messy" and "Peshawar Road" over "Peshawar".
+    Output always validates against ProfileCreate.
+    """
+
+    def __init__(self):
+        # (regex, kind, value, weight); kind is a profile field, "city", "area" or "budget"
+        terms: List[Tuple[str, str, Any, int]] = []
+        for field, options in VOCABULARY.items():
+            for member, fragments in options.items():
+                for fragment, weight in fragments:
+                    for alternative in _split_alternatives(fragment):
+                        terms.append((alternative, field, member.value, weight))
+
+        self.area_index: Dict[str, List[Tuple[str, str]]] = {}
+        for city, areas in CITY_AREAS.items():
+            terms.append((re.escape(city.lower()), "city", city, EXPLICIT))
+            for area in areas:
+                self.area_index.setdefault(area.lower(), []).append((city, area))
+        for alias, city in CITY_ALIASES.items():
+            terms.append((re.escape(alias), "city", city, EXPLICIT))
+        for key in self.area_index:
+            terms.append((re.escape(key).replace(r"\-", "[- ]?").replace(r"\ ", r"[- ]?"), "area", key, EXPLICIT))
+
+        # Most specific first; Python's alternation takes the first branch that matches
+        terms.sort(key=lambda term: len(term[0]), reverse=True)
+        buckets: Dict[str, List[str]] = {}
+        for i, (regex, _, _, _) in enumerate(terms):
+            first = _first_chars(regex)
+            if len(first) != 1:
+                raise ValueError(f"Vocabulary phrase must start with one fixed character: {regex!r}")
+            buckets.setdefault(first.pop(), []).append(rf"(?P<t{i}>{regex})(?![\w-])")
+
+        # The budget expression has several possible first characters, so it is tried last
+        terms.append((_BUDGET_PATTERN, "budget", None, EXPLICIT))
+        alternation = [f"(?={re.escape(char)})(?:{'|'.join(branches)})" for char, branches in buckets.items()]
+        alternation.append(f"(?P<t{len(terms) - 1}>{_BUDGET_PATTERN})")
+
+        self.terms = terms
+        # One shared start-of-word check, so the alternation is only tried where a word begins.
+        # Input is lowercased in parse(), which is faster than matching with IGNORECASE.
+        self.matcher = re.compile(r"(?<![\w-])(?:" + "|".join(alternation) + ")")
+
+    # --- Extraction helpers ---
+    @staticmethod
+    def _budget(match: re.Match) -> Optional[int]:
+        amount, unit = match.group("b1"), match.group("u1")
+        if amount is None:
+            amount, unit = match.group("b2"), match.group("u2")
+        try:
+            value = float(amount.replace(",", ""))
+        except ValueError:
+            return None
+        multiplier = _UNITS.get(unit or "", 1)
+        if multiplier == 1 and value < 1000:
+            # "budget 15" means 15k in practice
+            multiplier = 1000
+        return int(value * multiplier)
+
+    def _location(self, cities: List[str], areas: List[str]) -> Tuple[str, str]:
+        city = cities[0] if cities else None
+        for key in areas:
+            candidates = self.area_index[key]
+            for area_city, area in candidates:
+                if city is None or area_city == city:
+                    # An area that exists in several cities needs the city to disambiguate
+                    if city is None and len(candidates) > 1:
+                        break
+                    return area_city, area
+        return city or UNKNOWN_LOCATION, UNKNOWN_LOCATION
+
+    # --- Public API ---
+    def parse(self, text: str) -> Dict[str, Any]:
+        """Parses one ad into a dict that always validates against ProfileCreate."""
+        votes: Dict[str, Dict[str, int]] = {field: {} for field in VOCABULARY}
+        cities: List[str] = []
+        areas: List[str] = []
+        budget: Optional[int] = None
+
+        for match in self.matcher.finditer(text.lower()):
+            _, kind, value, weight = self.terms[int(match.lastgroup[1:])]
+            if kind == "city":
+                cities.append(value)
+            elif kind == "area":
+                areas.append(value)
+            elif kind == "budget":
+                if budget is None:
+                    budget = self._budget(match)
+            else:
+                # Dicts keep insertion order, so ties go to the first mention
+                votes[kind][value] = votes[kind].get(value, 0) + weight
+
+        city, area = self._location(cities, areas)
+        profile: Dict[str, Any] = {
+            "raw_profile_text": text,
+            "city": city,
+            "area": area,
+            "budget_PKR": budget or 0,  # 0 = not stated ("budget no issue")
+        }
+        for field, counts in votes.items():
+            profile[field] = max(counts, key=counts.get) if counts else DEFAULTS[field].value
+        return profile
+
+    def parse_many(self, texts: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Streaming bulk mode: lazily parses any iterable of ads (lists, files, generators)."""
+        parse = self.parse
+        for text in texts:
+            yield parse(text)
+
+
+# Singleton instance
+offline_parser = OfflineProfileParser()
+
+
+if __name__ == "__main__":
+    # python -m agents.offline_profile_parser ads.json  (run from app/)
+    # Accepts a JSON list of strings or of objects with `raw_profile_text`; prints NDJSON.
+    with open(sys.argv[1], encoding="utf-8") as f:
+        records = json.load(f)
+    texts = [r["raw_profile_text"] if isinstance(r, dict) else r for r in records]
+
+    started = time.perf_counter()
+    parsed = list(offline_parser.parse_many(texts))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    for profile in parsed:
+        print(json.dumps(profile, ensure_ascii=False))
+    print(f"✅ Parsed {len(parsed)} ads in {elapsed_ms:.1f} ms", file=sys.stderr)
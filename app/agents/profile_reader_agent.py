@@ -1,109 +1,53 @@
 import os
 import re
 import json
-from typing import Dict, Any, Optional
-from groq import Groq
+import asyncio
+from typing import Dict, Any, List, Optional
 from pydantic import ValidationError
 from models.profile import ProfileCreate, SleepSchedule, Cleanliness, NoiseTolerance, StudyHabits, FoodPref
+from agents.llm_gateway import gateway_for
+from agents.offline_profile_parser import offline_parser
+from services.profile_parse_cache import ProfileParseCache, PROFILE_CACHE_DB_PATH
+from utils.metrics import AGENT_FALLBACKS, AGENT_REQUESTS
 
-# --- Low-Bandwidth and Offline Alternative Imports ---
-import sqlite3
-import time
+# Ads packed into one LLM call by the batch parser
+PROFILE_PARSE_BATCH_SIZE = int(os.getenv("PROFILE_PARSE_BATCH_SIZE", "15"))
+# Rough completion size of one parsed profile, used to reserve tokens for batch calls
+TOKENS_PER_PARSED_PROFILE = 80
 
 # Groq Profile Reader Agent with Offline Capabilities
 class ProfileReaderAgent:
     PHONE_NUMBER_REGEX = r'(?:\+92|03)\s?[-]?\s?\d{2,3}\s?[-]?\d{7,8}'
+    LLM_AGENT = "profile_reader"
 
-    def __init__(self, api_key: str, model_name: str = "openai/gpt-oss-120b", cache_db_path: str = "profile_cache.db"):
-        if not api_key:
-            raise ValueError("❌ Groq API key not provided. Please set GROQ_API_KEY.")
-        self.client = Groq(api_key=api_key)
+    def __init__(self, api_key: Optional[str], model_name: str = "openai/gpt-oss-120b", cache_db_path: str = PROFILE_CACHE_DB_PATH):
+        # Shared pooled client, timeouts and circuit breaker; None means offline
+        self.llm = gateway_for(api_key)
+        if not self.llm:
+            print("⚠ No GROQ_API_KEY found. ProfileReaderAgent will use the offline parser.")
         self.model_name = model_name
         self.cache_db_path = cache_db_path
-        self._init_db()
-
-    def _init_db(self):
-        """Initializes the SQLite database for caching parsed profiles."""
-        conn = sqlite3.connect(self.cache_db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS parsed_profiles (
-                raw_text TEXT PRIMARY KEY,
-                parsed_json TEXT,
-                timestamp INTEGER
-            )
-        """)
-        conn.commit()
-        conn.close()
+        self.cache = ProfileParseCache(cache_db_path)
 
     def _get_from_cache(self, raw_ad_text: str) -> Optional[Dict[str, Any]]:
         """Retrieves a parsed profile from the cache if it exists."""
-        conn = sqlite3.connect(self.cache_db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT parsed_json FROM parsed_profiles WHERE raw_text = ?", (raw_ad_text,))
-        result = cursor.fetchone()
-        conn.close()
-        if result:
-            return json.loads(result[0])
-        return None
+        return self.cache.get(raw_ad_text)
 
     def _save_to_cache(self, raw_ad_text: str, parsed_profile: Dict[str, Any]):
         """Saves a newly parsed profile to the cache."""
-        conn = sqlite3.connect(self.cache_db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO parsed_profiles (raw_text, parsed_json, timestamp) VALUES (?, ?, ?)",
-            (raw_ad_text, json.dumps(parsed_profile), int(time.time()))
-        )
-        conn.commit()
-        conn.close()
+        self.cache.set(raw_ad_text, parsed_profile)
 
     def _rule_based_fallback(self, preprocessed_text: str) -> Dict[str, Any]:
-        """A simple, rule-based parser for use when the API fails."""
-        profile = {
-            "sleep_schedule": "Flexible",
-            "cleanliness": "Average",
-            "noise_tolerance": "Moderate",
-            "study_habits": "Library",
-            "food_pref": "Flexible"
-        }
-        text = preprocessed_text.lower()
-        
-        # Simple keyword matching for each category
-        if any(keyword in text for keyword in ["early bird", "wakes up early", "morning person"]):
-            profile["sleep_schedule"] = "Early Bird"
-        elif any(keyword in text for keyword in ["night owl", "stays up late", "late night"]):
-            profile["sleep_schedule"] = "Night Owl"
-
-        if any(keyword in text for keyword in ["neat freak", "very clean", "super tidy"]):
-            profile["cleanliness"] = "Very Clean"
-        elif any(keyword in text for keyword in ["a bit messy", "don't mind mess", "relaxed about cleaning"]):
-            profile["cleanliness"] = "A Bit Messy"
-
-        if any(keyword in text for keyword in ["quiet person", "need quiet", "low noise"]):
-            profile["noise_tolerance"] = "Low"
-        elif any(keyword in text for keyword in ["loud music", "parties", "friends over"]):
-            profile["noise_tolerance"] = "High"
-
-        if any(keyword in text for keyword in ["study a lot", "focus", "serious student"]):
-            profile["study_habits"] = "Quiet Room"
-        elif any(keyword in text for keyword in ["chill", "easygoing", "study on bed"]):
-            profile["study_habits"] = "Common Area"
-        
-        if any(keyword in text for keyword in ["vegetarian", "veg"]):
-            profile["food_pref"] = "Vegetarian Only"
-        elif any(keyword in text for keyword in ["eat out", "no cooking"]):
-            profile["food_pref"] = "Eats Out"
-        
-        return profile
+        """Offline parser, used when the API is unavailable or fails. Always yields valid enum values."""
+        return offline_parser.parse(preprocessed_text)
 
     def _preprocess(self, raw_ad_text: str) -> str:
         """Remove sensitive info like phone numbers, normalize text."""
         text = raw_ad_text.strip().lower()
         return re.sub(self.PHONE_NUMBER_REGEX, '', text).strip()
 
-    def _get_llm_response(self, preprocessed_text: str) -> Dict[str, Any]:
-        """Call Groq LLM and enforce JSON schema output using Enum values."""
+    def _llm_messages(self, preprocessed_text: str) -> List[Dict[str, str]]:
+        """Builds the chat messages that enforce JSON schema output using Enum values."""
         system_prompt = f"""
         You are a Senior Data Analyst parsing unstructured roommate advertisements from Pakistan.
 
@@ -129,20 +73,113 @@ class ProfileReaderAgent:
         The final and ONLY output must strictly match this schema:
         {ProfileCreate.schema_json(indent=2)}
         """
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Parse this messy ad text: {preprocessed_text}"},
+        ]
+
+    def _get_llm_response(self, preprocessed_text: str) -> Dict[str, Any]:
+        """Call Groq LLM and enforce JSON schema output using Enum values."""
+        chat_completion = self.llm.complete(
+            self.LLM_AGENT,
+            model=self.model_name,
+            messages=self._llm_messages(preprocessed_text),
+            response_format={"type": "json_object"},
+            temperature=0.0,
+        )
+        return json.loads(chat_completion.choices[0].message.content)
 
-        chat_completion = self.client.chat.completions.create(
+    async def _aget_llm_response(self, preprocessed_text: str) -> Dict[str, Any]:
+        """Async version of _get_llm_response, rate-limited against the shared Groq quota."""
+        chat_completion = await self.llm.acomplete(
+            self.LLM_AGENT,
             model=self.model_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Parse this messy ad text: {preprocessed_text}"},
-            ],
+            messages=self._llm_messages(preprocessed_text),
             response_format={"type": "json_object"},
             temperature=0.0,
         )
         return json.loads(chat_completion.choices[0].message.content)
 
+    def _batch_messages(self, preprocessed_texts: List[str]) -> List[Dict[str, str]]:
+        """Builds the chat messages for parsing several ads in one call."""
+        system_prompt = f"""
+        You are a Senior Data Analyst parsing unstructured roommate advertisements from Pakistan.
+
+        You will receive a JSON array of ads, each with an "index" and its "text".
+        Extract one structured roommate profile per ad.
+        ❌ Do NOT add commentary, ❌ Do NOT create new categories, ❌ Do NOT skip or merge ads.
+        ✅ Only return a valid JSON object of the form {{"profiles": [...]}}, one entry per ad,
+        each carrying the "index" of the ad it was parsed from.
+
+        Use these exact options only (case-sensitive):
+
+        * sleep_schedule: {[e.value for e in SleepSchedule]}
+        * cleanliness: {[e.value for e in Cleanliness]}
+        * noise_tolerance: {[e.value for e in NoiseTolerance]}
+        * study_habits: {[e.value for e in StudyHabits]}
+        * food_pref: {[e.value for e in FoodPref]}
+
+        If information is missing or ambiguous, pick the closest option or default:
+        - sleep_schedule → "Flexible"
+        - cleanliness → "Average"
+        - noise_tolerance → "Moderate"
+        - study_habits → "Library"
+        - food_pref → "Flexible"
+
+        Apart from "index", every entry must strictly match this schema:
+        {ProfileCreate.schema_json(indent=2)}
+        """
+        ads = [{"index": i, "text": text} for i, text in enumerate(preprocessed_texts)]
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Parse these messy ads: {json.dumps(ads, ensure_ascii=False)}"},
+        ]
+
+    async def _aparse_batch(self, preprocessed_texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Parses several ads with one LLM call. Returns one entry per text, in order;
+        an entry is None when the model skipped it or it failed validation.
+        """
+        try:
+            chat_completion = await self.llm.acomplete(
+                self.LLM_AGENT,
+                model=self.model_name,
+                messages=self._batch_messages(preprocessed_texts),
+                response_format={"type": "json_object"},
+                temperature=0.0,
+                completion_tokens=TOKENS_PER_PARSED_PROFILE * len(preprocessed_texts),
+            )
+            items = json.loads(chat_completion.choices[0].message.content).get("profiles", [])
+        except Exception as e:
+            print(f"⚠ Groq batch call failed for {len(preprocessed_texts)} ads: {e}.")
+            return [None] * len(preprocessed_texts)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(preprocessed_texts)
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index = item.pop("index", None)
+            if not isinstance(index, int) or not 0 <= index < len(results):
+                continue
+            try:
+                results[index] = ProfileCreate(**item).dict()
+            except ValidationError as ve:
+                print(f"⚠ Parsed ad {index} failed validation: {ve.errors()}")
+        return results
+
+    def _validated_fallback(self, preprocessed_text: str) -> Dict[str, Any]:
+        AGENT_FALLBACKS.labels(self.LLM_AGENT).inc()
+        rule_based_output = self._rule_based_fallback(preprocessed_text)
+        try:
+            validated_profile = ProfileCreate(**rule_based_output)
+            return validated_profile.dict()
+        except ValidationError as ve:
+            # This should not happen if rule-based logic is correct
+            raise ValueError(f"Fallback Schema Validation Error: {ve.errors()}")
+
     def parse_profile(self, raw_ad_text: str) -> Dict[str, Any]:
         """Main method: takes raw ad text and returns structured JSON using ProfileCreate schema."""
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
         preprocessed_text = self._preprocess(raw_ad_text)
         
         # 1. Check for cached response
@@ -150,7 +187,11 @@ class ProfileReaderAgent:
         if cached_profile:
             print("✅ Returning cached profile.")
             return cached_profile
-        
+
+        # Offline mode: the offline parser is the primary path
+        if not self.llm:
+            return self._validated_fallback(preprocessed_text)
+
         try:
             # 2. Try to get response from Groq API
             llm_output = self._get_llm_response(preprocessed_text)
@@ -163,26 +204,79 @@ class ProfileReaderAgent:
         except Exception as e:
             # 4. Graceful Fallback on API failure
             print(f"⚠ Groq API call failed: {e}. Falling back to rule-based parser.")
-            rule_based_output = self._rule_based_fallback(preprocessed_text)
-            
-            try:
-                # 5. Validate fallback output
-                validated_profile = ProfileCreate(**rule_based_output)
-                return validated_profile.dict()
-            except ValidationError as ve:
-                # This should not happen if rule-based logic is correct
-                raise ValueError(f"Fallback Schema Validation Error: {ve.errors()}")
+            # 5. Validate fallback output
+            return self._validated_fallback(preprocessed_text)
+
+    async def aparse_profile(self, raw_ad_text: str) -> Dict[str, Any]:
+        """Async version of parse_profile; SQLite cache I/O runs in a worker thread."""
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
+        preprocessed_text = self._preprocess(raw_ad_text)
+
+        cached_profile = await self.cache.aget(preprocessed_text)
+        if cached_profile:
+            print("✅ Returning cached profile.")
+            return cached_profile
+
+        if not self.llm:
+            return self._validated_fallback(preprocessed_text)
+
+        try:
+            llm_output = await self._aget_llm_response(preprocessed_text)
+            validated_profile = ProfileCreate(**llm_output)
+            await self.cache.aset(preprocessed_text, validated_profile.dict())
+            return validated_profile.dict()
+
+        except Exception as e:
+            print(f"⚠ Groq API call failed: {e}. Falling back to rule-based parser.")
+            return self._validated_fallback(preprocessed_text)
+
+
+    async def aparse_profiles(self, raw_ad_texts: List[str], batch_size: int = PROFILE_PARSE_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Batch version of aparse_profile. Texts are deduplicated after preprocessing, looked
+        up in the cache together, and the misses are packed `batch_size` ads per LLM call.
+        Returns one {"profile", "source", "error"} entry per input text, in input order;
+        source is "cache", "llm" or "fallback" (profile is None if even the fallback failed).
+        """
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc(len(raw_ad_texts))
+        preprocessed = [self._preprocess(text) for text in raw_ad_texts]
+        unique_texts = list(dict.fromkeys(preprocessed))
+
+        outcomes: Dict[str, Dict[str, Any]] = {
+            text: {"profile": profile, "source": "cache", "error": None}
+            for text, profile in (await self.cache.aget_many(unique_texts)).items()
+        }
+        misses = [text for text in unique_texts if text not in outcomes]
+
+        if self.llm:
+            batches = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+            batch_results = await asyncio.gather(*(self._aparse_batch(batch) for batch in batches))
+        else:
+            # Offline mode: every miss goes straight to the offline parser
+            batches, batch_results = [misses], [[None] * len(misses)]
+
+        parsed: Dict[str, Dict[str, Any]] = {}
+        for batch, results in zip(batches, batch_results):
+            for text, profile in zip(batch, results):
+                if profile is not None:
+                    parsed[text] = profile
+                    outcomes[text] = {"profile": profile, "source": "llm", "error": None}
+                    continue
+                # Only this ad falls back; the rest of its batch is unaffected
+                try:
+                    outcomes[text] = {"profile": self._validated_fallback(text), "source": "fallback", "error": None}
+                except ValueError as e:
+                    outcomes[text] = {"profile": None, "source": "fallback", "error": str(e)}
+        await self.cache.aset_many(parsed)
+
+        return [dict(outcomes[text]) for text in preprocessed]
 
 
-# Global agent instance for re-use across the app
+# Global agent instance for re-use across the app (uses the offline parser without a key)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 profile_reader: Optional[ProfileReaderAgent] = None
 
-if GROQ_API_KEY:
-    try:
-        profile_reader = ProfileReaderAgent(api_key=GROQ_API_KEY)
-    except Exception as e:
-        print(f"⚠ Failed to initialize Groq Agent: {e}")
-else:
-    print("⚠ No GROQ_API_KEY found. AI parsing will not work.")
-    # Initialize a dummy agent for testing fallback logic without API key
\ No newline at end of file
+try:
+    profile_reader = ProfileReaderAgent(api_key=GROQ_API_KEY)
+except Exception as e:
+    print(f"⚠ Failed to initialize Profile Reader Agent: {e}")
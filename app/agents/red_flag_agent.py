@@ -1,8 +1,12 @@
 import os
 import re
 import json
-from typing import Dict, Any, Optional
-from groq import Groq
+import asyncio
+from typing import Dict, Any, List, Optional
+from agents.llm_gateway import gateway_for
+from services.conflict_engine import conflict_engine
+from services.pair_score_cache import red_flag_cache
+from utils.metrics import AGENT_FALLBACKS, AGENT_PROVISIONAL, AGENT_REQUESTS
 
 # ----------------------------
 # Global Groq API key check
@@ -34,14 +38,17 @@ CONFLICT_OUTPUT_SCHEMA = {
 class RedFlagAgent:
     """
     Detect potential roommate conflicts between two profiles using Groq LLM with a rule-based fallback.
+    LLM results are cached per unordered pair of profile contents.
     """
+    # Bump whenever the prompt changes so cached red flags are not reused
+    PROMPT_VERSION = "v1"
+    LLM_AGENT = "red_flag"
 
     def __init__(self, api_key: Optional[str] = GROQ_API_KEY, model_name: str = "openai/gpt-oss-120b"):
-        if not api_key:
-            self.client = None
-        else:
-            self.client = Groq(api_key=api_key)
+        # Shared pooled client, timeouts and circuit breaker; None means rule-based only
+        self.llm = gateway_for(api_key)
         self.model_name = model_name
+        self._inflight: Dict[str, asyncio.Task] = {}
 
     def _get_system_prompt(self) -> str:
         """System prompt guiding LLM to output strictly structured conflict JSON."""
@@ -55,117 +62,143 @@ class RedFlagAgent:
             "- HIGH: Dealbreaker, significant daily discomfort (Sleep, Major Cleanliness, Budget>30%)\n"
             "- MEDIUM: Manageable friction (Study, Food, Noise mismatches)\n"
             "- LOW: Minor nuisance (small differences)\n\n"
-            "Compare fields: Sleep, Cleanliness, Noise, Study, Food, Budget. Evidence must be concise."
+            "Compare fields: Sleep, Cleanliness, Noise, Study, Food, Budget. Evidence must be concise "
+            "and must not refer to the profiles as A or B."
         )
 
     def _rule_based_fallback(self, pair_id: str, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
-        """A simple, rule-based conflict detector for when the API is not available."""
-        red_flags = []
-        
-        # Conflict 1: Sleep Schedule
-        if (profile_a.get("sleep_schedule") == "Early Bird" and profile_b.get("sleep_schedule") == "Night Owl") or \
-           (profile_a.get("sleep_schedule") == "Night Owl" and profile_b.get("sleep_schedule") == "Early Bird"):
-            red_flags.append({
-                "type": "Sleep Schedule Mismatch",
-                "severity": "HIGH",
-                "evidence": "One is an Early Bird, the other is a Night Owl."
-            })
-
-        # Conflict 2: Cleanliness
-        if (profile_a.get("cleanliness") == "Very Clean" and profile_b.get("cleanliness") == "A Bit Messy") or \
-           (profile_a.get("cleanliness") == "A Bit Messy" and profile_b.get("cleanliness") == "Very Clean"):
-            red_flags.append({
-                "type": "Cleanliness Mismatch",
-                "severity": "HIGH",
-                "evidence": "One is a neat freak, the other is relaxed about cleanliness."
-            })
-        
-        # Conflict 3: Noise Tolerance
-        if (profile_a.get("noise_tolerance") == "Low" and profile_b.get("noise_tolerance") == "High") or \
-           (profile_a.get("noise_tolerance") == "High" and profile_b.get("noise_tolerance") == "Low"):
-            red_flags.append({
-                "type": "Noise Tolerance Mismatch",
-                "severity": "MEDIUM",
-                "evidence": "One prefers quiet, the other tolerates noise."
-            })
-
-        # Conflict 4: Study Habits
-        if (profile_a.get("study_habits") == "Quiet Room" and profile_b.get("study_habits") == "Common Area") or \
-           (profile_a.get("study_habits") == "Common Area" and profile_b.get("study_habits") == "Quiet Room"):
-            red_flags.append({
-                "type": "Study Habits Mismatch",
-                "severity": "MEDIUM",
-                "evidence": "One needs a quiet room to study, the other is fine with a common area."
-            })
-        
-        # Conflict 5: Budget
-        budget_diff_pkr = abs(profile_a.get("budget_PKR", 0) - profile_b.get("budget_PKR", 0))
-        if budget_diff_pkr > 30000:
-            red_flags.append({
-                "type": "Budget Mismatch",
-                "severity": "HIGH",
-                "evidence": f"Budgets differ by more than {budget_diff_pkr} PKR."
-            })
-        elif budget_diff_pkr > 10000:
-            red_flags.append({
-                "type": "Budget Mismatch",
-                "severity": "MEDIUM",
-                "evidence": f"Budgets differ by more than {budget_diff_pkr} PKR."
-            })
-            
-        return {"pair_id": pair_id, "red_flags": red_flags}
+        """Rule-based conflict detector (severity lookup tables) for when the API is not available."""
+        AGENT_FALLBACKS.labels(self.LLM_AGENT).inc()
+        return {"pair_id": pair_id, "red_flags": conflict_engine.detect(profile_a, profile_b)}
+
+    def _build_request(self, pair_id: str, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
+        """Builds the chat completion arguments (messages + forced tool call)."""
+        system_prompt = self._get_system_prompt()
+        user_prompt = (
+            f"--- Profile A ---\n{json.dumps(profile_a)}\n\n"
+            f"--- Profile B ---\n{json.dumps(profile_b)}\n\n"
+            f"Analyze conflicts and return a JSON object with 'pair_id': '{pair_id}' "
+            f"and structured 'red_flags' list."
+        )
+
+        tool = {
+            "type": "function",
+            "function": {
+                "name": "return_conflicts",
+                "description": "Returns structured red flags for roommate conflicts.",
+                "parameters": CONFLICT_OUTPUT_SCHEMA,
+            },
+        }
+
+        return {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "tools": [tool],
+            "tool_choice": {"type": "function", "function": {"name": "return_conflicts"}},
+            "temperature": 0.0,
+        }
+
+    def _parse_tool_call(self, chat_completion) -> Optional[Dict[str, Any]]:
+        """Returns the tool arguments, or None if the LLM did not call the tool."""
+        tool_calls = chat_completion.choices[0].message.tool_calls
+        if not tool_calls:
+            print("⚠ LLM did not call tool. Using rule-based fallback.")
+            return None
+
+        function_args_str = tool_calls[0].function.arguments
+        return json.loads(function_args_str)
+
+    def _cached_result(self, pair_id: str, cached: Dict[str, Any]) -> Dict[str, Any]:
+        # Cache entries are shared by A vs B and B vs A; the pair_id is the caller's
+        return {"pair_id": pair_id, "red_flags": list(cached["red_flags"])}
 
     def detect_conflicts(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
         """Main method: Takes two profiles and returns structured red-flag JSON."""
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
         pair_id = f"{profile_a.get('id', 'P-A')}_{profile_b.get('id', 'P-B')}"
         
         # Check if Groq client is available
-        if not self.client:
+        if not self.llm:
             print("⚠ Groq client not initialized. Using rule-based fallback.")
             return self._rule_based_fallback(pair_id, profile_a, profile_b)
+
+        cached = red_flag_cache.get(profile_a, profile_b, self.model_name, self.PROMPT_VERSION)
+        if cached is not None:
+            return self._cached_result(pair_id, cached)
         
         # Attempt to use the Groq API
         try:
-            system_prompt = self._get_system_prompt()
-            user_prompt = (
-                f"--- Profile A ---\n{json.dumps(profile_a)}\n\n"
-                f"--- Profile B ---\n{json.dumps(profile_b)}\n\n"
-                f"Analyze conflicts and return a JSON object with 'pair_id': '{pair_id}' "
-                f"and structured 'red_flags' list."
+            chat_completion = self.llm.complete(
+                self.LLM_AGENT,
+                **self._build_request(pair_id, profile_a, profile_b)
             )
+            result = self._parse_tool_call(chat_completion)
 
-            tool = {
-                "type": "function",
-                "function": {
-                    "name": "return_conflicts",
-                    "description": "Returns structured red flags for roommate conflicts.",
-                    "parameters": CONFLICT_OUTPUT_SCHEMA,
-                },
-            }
-
-            chat_completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                tools=[tool],
-                tool_choice={"type": "function", "function": {"name": "return_conflicts"}},
-                temperature=0.0,
-            )
-
-            tool_calls = chat_completion.choices[0].message.tool_calls
-            if not tool_calls:
-                # Fallback if LLM doesn't call the tool for some reason
-                print("⚠ LLM did not call tool. Using rule-based fallback.")
-                return self._rule_based_fallback(pair_id, profile_a, profile_b)
+        except Exception as e:
+            print(f"⚠ Groq API/Execution Error: {e}. Falling back to rule-based logic.")
+            result = None
 
-            function_args_str = tool_calls[0].function.arguments
-            return json.loads(function_args_str)
+        # Fallbacks are never cached: a temporary model problem must not outlive the request
+        if result is None:
+            return self._rule_based_fallback(pair_id, profile_a, profile_b)
+        red_flag_cache.set(profile_a, profile_b, self.model_name, self.PROMPT_VERSION, {"red_flags": result.get("red_flags", [])})
+        return result
 
+    async def _aresolve_conflicts(self, pair_id: str, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cache lookup, then one LLM call on a miss. Returns None if the LLM call failed or skipped the tool."""
+        cached = await red_flag_cache.aget(profile_a, profile_b, self.model_name, self.PROMPT_VERSION)
+        if cached is not None:
+            return cached
+        try:
+            chat_completion = await self.llm.acomplete(
+                self.LLM_AGENT,
+                **self._build_request(pair_id, profile_a, profile_b)
+            )
+            result = self._parse_tool_call(chat_completion)
         except Exception as e:
             print(f"⚠ Groq API/Execution Error: {e}. Falling back to rule-based logic.")
+            return None
+        if result is None:
+            return None
+        cached = {"red_flags": result.get("red_flags", [])}
+        await red_flag_cache.aset(profile_a, profile_b, self.model_name, self.PROMPT_VERSION, cached)
+        return cached
+
+    async def adetect_conflicts(
+        self, profile_a: Dict[str, Any], profile_b: Dict[str, Any], timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Async version of detect_conflicts, rate-limited against the shared Groq quota.
+        Concurrent requests for the same pair (in either order) share one lookup and LLM call.
+        If it does not finish within `timeout`, the rule-based result is returned with
+        "provisional": True and the call keeps running to fill the cache.
+        """
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
+        pair_id = f"{profile_a.get('id', 'P-A')}_{profile_b.get('id', 'P-B')}"
+
+        if not self.llm:
+            return self._rule_based_fallback(pair_id, profile_a, profile_b)
+
+        key = red_flag_cache.make_key(profile_a, profile_b, self.model_name, self.PROMPT_VERSION)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._aresolve_conflicts(pair_id, profile_a, profile_b))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # A cancelled (or timed out) waiter must not cancel the call the other waiters share
+        try:
+            cached = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            print("⚠ Red-flag LLM call is slow. Using rule-based result; the LLM result will be cached when ready.")
+            AGENT_PROVISIONAL.labels(self.LLM_AGENT).inc()
+            return {**self._rule_based_fallback(pair_id, profile_a, profile_b), "provisional": True}
+        if cached is None:
             return self._rule_based_fallback(pair_id, profile_a, profile_b)
+        return self._cached_result(pair_id, cached)
 
 # Global instance for reuse
 red_flag_agent: Optional[RedFlagAgent] = None
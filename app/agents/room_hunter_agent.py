@@ -1,31 +1,64 @@
 # agents/room_hunter_agent.py
 import os
 import json
-from typing import List, Dict, Any, Optional
+import math
+import time
+import asyncio
+from enum import Enum
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
-from groq import Groq
 from bson import ObjectId
-from db.mongo import get_housing_collection
+from db.mongo import get_housing_collection, get_async_housing_collection
+from db.geo import geo_point, distance_m, listing_coordinates
 from models.housing import Housing
+from agents.llm_gateway import gateway_for
+from utils.cache import LRUCache, content_hash
+from utils.metrics import AGENT_FALLBACKS, AGENT_PROVISIONAL, AGENT_REQUESTS
+
+REASON_CACHE_SIZE = int(os.getenv("ROOM_HUNTER_REASON_CACHE_SIZE", "5000"))
+REASON_CACHE_TTL_HOURS = float(os.getenv("ROOM_HUNTER_REASON_CACHE_TTL_HOURS", "24"))
+# How long a request waits for LLM reasons before answering with rule-based ones
+REASON_TIMEOUT_SECONDS = float(os.getenv("ROOM_HUNTER_REASON_TIMEOUT_SECONDS", "4"))
+
+class ScoringMode(str, Enum):
+    PIPELINE = "pipeline"  # Score inside MongoDB, only the top N listings are returned
+    PYTHON = "python"      # Load every available listing and score with score_listing
+
 
 # --- Agent ---
 class RoomHunterAgent:
     REQUIRED_AMENITIES = ["Security guard", "WiFi"]
+    OPTIONAL_FIELDS = ["sleep_schedule", "cleanliness", "noise_tolerance", "study_habits", "food_pref"]
+    PROFILE_FIELDS = ["city", "area", "budget_PKR", *OPTIONAL_FIELDS]
     GROQ_MODEL = "openai/gpt-oss-120b"
+    LLM_AGENT = "room_hunter"
     MAX_REASON_LENGTH = 500
+    # Distance term: DISTANCE_POINTS at the search point, decaying linearly to 0 at DISTANCE_RADIUS_KM
+    DISTANCE_POINTS = 20
+    DISTANCE_RADIUS_KM = 10.0
+    AVAILABLE = {"availability": "Available"}
+    # Listing fields needed to build the response and recompute reasons for the top N
+    LISTING_PROJECTION = {
+        "city": 1, "area": 1, "monthly_rent_PKR": 1, "rooms_available": 1, "amenities": 1,
+        "availability": 1, "latitude": 1, "longitude": 1,
+        **{field: 1 for field in OPTIONAL_FIELDS},
+    }
 
     def __init__(self, api_key: Optional[str] = os.getenv("GROQ_API_KEY")):
-        if not api_key:
+        # Shared pooled client, timeouts and circuit breaker; None means rule-based only
+        self.llm = gateway_for(api_key)
+        if not self.llm:
             print("⚠ No GROQ_API_KEY found. RoomHunterAgent will use a rule-based fallback for explanations.")
-            self.client = None
-        else:
-            self.client = Groq(api_key=api_key)
+        self.reason_cache = LRUCache("housing_reasons", maxsize=REASON_CACHE_SIZE, ttl_seconds=REASON_CACHE_TTL_HOURS * 3600)
+        self.reason_timeout = REASON_TIMEOUT_SECONDS
+        self._reason_tasks: Dict[str, asyncio.Task] = {}
 
-    def _generate_llm_reason(self, profile: Dict[str, Any], listing: Dict[str, Any], reasons: List[str]) -> str:
-        """Generates a human-friendly reason using an LLM."""
-        if not self.client:
-            return "; ".join(reasons)[:self.MAX_REASON_LENGTH]
+    def _rule_based_reason(self, reasons: List[str]) -> str:
+        AGENT_FALLBACKS.labels(self.LLM_AGENT).inc()
+        return "; ".join(reasons)[:self.MAX_REASON_LENGTH]
 
+    def _reason_messages(self, profile: Dict[str, Any], listing: Dict[str, Any], reasons: List[str]) -> List[Dict[str, str]]:
+        """Builds the chat messages for the one-sentence match reason."""
         profile_safe = {k: str(v) if isinstance(v, ObjectId) else v for k, v in profile.items()}
         listing_safe = {k: str(v) if isinstance(v, ObjectId) else v for k, v in listing.items()}
 
@@ -43,20 +76,92 @@ class RoomHunterAgent:
             "Generate a one-sentence summary explaining why this listing is a great match. "
             "Start the sentence with 'This listing is a great match because...'"
         )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    def _reason_key(self, profile: Dict[str, Any], listing: Dict[str, Any], reasons: List[str]) -> str:
+        """Cache key: listing content, the profile fields that drive scoring, the reasons and the model."""
+        return content_hash([
+            {field: listing.get(field) for field in self.LISTING_PROJECTION},
+            {field: profile.get(field) for field in self.PROFILE_FIELDS},
+            reasons,
+            self.GROQ_MODEL,
+        ])
+
+    def _generate_llm_reason(self, profile: Dict[str, Any], listing: Dict[str, Any], reasons: List[str]) -> str:
+        """Generates a human-friendly reason using an LLM."""
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
+        if not self.llm:
+            return self._rule_based_reason(reasons)
+
+        key = self._reason_key(profile, listing, reasons)
+        cached = self.reason_cache.get(key)
+        if cached is not None:
+            return cached
 
         try:
-            chat_completion = self.client.chat.completions.create(
+            chat_completion = self.llm.complete(
+                self.LLM_AGENT,
                 model=self.GROQ_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
+                messages=self._reason_messages(profile, listing, reasons),
                 temperature=0.0,
             )
-            return chat_completion.choices[0].message.content
         except Exception as e:
             print(f"⚠ LLM call failed: {e}. Falling back to rule-based reason.")
-            return "; ".join(reasons)[:self.MAX_REASON_LENGTH]
+            return self._rule_based_reason(reasons)
+        text = chat_completion.choices[0].message.content
+        self.reason_cache.set(key, text)
+        return text
+
+    async def _afill_reason(self, key: str, profile: Dict[str, Any], listing: Dict[str, Any], reasons: List[str]) -> Optional[str]:
+        """Fetches one LLM reason into the cache. Returns None if the call failed."""
+        try:
+            chat_completion = await self.llm.acomplete(
+                self.LLM_AGENT,
+                model=self.GROQ_MODEL,
+                messages=self._reason_messages(profile, listing, reasons),
+                temperature=0.0,
+            )
+        except Exception as e:
+            print(f"⚠ LLM call failed: {e}. Falling back to rule-based reason.")
+            return None
+        finally:
+            self._reason_tasks.pop(key, None)
+        text = chat_completion.choices[0].message.content
+        self.reason_cache.set(key, text)
+        return text
+
+    async def _agenerate_llm_reason(
+        self, profile: Dict[str, Any], listing: Dict[str, Any], reasons: List[str], timeout: Optional[float] = None
+    ) -> Tuple[str, bool]:
+        """
+        Async version of _generate_llm_reason, rate-limited against the shared Groq quota.
+        Identical requests share one in-flight call. If it does not finish within `timeout`
+        the rule-based reason is returned and the call keeps running to fill the cache.
+        Returns (reason, provisional); provisional means the LLM reason is still pending.
+        """
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
+        if not self.llm:
+            return self._rule_based_reason(reasons), False
+
+        key = self._reason_key(profile, listing, reasons)
+        cached = self.reason_cache.get(key)
+        if cached is not None:
+            return cached, False
+
+        task = self._reason_tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(self._afill_reason(key, profile, listing, reasons))
+            self._reason_tasks[key] = task
+        try:
+            text = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            print("⚠ LLM reason is slow. Using rule-based reason; the LLM reason will be cached when ready.")
+            AGENT_PROVISIONAL.labels(self.LLM_AGENT).inc()
+            return self._rule_based_reason(reasons), True
+        return (text, False) if text is not None else (self._rule_based_reason(reasons), False)
 
     def score_listing(self, profile: Dict[str, Any], listing: Dict[str, Any]) -> Dict[str, Any]:
         """Rule-based scoring for a single listing."""
@@ -78,7 +183,7 @@ class RoomHunterAgent:
             reasons.append(f"Different area ({listing.get('area')})")
 
         # Budget check
-        if profile.get("budget_PKR", 0) >= listing.get("monthly_rent_PKR", 0):
+        if self._budget(profile) >= listing.get("monthly_rent_PKR", 0):
             score += 25
             reasons.append("Within budget")
         else:
@@ -91,8 +196,7 @@ class RoomHunterAgent:
             reasons.append(f"Amenities matched: {', '.join(matched_amenities)}")
 
         # Optional preferences
-        optional_fields = ["sleep_schedule", "cleanliness", "noise_tolerance", "study_habits", "food_pref"]
-        for field in optional_fields:
+        for field in self.OPTIONAL_FIELDS:
             profile_value = profile.get(field)
             listing_value = listing.get(field)
             if profile_value and listing_value:
@@ -104,43 +208,249 @@ class RoomHunterAgent:
 
         return {"score": score, "reasons": list(dict.fromkeys(reasons))}
 
-    def get_top_housing_matches(self, profiles: List[Dict[str, Any]], top_n: int = 3) -> List[Housing]:
-        """Return top N housing listings for given profiles."""
-        housing_collection = get_housing_collection()
-        listings = list(housing_collection.find({"availability": "Available"}))
-
-        scored_listings = []
-        for listing in listings:
-            total_score = 0
-            combined_reasons = []
-            for profile in profiles:
-                res = self.score_listing(profile, listing)
-                total_score += res["score"]
-                combined_reasons.extend(res["reasons"])
-            scored_listings.append({"listing": listing, "score": total_score, "reasons": combined_reasons})
+    @staticmethod
+    def _budget(profile: Dict[str, Any]) -> float:
+        """The profile's budget; anything but a number (request bodies are free-form) counts as 0."""
+        budget = profile.get("budget_PKR", 0)
+        return budget if isinstance(budget, (int, float)) and not isinstance(budget, bool) else 0
+
+    # --- Server-side scoring ---
+    @staticmethod
+    def _equals(field: str, value: Any) -> Dict[str, Any]:
+        """Aggregation equivalent of `value == listing.get(field)` (a missing field equals None)."""
+        if isinstance(value, Enum):
+            value = value.value
+        if value is None:
+            return {"$lte": [f"${field}", None]}
+        # Profile values are user input: "$area" must not be read as a field path, nor a dict as an operator
+        return {"$eq": [f"${field}", {"$literal": value}]}
+
+    def _score_expression(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Aggregation expression that mirrors score_listing for one profile."""
+        terms: List[Any] = [
+            {"$cond": [self._equals("city", profile.get("city")), 30, 0]},
+            {"$cond": [self._equals("area", profile.get("area")), 25, 0]},
+            {"$cond": [{"$gte": [{"$literal": self._budget(profile)}, {"$ifNull": ["$monthly_rent_PKR", 0]}]}, 25, 0]},
+            {"$multiply": [10, {"$size": {"$setIntersection": [
+                {"$ifNull": ["$amenities", []]}, self.REQUIRED_AMENITIES
+            ]}}]},
+        ]
+        for field in self.OPTIONAL_FIELDS:
+            if profile.get(field):
+                terms.append({"$cond": [self._equals(field, profile.get(field)), 5, 0]})
+        return {"$add": terms}
 
+    def _distance_points(self, meters: float) -> int:
+        return math.floor(self.DISTANCE_POINTS * max(0.0, 1 - meters / (self.DISTANCE_RADIUS_KM * 1000)))
+
+    def _distance_expression(self) -> Dict[str, Any]:
+        """Aggregation equivalent of _distance_points on the $geoNear distance."""
+        fraction = {"$subtract": [1, {"$divide": ["$_distance_m", self.DISTANCE_RADIUS_KM * 1000]}]}
+        return {"$toInt": {"$floor": {"$multiply": [self.DISTANCE_POINTS, {"$max": [0, fraction]}]}}}
+
+    def _scoring_pipeline(
+        self, profiles: List[Dict[str, Any]], top_n: int, near: Optional[Tuple[float, float]] = None
+    ) -> List[Dict[str, Any]]:
+        terms = [self._score_expression(p) for p in profiles]
+        if near is None:
+            head = [{"$match": self.AVAILABLE}, {"$project": self.LISTING_PROJECTION}]
+        else:
+            # $geoNear must open the pipeline; listings without a location are skipped
+            head = [
+                {"$geoNear": {
+                    "near": geo_point(*near),
+                    "distanceField": "_distance_m",
+                    "key": "location",
+                    "spherical": True,
+                    "query": self.AVAILABLE,
+                }},
+                {"$project": {**self.LISTING_PROJECTION, "_distance_m": 1}},
+            ]
+            terms.append(self._distance_expression())
+        return head + [
+            {"$addFields": {"_score": {"$add": terms}}},
+            {"$sort": {"_score": -1, "_id": 1}},
+            {"$limit": top_n},
+        ]
+
+    def _with_reasons(
+        self, profiles: List[Dict[str, Any]], listing: Dict[str, Any], distance: Optional[float] = None
+    ) -> Dict[str, Any]:
+        total_score = 0
+        combined_reasons = []
+        for profile in profiles:
+            res = self.score_listing(profile, listing)
+            total_score += res["score"]
+            combined_reasons.extend(res["reasons"])
+        if distance is not None:
+            total_score += self._distance_points(distance)
+            combined_reasons.append(f"{distance / 1000:.1f} km away")
+        return {"listing": listing, "score": total_score, "reasons": combined_reasons, "distance_m": distance}
+
+    def _from_pipeline(self, profiles: List[Dict[str, Any]], docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Reasons are only needed for the top N, so they are rebuilt here rather than in Mongo."""
+        ranked = []
+        for doc in docs:
+            score = doc.pop("_score")
+            item = self._with_reasons(profiles, doc, doc.pop("_distance_m", None))
+            item["score"] = score
+            ranked.append(item)
+        return ranked
+
+    def _score_listings(
+        self,
+        profiles: List[Dict[str, Any]],
+        listings: List[Dict[str, Any]],
+        top_n: int,
+        near: Optional[Tuple[float, float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Python reference scorer; `listings` must be in _id order to break ties like the pipeline."""
+        if near is None:
+            scored_listings = [self._with_reasons(profiles, listing) for listing in listings]
+        else:
+            scored_listings = [
+                self._with_reasons(profiles, listing, distance_m(*near, *coords))
+                for listing in listings
+                if (coords := listing_coordinates(listing)) is not None
+            ]
         scored_listings.sort(key=lambda x: x["score"], reverse=True)
-        top_listings = scored_listings[:top_n]
+        return scored_listings[:top_n]
+
+    def _rank_listings(
+        self,
+        profiles: List[Dict[str, Any]],
+        top_n: int,
+        scoring_mode: ScoringMode = ScoringMode.PIPELINE,
+        near: Optional[Tuple[float, float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Scores every available listing against all profiles (and `near`, if given) and returns the top N."""
+        housing_collection = get_housing_collection()
+        if scoring_mode == ScoringMode.PYTHON:
+            listings = list(housing_collection.find(self.AVAILABLE).sort("_id", 1))
+            return self._score_listings(profiles, listings, top_n, near)
+        docs = list(housing_collection.aggregate(self._scoring_pipeline(profiles, top_n, near)))
+        return self._from_pipeline(profiles, docs)
+
+    async def _arank_listings(
+        self,
+        profiles: List[Dict[str, Any]],
+        top_n: int,
+        scoring_mode: ScoringMode = ScoringMode.PIPELINE,
+        near: Optional[Tuple[float, float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Async version of _rank_listings."""
+        housing_collection = get_async_housing_collection()
+        if scoring_mode == ScoringMode.PYTHON:
+            listings = await housing_collection.find(self.AVAILABLE).sort("_id", 1).to_list(None)
+            # Scoring every listing in Python is CPU-bound; keep it off the event loop
+            return await asyncio.to_thread(self._score_listings, profiles, listings, top_n, near)
+        docs = await housing_collection.aggregate(self._scoring_pipeline(profiles, top_n, near)).to_list(None)
+        return self._from_pipeline(profiles, docs)
+
+    # --- Proximity search ---
+    def _nearby_pipeline(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: Optional[float] = None,
+        limit: int = 20,
+        min_rent: Optional[int] = None,
+        max_rent: Optional[int] = None,
+        availability: Optional[str] = "Available",
+    ) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {}
+        if availability:
+            query["availability"] = availability
+        rent = {}
+        if min_rent is not None:
+            rent["$gte"] = min_rent
+        if max_rent is not None:
+            rent["$lte"] = max_rent
+        if rent:
+            query["monthly_rent_PKR"] = rent
+
+        geo_near = {
+            "near": geo_point(latitude, longitude),
+            "distanceField": "_distance_m",
+            "key": "location",
+            "spherical": True,
+            "query": query,
+        }
+        if radius_km is not None:
+            geo_near["maxDistance"] = radius_km * 1000
+        return [
+            {"$geoNear": geo_near},
+            {"$limit": limit},
+            {"$project": {**self.LISTING_PROJECTION, "_distance_m": 1}},
+        ]
+
+    async def anearby_listings(self, latitude: float, longitude: float, **filters: Any) -> List[Housing]:
+        """Nearest listings to a point (k-nearest, or within `radius_km`), closest first."""
+        housing_collection = get_async_housing_collection()
+        docs = await housing_collection.aggregate(self._nearby_pipeline(latitude, longitude, **filters)).to_list(None)
+        return [self._to_housing(doc, None, doc.pop("_distance_m")) for doc in docs]
+
+    def _to_housing(
+        self, listing: Dict[str, Any], reason_text: Optional[str], distance: Optional[float] = None, provisional: bool = False
+    ) -> Housing:
+        return Housing(
+            _id=str(listing.get("_id")),  # Always use MongoDB _id
+            city=listing.get("city"),
+            area=listing.get("area"),
+            monthly_rent_PKR=listing.get("monthly_rent_PKR"),
+            rooms_available=listing.get("rooms_available", 1),
+            amenities=listing.get("amenities", []),
+            availability=listing.get("availability", "Available"),
+            latitude=listing.get("latitude"),   # <-- Ensure latitude included
+            longitude=listing.get("longitude"), # <-- Ensure longitude included
+            short_reason=reason_text,
+            distance_km=round(distance / 1000, 2) if distance is not None else None,
+            provisional=provisional,
+        )
+
+    def get_top_housing_matches(
+        self,
+        profiles: List[Dict[str, Any]],
+        top_n: int = 3,
+        scoring_mode: ScoringMode = ScoringMode.PIPELINE,
+        near: Optional[Tuple[float, float]] = None,
+    ) -> List[Housing]:
+        """Return top N housing listings for given profiles, optionally favouring listings close to `near` (lat, lon)."""
+        top_listings = self._rank_listings(profiles, top_n, scoring_mode, near)
 
         results = []
         for item in top_listings:
-            l = item["listing"]
-            _id = str(l.get("_id"))  # Always use MongoDB _id
-            reason_text = self._generate_llm_reason(profiles[0], l, item["reasons"])
-
-            results.append(Housing(
-                _id=_id,
-                city=l.get("city"),
-                area=l.get("area"),
-                monthly_rent_PKR=l.get("monthly_rent_PKR"),
-                rooms_available=l.get("rooms_available", 1),
-                amenities=l.get("amenities", []),
-                availability=l.get("availability", "Available"),
-                latitude=l.get("latitude"),   # <-- Ensure latitude included
-                longitude=l.get("longitude"), # <-- Ensure longitude included
-                short_reason=reason_text
-            ))
+            reason_text = self._generate_llm_reason(profiles[0], item["listing"], item["reasons"])
+            results.append(self._to_housing(item["listing"], reason_text, item["distance_m"]))
         return results
 
+    async def aget_top_housing_matches(
+        self,
+        profiles: List[Dict[str, Any]],
+        top_n: int = 3,
+        scoring_mode: ScoringMode = ScoringMode.PIPELINE,
+        near: Optional[Tuple[float, float]] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Housing]:
+        """
+        Async version of get_top_housing_matches: the short reasons are generated concurrently.
+        `timeout` is the latency budget of the whole call (default: the reason timeout);
+        listings whose LLM reason misses it carry a rule-based reason and provisional=True.
+        """
+        started = time.monotonic()
+        top_listings = await self._arank_listings(profiles, top_n, scoring_mode, near)
+
+        # All reasons share what is left of the budget; slow ones fall back and finish in the background
+        budget = self.reason_timeout if timeout is None else timeout
+        remaining = max(0.0, budget - (time.monotonic() - started))
+        reasons = await asyncio.gather(*(
+            self._agenerate_llm_reason(profiles[0], item["listing"], item["reasons"], timeout=remaining)
+            for item in top_listings
+        ))
+        return [
+            self._to_housing(item["listing"], text, item["distance_m"], provisional)
+            for item, (text, provisional) in zip(top_listings, reasons)
+        ]
+
 # Singleton instance
 room_hunter_agent: RoomHunterAgent = RoomHunterAgent()
@@ -1,7 +1,11 @@
 import os
 import json
+import asyncio
 from typing import Dict, List, Any, Optional
-from groq import Groq
+from agents.llm_gateway import gateway_for
+from services.explanation_cache import explanation_cache
+from utils.cache import content_hash
+from utils.metrics import AGENT_FALLBACKS, AGENT_PROVISIONAL, AGENT_REQUESTS
 
 # ----------------------------
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -33,14 +37,19 @@ class MatchExplainerAgent:
     """
     Converts match score, reasons, and red flags into a human-friendly summary
     and actionable negotiation checklist using Groq LLM, with a graceful fallback.
+    The LLM only sees a canonical signature of its inputs, so responses are reusable.
     """
+    # Bump whenever the prompt or the signature changes so cached explanations are not reused
+    PROMPT_VERSION = "v1"
+    SCORE_BUCKET = 10
+    LLM_AGENT = "wingman"
 
     def __init__(self, api_key: Optional[str] = GROQ_API_KEY, model_name: str = "openai/gpt-oss-120b"):
-        if not api_key:
-            self.client = None
-        else:
-            self.client = Groq(api_key=api_key)
+        # Shared pooled client, timeouts and circuit breaker; None means rule-based only
+        self.llm = gateway_for(api_key)
         self.model_name = model_name
+        # signature key -> in-flight LLM call, shared by concurrent identical requests
+        self._inflight: Dict[str, asyncio.Task] = {}
 
     def _get_system_prompt(self) -> str:
         """System prompt guiding LLM to output structured explanation and checklist."""
@@ -52,11 +61,13 @@ class MatchExplainerAgent:
             "'negotiation_checklist'. Each checklist item must have 'suggestion' and 'category'. "
             "Do not add extra commentary.\n\n"
             "Use only 'HIGH' and 'MEDIUM' severity red flags to create 2–3 actionable suggestions. "
-            "If no red flags, return empty checklist."
+            "If no red flags, return empty checklist. The score is given as a band; describe it "
+            "in words and do not state an exact number."
         )
 
     def _rule_based_fallback(self, match_score: int, match_reasons: List[str], red_flags: List[Dict[str, Any]]) -> Dict[str, Any]:
         """A simple, rule-based fallback to generate a basic explanation."""
+        AGENT_FALLBACKS.labels(self.LLM_AGENT).inc()
         summary = f"This match has a compatibility score of {match_score}/100. Key positive points are: {', '.join(match_reasons)}."
         
         negotiation_checklist = []
@@ -97,21 +108,45 @@ class MatchExplainerAgent:
             "negotiation_checklist": unique_checklist[:3]
         }
 
-    def generate_explanation(
-        self, match_score: int, match_reasons: List[str], red_flags: List[Dict[str, Any]]
-    ) -> Dict[str, Any]:
-        """Main method: generates structured explanation and negotiation checklist."""
-        
-        if not self.client:
-            print("⚠ Groq client not initialized. Using rule-based fallback.")
-            return self._rule_based_fallback(match_score, match_reasons, red_flags)
+    # --- Signatures ---
+    def _score_band(self, match_score: Any) -> str:
+        try:
+            score = min(max(int(match_score), 0), 100)
+        except (TypeError, ValueError):
+            return "unknown"
+        if score == 100:
+            return "100"
+        low = score - score % self.SCORE_BUCKET
+        return f"{low}-{low + self.SCORE_BUCKET - 1}"
+
+    def _signature(self, match_score: Any, match_reasons: List[str], red_flags: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Canonical form of the inputs: the score band, the sorted distinct reasons and the
+        distinct (type, severity) pairs of HIGH/MEDIUM flags. Evidence text and LOW flags
+        are dropped, since the explanation only acts on the former.
+        """
+        flags = {
+            (str(flag.get("type", "")).strip(), str(flag.get("severity", "")).upper())
+            for flag in red_flags or []
+            if str(flag.get("severity", "")).upper() in ("HIGH", "MEDIUM")
+        }
+        return {
+            "score_band": self._score_band(match_score),
+            "reasons": sorted({str(reason).strip() for reason in match_reasons or [] if reason}),
+            "red_flags": [{"type": t, "severity": s} for t, s in sorted(flags)],
+        }
+
+    def _signature_key(self, signature: Dict[str, Any]) -> str:
+        return content_hash([signature, self.model_name, self.PROMPT_VERSION])
 
+    def _build_request(self, signature: Dict[str, Any]) -> Dict[str, Any]:
+        """Builds the chat completion arguments (messages + forced tool call) from a signature."""
         system_prompt = self._get_system_prompt()
 
         user_prompt = (
-            f"Match Score: {match_score}/100\n"
-            f"Reasons: {json.dumps(match_reasons)}\n"
-            f"Red Flags: {json.dumps(red_flags)}\n\n"
+            f"Match Score Band: {signature['score_band']} (out of 100)\n"
+            f"Reasons: {json.dumps(signature['reasons'])}\n"
+            f"Red Flags: {json.dumps(signature['red_flags'])}\n\n"
             "Generate the JSON output as per schema."
         )
 
@@ -124,30 +159,109 @@ class MatchExplainerAgent:
             },
         }
 
+        return {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "tools": [tool],
+            "tool_choice": {"type": "function", "function": {"name": "return_explanation"}},
+            "temperature": 0.0,
+        }
+
+    def _parse_tool_call(self, chat_completion) -> Optional[Dict[str, Any]]:
+        """Returns the tool arguments, or None if the LLM did not call the tool."""
+        tool_calls = chat_completion.choices[0].message.tool_calls
+        if not tool_calls:
+            print("⚠ LLM did not call tool. Using rule-based fallback.")
+            return None
+
+        function_args_str = tool_calls[0].function.arguments
+        return json.loads(function_args_str)
+
+    def generate_explanation(
+        self, match_score: int, match_reasons: List[str], red_flags: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Main method: generates structured explanation and negotiation checklist.
+        LLM responses are cached per input signature.
+        """
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
+        
+        if not self.llm:
+            print("⚠ Groq client not initialized. Using rule-based fallback.")
+            return self._rule_based_fallback(match_score, match_reasons, red_flags)
+
+        signature = self._signature(match_score, match_reasons, red_flags)
+        key = self._signature_key(signature)
+        cached = explanation_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
-            chat_completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                tools=[tool],
-                tool_choice={"type": "function", "function": {"name": "return_explanation"}},
-                temperature=0.0,
-            )
+            chat_completion = self.llm.complete(self.LLM_AGENT, **self._build_request(signature))
+            result = self._parse_tool_call(chat_completion)
 
-            tool_calls = chat_completion.choices[0].message.tool_calls
-            if not tool_calls:
-                # Fallback if LLM doesn't call the tool for some reason
-                print("⚠ LLM did not call tool. Using rule-based fallback.")
-                return self._rule_based_fallback(match_score, match_reasons, red_flags)
+        except Exception as e:
+            print(f"⚠ Groq API/Execution Error: {e}. Falling back to rule-based logic.")
+            result = None
+
+        if result is None:
+            return self._rule_based_fallback(match_score, match_reasons, red_flags)
+        explanation_cache.set(key, signature, self.model_name, result)
+        return result
 
-            function_args_str = tool_calls[0].function.arguments
-            return json.loads(function_args_str)
+    async def _aresolve_explanation(self, key: str, signature: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """One LLM call for `signature`, cached on success. Returns None if it failed."""
+        try:
+            chat_completion = await self.llm.acomplete(
+                self.LLM_AGENT,
+                **self._build_request(signature)
+            )
+            result = self._parse_tool_call(chat_completion)
 
         except Exception as e:
             print(f"⚠ Groq API/Execution Error: {e}. Falling back to rule-based logic.")
+            return None
+
+        if result is not None:
+            await explanation_cache.aset(key, signature, self.model_name, result)
+        return result
+
+    async def agenerate_explanation(
+        self, match_score: int, match_reasons: List[str], red_flags: List[Dict[str, Any]], timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Async version of generate_explanation, rate-limited against the shared Groq quota.
+        If the LLM call does not finish within `timeout`, the rule-based explanation is
+        returned with "provisional": True and the call keeps running to fill the cache.
+        """
+        AGENT_REQUESTS.labels(self.LLM_AGENT).inc()
+        if not self.llm:
+            return self._rule_based_fallback(match_score, match_reasons, red_flags)
+
+        signature = self._signature(match_score, match_reasons, red_flags)
+        key = self._signature_key(signature)
+        cached = await explanation_cache.aget(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._aresolve_explanation(key, signature))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            print("⚠ Explanation LLM call is slow. Using rule-based explanation; the LLM result will be cached when ready.")
+            AGENT_PROVISIONAL.labels(self.LLM_AGENT).inc()
+            return {**self._rule_based_fallback(match_score, match_reasons, red_flags), "provisional": True}
+        if result is None:
             return self._rule_based_fallback(match_score, match_reasons, red_flags)
+        return result
 
 # Global instance
 match_explainer_agent: Optional[MatchExplainerAgent] = None
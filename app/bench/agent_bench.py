@@ -0,0 +1,244 @@
+# bench/agent_bench.py
+"""
+Throughput and latency percentiles of each agent's LLM entry point, run against the
+offline Groq stub at several concurrency levels.
+
+    python -m bench.agent_bench --concurrency 1,8,32 --requests 200 --json bench.json    (run from app/)
+    python -m bench.agent_bench --agents red_flag,wingman --latency fixed:300 --rate-429 0.05
+
+The stub (bench.groq_stub) is started in-process unless --base-url points at a running
+one; the agents reach it through GROQ_BASE_URL, which is set before they are imported.
+Inputs are built from data/*.json. By default every call gets a unique input, so each one
+reaches the LLM; --warm cycles through a small pool to measure the caches instead.
+
+- Caches with a Mongo tier (pair scores, red flags, explanations) use MONGO_URI, as in the app.
+- The profile parse cache goes to a temporary SQLite file unless PROFILE_CACHE_DB_PATH is set.
+- The Groq quota limiter is lifted unless GROQ_RPM / GROQ_TPM / GROQ_MAX_CONCURRENCY are set.
+  Set them to benchmark the limiter itself.
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from bench.groq_stub import add_stub_arguments, create_app, stub_from_args
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+WARM_POOL_SIZE = 16
+PARSE_BATCH_SIZE = 10
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Inputs:
+    """Benchmark inputs from data/*.json; input `i` is unique unless `warm` is set."""
+
+    def __init__(self, warm: bool = False):
+        with open(DATA_DIR / "synthetic_roommate_profiles_pakistan_400.json", encoding="utf-8") as f:
+            self.profiles = json.load(f)
+        with open(DATA_DIR / "housing_listings_pakistan_400.json", encoding="utf-8") as f:
+            self.listings = json.load(f)
+        self.warm = warm
+
+    def _key(self, i: int) -> int:
+        return i % WARM_POOL_SIZE if self.warm else i
+
+    def profile(self, i: int, offset: int = 0) -> Dict[str, Any]:
+        key = self._key(i)
+        profile = dict(self.profiles[(key + offset) % len(self.profiles)])
+        # Past the data set, a budget shift keeps the input (and its cache key) unique
+        profile["budget_PKR"] += key // len(self.profiles)
+        return profile
+
+    def pair(self, i: int):
+        return self.profile(i), self.profile(i, offset=len(self.profiles) // 2)
+
+    def listing(self, i: int) -> Dict[str, Any]:
+        key = self._key(i)
+        listing = dict(self.listings[key % len(self.listings)])
+        listing["_id"] = f"{listing['listing_id']}-{key}"
+        return listing
+
+    def ad_text(self, i: int) -> str:
+        return f"{self.profile(i)['raw_profile_text']} ref {self._key(i)}"
+
+
+def entry_points(inputs: Inputs) -> Dict[str, Callable[[int], Awaitable[Any]]]:
+    """Agent name -> async call for input `i`. Imported lazily, after GROQ_BASE_URL is set."""
+    from agents.match_scorer_agent import match_scorer_agent
+    from agents.red_flag_agent import red_flag_agent
+    from agents.wingman_agent import match_explainer_agent
+    from agents.room_hunter_agent import room_hunter_agent
+    from agents.profile_reader_agent import profile_reader
+
+    def explanation(i: int):
+        key = inputs._key(i)
+        flags = [{"type": "Budget Mismatch", "severity": "MEDIUM", "evidence": "Budgets differ."}]
+        return match_explainer_agent.agenerate_explanation(60 + key % 40, ["Sleep schedules match", f"Case {key}"], flags)
+
+    def housing_reason(i: int):
+        # The LLM step of aget_top_housing_matches (listing ranking needs the housing collection)
+        return room_hunter_agent._agenerate_llm_reason(
+            inputs.profile(i), inputs.listing(i), ["Located in the same city", "Within budget"]
+        )
+
+    def parse_batch(i: int):
+        return profile_reader.aparse_profiles([inputs.ad_text(i * PARSE_BATCH_SIZE + j) for j in range(PARSE_BATCH_SIZE)])
+
+    return {
+        "match_scorer": lambda i: match_scorer_agent.ascore_profiles(*inputs.pair(i)),
+        "red_flag": lambda i: red_flag_agent.adetect_conflicts(*inputs.pair(i)),
+        "wingman": explanation,
+        "room_hunter": housing_reason,
+        "profile_reader": lambda i: profile_reader.aparse_profile(inputs.ad_text(i)),
+        "profile_reader_batch": parse_batch,
+    }
+
+
+def _gateway_counters(agent: str) -> Dict[str, int]:
+    from agents.llm_gateway import llm_gateway
+
+    totals = {"calls": 0, "errors": 0, "retries": 0, "rejected_by_breaker": 0}
+    gateway_agent = "profile_reader" if agent == "profile_reader_batch" else agent
+    for key, stats in llm_gateway.stats()["agents"].items():
+        if key.split("/", 1)[0] == gateway_agent:
+            for name in totals:
+                totals[name] += stats[name]
+    return totals
+
+
+async def run_level(call: Callable[[int], Awaitable[Any]], first: int, requests: int, concurrency: int) -> Dict[str, Any]:
+    """`requests` calls (inputs first..first+requests-1) from `concurrency` workers."""
+    indices = iter(range(first, first + requests))
+    latencies: List[float] = []
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        for i in indices:
+            started = time.perf_counter()
+            try:
+                await call(i)
+            except Exception as e:
+                failures += 1
+                print(f"⚠ Benchmark call {i} failed: {e}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [1000 * value for value in latencies]
+    return {
+        "requests": requests,
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ms) / len(ms), 1) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+        "max_ms": round(ms[-1], 1) if ms else 0.0,
+    }
+
+
+async def run_benchmark(agents: List[str], levels: List[int], requests: int, warm: bool) -> List[Dict[str, Any]]:
+    inputs = Inputs(warm=warm)
+    calls = entry_points(inputs)
+    unknown = set(agents) - set(calls)
+    if unknown:
+        raise SystemExit(f"Unknown agents: {', '.join(sorted(unknown))}; choose from {', '.join(calls)}")
+
+    results = []
+    first = 0
+    for agent in agents:
+        for concurrency in levels:
+            before = _gateway_counters(agent)
+            row = await run_level(calls[agent], first, requests, concurrency)
+            after = _gateway_counters(agent)
+            # Every level gets fresh inputs, so earlier levels do not warm the caches
+            first += requests
+            results.append({
+                "agent": agent,
+                "concurrency": concurrency,
+                **row,
+                "llm": {name: after[name] - before[name] for name in after},
+            })
+            print(
+                f"{agent:22} c={concurrency:<4} {row['throughput_rps']:>8.1f} req/s  "
+                f"p50 {row['p50_ms']:>8.1f}  p95 {row['p95_ms']:>8.1f}  p99 {row['p99_ms']:>8.1f} ms  "
+                f"llm calls {results[-1]['llm']['calls']}, errors {results[-1]['llm']['errors']}"
+            )
+    return results
+
+
+def _start_stub(args: argparse.Namespace):
+    """Serves the stub from a daemon thread; returns the GroqStub for its counters."""
+    import uvicorn
+
+    app = create_app(stub_from_args(args))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Groq stub did not start on port {args.port}")
+        time.sleep(0.05)
+    return app.state.stub
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the agents' LLM entry points against the Groq stub")
+    parser.add_argument("--agents", default="match_scorer,red_flag,wingman,room_hunter,profile_reader,profile_reader_batch")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Calls per agent and level")
+    parser.add_argument("--warm", action="store_true", help=f"Cycle through {WARM_POOL_SIZE} inputs to measure cache hits")
+    parser.add_argument("--base-url", help="Use a running stub (or any Groq-compatible server) instead of starting one")
+    parser.add_argument("--port", type=int, default=8900, help="Port of the in-process stub")
+    parser.add_argument("--json", help="Also write the results to this file")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stub = None
+    if args.base_url:
+        os.environ.setdefault("GROQ_API_KEY", "stub")
+        os.environ["GROQ_BASE_URL"] = args.base_url
+    else:
+        stub = _start_stub(args)
+        os.environ["GROQ_API_KEY"] = "stub"
+        os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    for name, value in (("GROQ_RPM", "1000000"), ("GROQ_TPM", "1000000000"), ("GROQ_MAX_CONCURRENCY", "1024")):
+        os.environ.setdefault(name, value)
+    os.environ.setdefault("PROFILE_CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench_profile_cache.db"))
+
+    agents = [name.strip() for name in args.agents.split(",") if name.strip()]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = asyncio.run(run_benchmark(agents, levels, args.requests, args.warm))
+
+    if args.json:
+        report = {
+            "config": {k: v for k, v in vars(args).items() if k != "json"},
+            "results": results,
+            "stub": stub.stats() if stub else None,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Wrote {len(results)} results to {args.json}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
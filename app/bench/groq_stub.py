@@ -0,0 +1,278 @@
+# bench/groq_stub.py
+"""
+Offline stand-in for the Groq chat completions API, for benchmarks and load tests.
+No network access or API key needed; answers are deterministic per request.
+
+    python -m bench.groq_stub --port 8900 --latency lognormal:400,0.6 --rate-429 0.02    (run from app/)
+    GROQ_API_KEY=stub GROQ_BASE_URL=http://127.0.0.1:8900 uvicorn main:app
+
+Serves POST /openai/v1/chat/completions, the path the Groq SDK calls:
+- forced tool calls (return_conflicts, return_explanation, ...): arguments are generated
+  from the tool's JSON schema
+- response_format json_object: the match scorer and profile reader prompts get answers of
+  the shape those agents parse; any other prompt gets {}
+- plain text: one sentence
+Latency = a sample from the latency distribution + completion tokens * --ms-per-token.
+HTTP 429s (with Retry-After) are injected at random (--rate-429) and whenever the
+--rpm / --tpm windows are exceeded. Tokens are counted at 4 characters per token.
+GET /stats returns request, 429 and token counters.
+"""
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+CHARS_PER_TOKEN = 4
+
+SEVERITIES = ["HIGH", "MEDIUM", "LOW"]
+# Values for string properties the agents' tool schemas use, by property name
+STRING_HINTS = {
+    "severity": SEVERITIES,
+    "type": ["Sleep Schedule Mismatch", "Cleanliness Mismatch", "Budget Mismatch", "Noise Tolerance Mismatch"],
+    "category": ["Budget", "Sleep Schedule", "Cleanliness", "Noise", "Chores"],
+}
+WORDS = (
+    "budget area sleep schedule tidy quiet shared rent study habits cooking guests "
+    "weekends chores agree clear rules compatible room early late balance"
+).split()
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class LatencyModel:
+    """
+    Latency distribution parsed from a spec string (milliseconds):
+        fixed:300   uniform:100,800   lognormal:400,0.6 (median, sigma)
+    """
+
+    def __init__(self, spec: str = "lognormal:400,0.6"):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Invalid latency spec '{spec}'; use fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+        self.kind = kind
+        self.values = values
+
+    def sample_ms(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.values[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.values)
+        median, sigma = self.values
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+class _Window:
+    """Sliding one-minute window of (timestamp, amount)."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._events: Deque[Tuple[float, int]] = deque()
+        self._total = 0
+
+    def try_add(self, amount: int, now: float) -> bool:
+        while self._events and now - self._events[0][0] >= 60:
+            self._total -= self._events.popleft()[1]
+        if self.limit and self._total + amount > self.limit:
+            return False
+        self._events.append((now, amount))
+        self._total += amount
+        return True
+
+
+class GroqStub:
+    def __init__(
+        self,
+        latency: str = "lognormal:400,0.6",
+        ms_per_token: float = 2.0,
+        rate_429: float = 0.0,
+        rpm: int = 0,
+        tpm: int = 0,
+        retry_after: float = 1.0,
+        seed: int = 0,
+    ):
+        self.latency = LatencyModel(latency)
+        self.ms_per_token = ms_per_token
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.seed = seed
+        self._rpm = _Window(rpm)
+        self._tpm = _Window(tpm)
+        # Drives latency and 429 injection; answers use a per-request RNG so they stay stable
+        self._rng = random.Random(seed)
+        self.counters: Counter = Counter()
+
+    # --- Content ---
+    def _request_rng(self, body: Dict[str, Any]) -> random.Random:
+        digest = hashlib.sha256(json.dumps(body.get("messages"), sort_keys=True, default=str).encode()).hexdigest()
+        return random.Random(f"{self.seed}:{digest}")
+
+    def _sentence(self, rng: random.Random, words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    def _sample(self, schema: Dict[str, Any], rng: random.Random, name: str = "") -> Any:
+        """A value matching a (simple) JSON schema; every property is filled in."""
+        kind = schema.get("type")
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        if kind == "object":
+            return {key: self._sample(sub, rng, key) for key, sub in schema.get("properties", {}).items()}
+        if kind == "array":
+            return [self._sample(schema.get("items", {}), rng, name) for _ in range(rng.randint(1, 3))]
+        if kind == "integer":
+            return rng.randint(0, 100)
+        if kind == "number":
+            return round(rng.uniform(0, 100), 2)
+        if kind == "boolean":
+            return rng.random() < 0.5
+        if name in STRING_HINTS:
+            return rng.choice(STRING_HINTS[name])
+        return self._sentence(rng, rng.randint(6, 14))
+
+    def _json_answer(self, messages: List[Dict[str, Any]], rng: random.Random) -> Dict[str, Any]:
+        from agents.offline_profile_parser import offline_parser
+
+        system = str(messages[0].get("content", "")) if messages else ""
+        user = str(messages[-1].get("content", "")) if messages else ""
+        if user.startswith("Parse these messy ads: "):
+            ads = json.loads(user[len("Parse these messy ads: "):])
+            return {"profiles": [{"index": ad["index"], **offline_parser.parse(ad["text"])} for ad in ads]}
+        if user.startswith("Parse this messy ad text: "):
+            return offline_parser.parse(user[len("Parse this messy ad text: "):])
+        if re.search(r"compatibility", system, re.IGNORECASE) and "'score'" in system:
+            return {
+                "score": rng.randint(35, 95),
+                "reasons": [self._sentence(rng, rng.randint(4, 8)) for _ in range(rng.randint(2, 3))],
+            }
+        return {}
+
+    def answer(self, body: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        """Returns (assistant message, finish_reason)."""
+        rng = self._request_rng(body)
+        messages = body.get("messages", [])
+        tools = body.get("tools") or []
+        if tools:
+            choice = body.get("tool_choice")
+            wanted = choice.get("function", {}).get("name") if isinstance(choice, dict) else None
+            tool = next((t for t in tools if t["function"]["name"] == wanted), tools[0])["function"]
+            arguments = self._sample(tool.get("parameters", {}), rng)
+            call = {
+                "id": f"call_{rng.getrandbits(48):012x}",
+                "type": "function",
+                "function": {"name": tool["name"], "arguments": json.dumps(arguments)},
+            }
+            return {"role": "assistant", "content": None, "tool_calls": [call]}, "tool_calls"
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            return {"role": "assistant", "content": json.dumps(self._json_answer(messages, rng))}, "stop"
+        text = "This listing is a great match because " + self._sentence(rng, rng.randint(10, 20)).lower()
+        return {"role": "assistant", "content": text}, "stop"
+
+    # --- Requests ---
+    def _prompt_tokens(self, body: Dict[str, Any]) -> int:
+        text = "".join(str(m.get("content", "")) for m in body.get("messages", []))
+        if body.get("tools"):
+            text += json.dumps(body["tools"])
+        return count_tokens(text)
+
+    def _rate_limited(self, prompt_tokens: int) -> Optional[str]:
+        now = time.monotonic()
+        if self.rate_429 and self._rng.random() < self.rate_429:
+            return "Injected rate limit"
+        if not self._rpm.try_add(1, now):
+            return "Requests per minute exceeded"
+        if not self._tpm.try_add(prompt_tokens, now):
+            return "Tokens per minute exceeded"
+        return None
+
+    async def complete(self, body: Dict[str, Any]) -> JSONResponse:
+        self.counters["requests"] += 1
+        prompt_tokens = self._prompt_tokens(body)
+        limited = self._rate_limited(prompt_tokens)
+        if limited:
+            self.counters["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(self.retry_after)},
+                content={"error": {"message": limited, "type": "tokens", "code": "rate_limit_exceeded"}},
+            )
+
+        message, finish_reason = self.answer(body)
+        output = message["content"] or message["tool_calls"][0]["function"]["arguments"]
+        completion_tokens = count_tokens(output)
+        await asyncio.sleep((self.latency.sample_ms(self._rng) + completion_tokens * self.ms_per_token) / 1000)
+
+        self.counters["completed"] += 1
+        self.counters["prompt_tokens"] += prompt_tokens
+        self.counters["completion_tokens"] += completion_tokens
+        return JSONResponse({
+            "id": f"chatcmpl-stub-{self.counters['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        return {"latency": self.latency.spec, "ms_per_token": self.ms_per_token, **self.counters}
+
+
+def create_app(stub: Optional[GroqStub] = None) -> FastAPI:
+    stub = stub or GroqStub()
+    app = FastAPI(title="Groq stub")
+    app.state.stub = stub
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await stub.complete(await request.json())
+
+    @app.get("/stats")
+    def stats() -> Dict[str, Any]:
+        return stub.stats()
+
+    return app
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", default="lognormal:400,0.6", help="fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--ms-per-token", type=float, default=2.0, help="Extra latency per completion token")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of an injected 429")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Prompt tokens per minute before 429s (0 = unlimited)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def stub_from_args(args: argparse.Namespace) -> GroqStub:
+    return GroqStub(
+        latency=args.latency, ms_per_token=args.ms_per_token, rate_429=args.rate_429,
+        rpm=args.rpm, tpm=args.tpm, retry_after=args.retry_after, seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline Groq-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(stub_from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,334 @@
+# bench/load_test.py
+"""
+Scenario-based HTTP load test: boots the app (main:app under uvicorn) against a Mongo
+database seeded from data/*.json, replays user journeys at stepped concurrency and
+writes per-route throughput, latency percentiles and error rates to a JSON file.
+
+    python -m bench.load_test --stages 5,10,25,50 --stage-seconds 30 --out loadtest.json    (run from app/)
+    python -m bench.load_test --base-url http://127.0.0.1:8000 --no-seed    (an already running app)
+
+Each virtual user loops over one journey (a session):
+    login -> list profiles -> own profile -> best matches -> like the top two ->
+    liked profiles -> housing for the user and the best match -> nearby listings -> logout
+with --think-ms between steps.
+
+- Requests are recorded under their route template, e.g. /profiles/{profile_id}.
+- Mongo comes from MONGO_URI. The database (DB_NAME, default flatwaley_loadtest) is re-seeded unless --no-seed.
+- AI routes call the offline Groq stub (bench.groq_stub) unless --no-llm, which runs them rule-based.
+- "sustained_users" is the largest stage whose error rate and overall p95 stay within
+  --max-error-rate and --p95-slo-ms. It answers how many concurrent users --workers sustains.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.agent_bench import percentile
+
+APP_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_DB_NAME = "flatwaley_loadtest"
+REQUEST_TIMEOUT_SECONDS = 60
+BOOT_TIMEOUT_SECONDS = 60
+
+
+class Recorder:
+    """Latency and status of every request, by route template, plus whole journeys."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.journeys: List[Tuple[float, bool]] = []
+
+    def request(self, route: str, status: str, seconds: float) -> None:
+        self.latencies[route].append(seconds)
+        self.statuses[route][status] += 1
+
+    def journey(self, seconds: float, ok: bool) -> None:
+        self.journeys.append((seconds, ok))
+
+
+def _latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ms = sorted(1000 * value for value in seconds)
+    return {
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+        "max_ms": round(ms[-1], 1) if ms else 0.0,
+    }
+
+
+def _is_error(status: str) -> bool:
+    # Transport failures are recorded by exception name, HTTP failures by code
+    return not status.isdigit() or int(status) >= 400
+
+
+def summarize(recorder: Recorder, users: int, elapsed: float) -> Dict[str, Any]:
+    routes = {}
+    for route, seconds in sorted(recorder.latencies.items()):
+        statuses = recorder.statuses[route]
+        errors = sum(n for status, n in statuses.items() if _is_error(status))
+        routes[route] = {
+            "requests": len(seconds),
+            "throughput_rps": round(len(seconds) / elapsed, 2),
+            "errors": errors,
+            "error_rate": round(errors / len(seconds), 4),
+            "statuses": dict(statuses),
+            **_latency_summary(seconds),
+        }
+
+    every_request = [value for seconds in recorder.latencies.values() for value in seconds]
+    errors = sum(route["errors"] for route in routes.values())
+    journey_seconds = [seconds for seconds, ok in recorder.journeys if ok]
+    return {
+        "users": users,
+        "elapsed_s": round(elapsed, 2),
+        "totals": {
+            "requests": len(every_request),
+            "throughput_rps": round(len(every_request) / elapsed, 2),
+            "errors": errors,
+            "error_rate": round(errors / len(every_request), 4) if every_request else 0.0,
+            **_latency_summary(every_request),
+        },
+        "journeys": {
+            "completed": len(journey_seconds),
+            "failed": len(recorder.journeys) - len(journey_seconds),
+            "per_minute": round(60 * len(journey_seconds) / elapsed, 1),
+            **_latency_summary(journey_seconds),
+        },
+        "routes": routes,
+    }
+
+
+class VirtualUser:
+    """One simulated user with its own cookie jar."""
+
+    def __init__(self, base_url: str, account: Dict[str, Any], recorder: Recorder, think_ms: Tuple[int, int], rng: random.Random):
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=REQUEST_TIMEOUT_SECONDS)
+        self.account = account
+        self.recorder = recorder
+        self.think_ms = think_ms
+        self.rng = rng
+
+    async def think(self) -> None:
+        low, high = self.think_ms
+        if high > 0:
+            await asyncio.sleep(self.rng.uniform(low, high) / 1000)
+
+    async def call(self, method: str, route: str, path: Optional[str] = None, **kwargs) -> Optional[httpx.Response]:
+        """Sends one request and records it under `route`; returns None unless it succeeded."""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path or route, **kwargs)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        self.recorder.request(f"{method} {route}", status, time.perf_counter() - started)
+        await self.think()
+        return response if response is not None and response.status_code < 400 else None
+
+    async def journey(self) -> bool:
+        account = self.account
+        self.client.cookies.clear()
+        login = await self.call("POST", "/users/login", json={"email": account["email"], "password": account["password"]})
+        if login is None:
+            return False
+
+        ok = await self.call("GET", "/profiles/") is not None
+        profile_id = account["profile_id"]
+        ok &= await self.call("GET", "/profiles/{profile_id}", f"/profiles/{profile_id}") is not None
+
+        matches = await self.call("GET", "/ai/best_matches", params={"top_n": 5})
+        match_ids = [m["profile_id"] for m in matches.json()] if matches is not None else []
+        ok &= matches is not None
+        for match_id in match_ids[:2]:
+            ok &= await self.call(
+                "POST", "/users/like-profile/{profile_id}", f"/users/like-profile/{match_id}"
+            ) is not None
+        ok &= await self.call("GET", "/users/liked-profiles") is not None
+
+        if match_ids:
+            ok &= await self.call(
+                "POST", "/ai/top_housing_matches", params={"top_n": 5},
+                json={"profile_a": {"id": profile_id}, "profile_b": {"id": match_ids[0]}},
+            ) is not None
+        latitude, longitude = account["home"]
+        ok &= await self.call(
+            "GET", "/ai/nearby_listings",
+            params={"latitude": latitude, "longitude": longitude, "radius_km": 10, "limit": 20},
+        ) is not None
+
+        ok &= await self.call("POST", "/users/logout") is not None
+        return ok
+
+    async def run_until(self, stop_at: float) -> None:
+        try:
+            # Staggered start, so a stage does not begin with every user logging in at once
+            await asyncio.sleep(self.rng.uniform(0, max(self.think_ms[1], 500)) / 1000)
+            while time.monotonic() < stop_at:
+                started = time.perf_counter()
+                ok = await self.journey()
+                self.recorder.journey(time.perf_counter() - started, ok)
+        finally:
+            await self.client.aclose()
+
+
+async def run_stage(base_url: str, accounts: List[Dict[str, Any]], users: int, seconds: float,
+                    think_ms: Tuple[int, int], seed: int) -> Dict[str, Any]:
+    recorder = Recorder()
+    rng = random.Random(seed)
+    stop_at = time.monotonic() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        VirtualUser(base_url, accounts[i % len(accounts)], recorder, think_ms, random.Random(rng.random())).run_until(stop_at)
+        for i in range(users)
+    ))
+    # Journeys in flight at the deadline finish, so the stage can run slightly long
+    return summarize(recorder, users, time.perf_counter() - started)
+
+
+def load_accounts(seed: int) -> List[Dict[str, Any]]:
+    """Seeded users (email, password, profile, a point in their city), shuffled."""
+    from db.mongo import get_users_collection, get_profiles_collection
+    from bench.seed import CITY_CENTRES, LOADTEST_EMAIL_DOMAIN, LOADTEST_PASSWORD
+
+    cities = {str(p["_id"]): p.get("city") for p in get_profiles_collection().find({}, {"city": 1})}
+    accounts = [
+        {
+            "email": user["email"],
+            "password": LOADTEST_PASSWORD,
+            "profile_id": user["profile_id"],
+            "home": CITY_CENTRES.get(cities.get(user["profile_id"]), CITY_CENTRES["Lahore"]),
+        }
+        for user in get_users_collection().find(
+            {"email": {"$regex": f"@{LOADTEST_EMAIL_DOMAIN}$"}}, {"email": 1, "profile_id": 1}
+        )
+    ]
+    if not accounts:
+        raise SystemExit("No load-test users found; run without --no-seed first")
+    random.Random(seed).shuffle(accounts)
+    return accounts
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, name: str) -> None:
+    deadline = time.monotonic() + BOOT_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{name} exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"{name} did not come up within {BOOT_TIMEOUT_SECONDS}s")
+
+
+def boot(args: argparse.Namespace) -> Tuple[str, List[subprocess.Popen]]:
+    """Starts the Groq stub (unless --no-llm) and the app; returns (base URL, processes)."""
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "loadtest-secret")
+    processes = []
+    if args.no_llm:
+        env["GROQ_API_KEY"] = ""
+    else:
+        stub = subprocess.Popen(
+            [sys.executable, "-m", "bench.groq_stub", "--port", str(args.stub_port), "--latency", args.latency],
+            cwd=APP_DIR, env=env,
+        )
+        processes.append(stub)
+        _wait_until_up(f"http://127.0.0.1:{args.stub_port}/stats", stub, "Groq stub")
+        env.update(GROQ_API_KEY="stub", GROQ_BASE_URL=f"http://127.0.0.1:{args.stub_port}")
+        # The stub stands in for Groq, so its quota is not the thing under test
+        for name, value in (("GROQ_RPM", "1000000"), ("GROQ_TPM", "1000000000"), ("GROQ_MAX_CONCURRENCY", "1024")):
+            env.setdefault(name, value)
+
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        cwd=APP_DIR, env=env,
+    )
+    processes.append(app)
+    base_url = f"http://127.0.0.1:{args.port}"
+    _wait_until_up(f"{base_url}/openapi.json", app, "App")
+    return base_url, processes
+
+
+def sustained_users(stages: List[Dict[str, Any]], max_error_rate: float, p95_slo_ms: float) -> int:
+    passing = [
+        stage["users"] for stage in stages
+        if stage["totals"]["error_rate"] <= max_error_rate and stage["totals"]["p95_ms"] <= p95_slo_ms
+    ]
+    return max(passing, default=0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stepped-concurrency load test of the FastAPI app")
+    parser.add_argument("--stages", default="5,10,25,50", help="Comma-separated concurrent users per stage")
+    parser.add_argument("--stage-seconds", type=float, default=30)
+    parser.add_argument("--think-ms", default="100,500", help="Uniform think time between steps: LOW,HIGH")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--base-url", help="Load-test an already running app instead of booting one")
+    parser.add_argument("--no-seed", action="store_true", help="Keep the current load-test database")
+    parser.add_argument("--no-llm", action="store_true", help="Run the AI routes rule-based (no Groq stub)")
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--latency", default="lognormal:400,0.6", help="Groq stub latency distribution")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--p95-slo-ms", type=float, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="loadtest.json")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DB_NAME", DEFAULT_DB_NAME)
+    if not args.no_seed:
+        from bench.seed import seed
+        counts = seed(args.seed)
+        print("✅ Seeded " + ", ".join(f"{n} {name}" for name, n in counts.items()))
+    accounts = load_accounts(args.seed)
+
+    think_ms = tuple(int(v) for v in args.think_ms.split(","))
+    levels = [int(level) for level in args.stages.split(",")]
+    processes: List[subprocess.Popen] = []
+    try:
+        if args.base_url:
+            base_url = args.base_url
+        else:
+            base_url, processes = boot(args)
+
+        stages = []
+        for users in levels:
+            stage = asyncio.run(run_stage(base_url, accounts, users, args.stage_seconds, think_ms, args.seed))
+            stages.append(stage)
+            totals = stage["totals"]
+            print(
+                f"users={users:<5} {totals['throughput_rps']:>8.1f} req/s  p50 {totals['p50_ms']:>8.1f}  "
+                f"p95 {totals['p95_ms']:>8.1f}  p99 {totals['p99_ms']:>8.1f} ms  "
+                f"errors {100 * totals['error_rate']:.2f}%  journeys/min {stage['journeys']['per_minute']}"
+            )
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    report = {
+        "config": {k: v for k, v in vars(args).items()},
+        "db_name": os.environ["DB_NAME"],
+        "sustained_users": sustained_users(stages, args.max_error_rate, args.p95_slo_ms),
+        "stages": stages,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ {args.workers} worker(s) sustained {report['sustained_users']} concurrent users. Report: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
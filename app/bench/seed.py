@@ -0,0 +1,109 @@
+# bench/seed.py
+"""
+Seeds the database named by MONGO_URI / DB_NAME from data/*.json for load tests:
+one user per profile (linked through profile_id), every housing listing with a
+GeoJSON location, and the materialized match index.
+
+    MONGO_URI=mongodb://localhost:27017 DB_NAME=flatwaley_loadtest python -m bench.seed    (run from app/)
+
+The seeded collections are dropped first, so this refuses to run against the app's
+default database.
+"""
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List
+
+import bcrypt
+from bson import ObjectId
+
+from db.mongo import DB_NAME, db
+from db.geo import geo_point
+from db.indexes import ensure_indexes
+from services.password_hasher import BCRYPT_ROUNDS
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+APP_DB_NAME = "Flat-Waley"
+LOADTEST_PASSWORD = "loadtest-password"
+LOADTEST_EMAIL_DOMAIN = "loadtest.local"
+SEEDED_COLLECTIONS = ("users", "profiles", "housing", "user_likes", "profile_matches")
+
+# Approximate city centres; listings are scattered within ~5 km of them
+CITY_CENTRES = {
+    "Lahore": (31.5204, 74.3587),
+    "Karachi": (24.8607, 67.0011),
+    "Islamabad": (33.6844, 73.0479),
+    "Rawalpindi": (33.5651, 73.0169),
+    "Peshawar": (34.0151, 71.5249),
+    "Multan": (30.1575, 71.5249),
+    "Faisalabad": (31.4504, 73.1350),
+}
+SCATTER_DEGREES = 0.045
+
+
+def _load(name: str) -> List[Dict[str, Any]]:
+    with open(DATA_DIR / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _housing_documents(listings: List[Dict[str, Any]], rng: random.Random) -> List[Dict[str, Any]]:
+    documents = []
+    for listing in listings:
+        centre_lat, centre_lon = CITY_CENTRES.get(listing["city"], (30.3753, 69.3451))
+        latitude = round(centre_lat + rng.uniform(-SCATTER_DEGREES, SCATTER_DEGREES), 6)
+        longitude = round(centre_lon + rng.uniform(-SCATTER_DEGREES, SCATTER_DEGREES), 6)
+        documents.append({
+            **listing,
+            "_id": ObjectId(),
+            "monthly_rent_PKR": int(listing["monthly_rent_PKR"]),
+            "rooms_available": int(listing.get("rooms_available", 1)),
+            "latitude": latitude,
+            "longitude": longitude,
+            "location": geo_point(latitude, longitude),
+        })
+    return documents
+
+
+def loadtest_email(profile_key: str) -> str:
+    return f"user_{profile_key.lower()}@{LOADTEST_EMAIL_DOMAIN}"
+
+
+def seed(seed: int = 0) -> Dict[str, int]:
+    """Replaces the seeded collections; returns the number of documents per collection."""
+    if DB_NAME == APP_DB_NAME:
+        raise SystemExit(f"Refusing to seed '{DB_NAME}': point DB_NAME at a load-test database")
+    rng = random.Random(seed)
+    for name in SEEDED_COLLECTIONS:
+        db[name].drop()
+
+    # One hash for every account; logins still pay the full bcrypt cost
+    hashed_password = bcrypt.hashpw(LOADTEST_PASSWORD.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("utf-8")
+    profiles, users = [], []
+    for record in _load("synthetic_roommate_profiles_pakistan_400.json"):
+        profile_id = ObjectId()
+        profiles.append({"_id": profile_id, **{k: v for k, v in record.items() if k != "id"}})
+        users.append({
+            "_id": ObjectId(),
+            "username": f"user_{record['id']}",
+            "email": loadtest_email(record["id"]),
+            "password": hashed_password,
+            "listing_id": None,
+            "profile_id": str(profile_id),
+            "is_verified": True,
+        })
+    housing = _housing_documents(_load("housing_listings_pakistan_400.json"), rng)
+
+    db["profiles"].insert_many(profiles)
+    db["users"].insert_many(users)
+    db["housing"].insert_many(housing)
+    ensure_indexes()
+
+    from services.matchmaker import matchmaker
+    matchmaker.ensure_indexes()
+    matchmaker.rebuild()
+    return {"users": len(users), "profiles": len(profiles), "housing": len(housing)}
+
+
+if __name__ == "__main__":
+    counts = seed()
+    print(f"✅ Seeded '{DB_NAME}': " + ", ".join(f"{n} {name}" for name, n in counts.items()))
@@ -0,0 +1,76 @@
+#app\db\explain_report.py
+"""
+Runs explain() on every query shape the routes issue and flags the ones that still
+do a full collection scan.
+
+    python -m db.explain_report    (run from app/)
+
+Exits with status 1 when at least one shape uses COLLSCAN.
+"""
+import sys
+from typing import Any, Dict, Iterator, List
+from bson import ObjectId
+from db.mongo import db
+
+_ID = ObjectId()
+
+# (description, collection, filter, sort)
+QUERY_SHAPES = [
+    ("login / register by email", "users", {"email": "someone@example.com"}, None),
+    ("login / register by username", "users", {"username": "someone"}, None),
+    ("current user by id", "users", {"_id": _ID}, None),
+    ("likes by user", "user_likes", {"user_id": str(_ID)}, None),
+    ("room hunt: available listings", "housing", {"availability": "Available"}, None),
+    ("room hunt: available listings in a city", "housing",
+     {"availability": "Available", "city": "Lahore"}, [("monthly_rent_PKR", 1)]),
+    ("nearby listings", "housing",
+     {"location": {"$near": {"$geometry": {"type": "Point", "coordinates": [74.3, 31.5]}, "$maxDistance": 5000}},
+      "availability": "Available"}, None),
+    ("profile by id", "profiles", {"_id": _ID}, None),
+    ("profiles by city / area / budget", "profiles",
+     {"city": "Lahore", "area": "DHA", "budget_PKR": {"$lte": 30000}}, None),
+    ("best matches: candidate fetch", "profiles", {"_id": {"$in": [_ID]}}, None),
+    ("best matches: full scan in id order", "profiles", {}, [("_id", 1)]),
+    ("match index rows containing a profile", "profile_matches", {"matches.profile_id": str(_ID)}, None),
+    ("pair score invalidation", "pair_scores", {"profile_ids": str(_ID)}, None),
+]
+
+
+def _stages(plan: Dict[str, Any]) -> Iterator[str]:
+    """Yields every stage name in a (classic or SBE) winning plan."""
+    plan = plan.get("queryPlan", plan)
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "outerStage", "innerStage"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def explain_shapes() -> List[Dict[str, Any]]:
+    report = []
+    for description, collection_name, query, sort in QUERY_SHAPES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = list(_stages(winning_plan))
+        report.append({
+            "query": description,
+            "collection": collection_name,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    results = explain_shapes()
+    for row in results:
+        flag = "❌ COLLSCAN" if row["collscan"] else "✅"
+        print(f"{flag:12} {row['collection']:16} {row['query']}  [{' -> '.join(row['stages'])}]")
+
+    scans = sum(row["collscan"] for row in results)
+    print(f"\n{scans} of {len(results)} query shapes do a collection scan.")
+    sys.exit(1 if scans else 0)
@@ -0,0 +1,46 @@
+#app\db\geo.py
+import math
+from typing import Any, Dict, Optional
+from db.mongo import get_housing_collection
+
+# Radius MongoDB uses for spherical distances on GeoJSON points
+EARTH_RADIUS_M = 6378100.0
+
+
+def geo_point(latitude: float, longitude: float) -> Dict[str, Any]:
+    """GeoJSON point (note the [longitude, latitude] order)."""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres, consistent with $geoNear."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def listing_coordinates(listing: Dict[str, Any]) -> Optional[tuple]:
+    lat, lon = listing.get("latitude"), listing.get("longitude")
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        return lat, lon
+    return None
+
+
+def backfill_housing_locations() -> int:
+    """Adds a GeoJSON `location` to listings that only have latitude/longitude. Idempotent."""
+    result = get_housing_collection().update_many(
+        {
+            "location": {"$exists": False},
+            "latitude": {"$type": "number"},
+            "longitude": {"$type": "number"},
+        },
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}],
+    )
+    return result.modified_count
+
+
+if __name__ == "__main__":
+    # python -m db.geo (run from app/)
+    print(f"✅ Added a GeoJSON location to {backfill_housing_locations()} listings.")
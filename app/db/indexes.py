@@ -0,0 +1,56 @@
+#app\db\indexes.py
+from typing import Any, Dict, List
+from pymongo import ASCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+from db.mongo import db
+
+# Only string values are unique, so users created without an email (register-user) don't collide on null
+_STRING = {"$type": "string"}
+
+# Declarative index spec: collection -> indexes. Names are fixed so re-applying is a no-op.
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"keys": [("email", ASCENDING)], "name": "email_unique", "unique": True,
+         "partialFilterExpression": {"email": _STRING}},
+        {"keys": [("username", ASCENDING)], "name": "username_unique", "unique": True,
+         "partialFilterExpression": {"username": _STRING}},
+    ],
+    "user_likes": [
+        {"keys": [("user_id", ASCENDING)], "name": "user_id"},
+    ],
+    "housing": [
+        {"keys": [("availability", ASCENDING), ("city", ASCENDING), ("monthly_rent_PKR", ASCENDING)],
+         "name": "availability_city_rent"},
+        # Listings without a location are simply left out of a 2dsphere index
+        {"keys": [("location", GEOSPHERE)], "name": "location_2dsphere"},
+    ],
+    "profiles": [
+        {"keys": [("city", ASCENDING), ("area", ASCENDING), ("budget_PKR", ASCENDING)],
+         "name": "city_area_budget"},
+    ],
+    # Revoked access tokens: dropped once the token has expired anyway
+    "revoked_tokens": [
+        {"keys": [("expires_at", ASCENDING)], "name": "expires_at_ttl", "expireAfterSeconds": 0},
+        {"keys": [("revoked_at", ASCENDING)], "name": "revoked_at"},
+    ],
+}
+
+
+def _index_model(spec: Dict[str, Any]) -> IndexModel:
+    options = {k: v for k, v in spec.items() if k != "keys"}
+    return IndexModel(spec["keys"], **options)
+
+
+def ensure_indexes(specs: Dict[str, List[Dict[str, Any]]] = INDEX_SPECS) -> Dict[str, List[str]]:
+    """
+    Applies INDEX_SPECS. createIndexes is idempotent for identical specs, so this is safe
+    on every startup. A failing collection (e.g. existing duplicate emails or an index with
+    the same name but different options) is reported and skipped.
+    """
+    created = {}
+    for collection_name, indexes in specs.items():
+        try:
+            created[collection_name] = db[collection_name].create_indexes([_index_model(s) for s in indexes])
+        except OperationFailure as e:
+            print(f"⚠ Could not apply indexes on '{collection_name}': {e}")
+    return created
@@ -1,13 +1,40 @@
 #app\db\mongo.py
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 import gridfs
 import os
+from utils.metrics import mongo_command_listener
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "Flat-Waley")
 
+# ----- Connection pool / timeout settings (shared by both clients) -----
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None  # 0 = no timeout
+# Comma-separated, e.g. "zstd,snappy,zlib" (zstd/snappy need their optional packages)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+
+
+def _client_options():
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        # Per-collection command latency for /metrics
+        "event_listeners": [mongo_command_listener],
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+
 # Create global client
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, **_client_options())
 
 # Database reference
 db = client[DB_NAME]
@@ -15,6 +42,10 @@ db = client[DB_NAME]
 # GridFS for file uploads (optional)
 fs = gridfs.GridFS(db)
 
+# Async client for request handlers (binds to the running event loop on first use)
+async_client = AsyncIOMotorClient(MONGO_URI, **_client_options())
+async_db = async_client[DB_NAME]
+
 
 # ----- Collection helpers -----
 def get_users_collection():
@@ -29,6 +60,50 @@ def get_housing_collection():
 def get_profiles_collection():
     return db["profiles"]
 
+def get_pair_scores_collection():
+    return db["pair_scores"]
+
+def get_profile_matches_collection():
+    return db["profile_matches"]
+
+def get_red_flags_collection():
+    return db["red_flags"]
+
+def get_explanations_collection():
+    return db["explanations"]
+
+def get_revoked_tokens_collection():
+    return db["revoked_tokens"]
+
+
+# ----- Async collection helpers (motor) -----
+def get_async_users_collection():
+    return async_db["users"]
+
+def get_async_user_likes_collection():
+    return async_db["user_likes"]
+
+def get_async_housing_collection():
+    return async_db["housing"]
+
+def get_async_profiles_collection():
+    return async_db["profiles"]
+
+def get_async_pair_scores_collection():
+    return async_db["pair_scores"]
+
+def get_async_profile_matches_collection():
+    return async_db["profile_matches"]
+
+def get_async_red_flags_collection():
+    return async_db["red_flags"]
+
+def get_async_explanations_collection():
+    return async_db["explanations"]
+
+def get_async_revoked_tokens_collection():
+    return async_db["revoked_tokens"]
+
 def check_connection():
     """Check if MongoDB connection works"""
     try:
@@ -1,4 +1,4 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 import os
@@ -36,16 +36,82 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# ------------------ Metrics ------------------
+from utils.metrics import register_cache, render, track_requests
+
+app.middleware("http")(track_requests)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (this worker's series only)."""
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
 # ------------------ MongoDB Check ------------------
 from db.mongo import check_connection
+from db.indexes import ensure_indexes
+from db.geo import backfill_housing_locations
+from services.pair_score_cache import pair_score_cache, red_flag_cache
+from services.matchmaker import matchmaker
+from services.explanation_cache import explanation_cache
+from services.token_revocation import token_revocations
+from services.password_hasher import password_hasher
+from agents.room_hunter_agent import room_hunter_agent
+from agents.profile_reader_agent import profile_reader
+
+register_cache("pair_scores", pair_score_cache)
+register_cache("red_flags", red_flag_cache)
+register_cache("explanations", explanation_cache)
+register_cache("housing_reasons", room_hunter_agent.reason_cache)
+if profile_reader:
+    register_cache("profile_parse", profile_reader.cache)
 
 @app.on_event("startup")
 def startup_db_check():
     if check_connection():
         print("✅ MongoDB connected successfully")
+        try:
+            backfill_housing_locations()
+            ensure_indexes()
+            pair_score_cache.ensure_indexes()
+            red_flag_cache.ensure_indexes()
+            matchmaker.ensure_indexes()
+            explanation_cache.ensure_indexes()
+        except Exception as e:
+            print(f"⚠ Failed to create indexes: {e}")
+        try:
+            print(f"✅ Pre-warmed {explanation_cache.prewarm()} cached match explanations")
+        except Exception as e:
+            print(f"⚠ Failed to pre-warm explanation cache: {e}")
     else:
         print("❌ Failed to connect to MongoDB")
 
+@app.on_event("startup")
+def migrate_profile_parse_cache():
+    if not profile_reader:
+        return
+    try:
+        if profile_reader.cache.ensure_schema():
+            print("✅ Migrated the profile parse cache to hashed keys")
+    except Exception as e:
+        print(f"⚠ Failed to prepare the profile parse cache: {e}")
+
+@app.on_event("startup")
+async def start_token_revocation_sync():
+    await token_revocations.start()
+
+@app.on_event("startup")
+def start_password_hasher():
+    password_hasher.start()
+
+@app.on_event("shutdown")
+async def stop_token_revocation_sync():
+    await token_revocations.stop()
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
 # ------------------ Routers ------------------
 from routes.users.routes import router as users_router
 from routes.profiles.routes import router as profiles_router
@@ -36,6 +36,8 @@ class HousingUpdate(BaseModel):
 class Housing(HousingBase):
     id: Optional[str] = Field(alias="_id", description="MongoDB ObjectId as string")
     short_reason: Optional[str] = Field(None, description="Concise explanation why this listing matches the profile")
+    distance_km: Optional[float] = Field(None, description="Distance from the search point, when one was given")
+    provisional: bool = Field(False, description="short_reason is rule-based; the LLM reason is still being generated")
 
     class Config:
         populate_by_name = True
@@ -1,31 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from enum import Enum
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from utils.jwt_utils import get_user_from_cookie
-from db.mongo import get_profiles_collection, get_users_collection
+from db.mongo import get_async_profiles_collection, get_async_users_collection
 from bson import ObjectId
-from agents.match_scorer_agent import match_scorer_agent, MatchResult
+from agents.match_scorer_agent import match_scorer_agent, MatchResult, MatchScorerAgent, MergeStrategy
 from routes.profiles.profiles_response_schemas import ProfileResponse
 from routes.users.users_response_schemas import UserResponse
-from typing import List
+from services.pair_score_cache import pair_score_cache
+from services.match_report import match_report_pipeline, MatchReportPipeline
+from agents.red_flag_agent import red_flag_agent
+from agents.wingman_agent import match_explainer_agent
+from agents.llm_gateway import llm_gateway, DEFAULT_LATENCY_BUDGET_MS, MAX_LATENCY_BUDGET_MS
+from pydantic import BaseModel
+from typing import List, Dict, Any, Optional
 
 router = APIRouter(prefix="/ai", tags=["Match"])
 
-@router.get("/best_matches", response_model=List[MatchResult])
-def best_matches_route(
-    current_user: UserResponse = Depends(get_user_from_cookie),
-    top_n: int = 5
-):
-    """
-    Get top N best matching roommate profiles for the logged-in user.
-    """
-    if not match_scorer_agent:
-        raise HTTPException(status_code=503, detail="Match scorer agent not initialized")
 
-    users_collection = get_users_collection()
-    profiles_collection = get_profiles_collection()
+class StreamFormat(str, Enum):
+    NDJSON = "ndjson"  # one JSON object per line
+    SSE = "sse"        # server-sent events, the frame's "event" as the SSE event name
+
+STREAM_MEDIA_TYPES = {StreamFormat.NDJSON: "application/x-ndjson", StreamFormat.SSE: "text/event-stream"}
+
+
+class MatchReport(BaseModel):
+    profile_id: str
+    score: int
+    reasons: List[str]
+    red_flags: List[Dict[str, Any]]
+    housing: List[Dict[str, Any]]
+    explanation: Dict[str, Any]
+    # Some part is rule-based because its LLM call missed the latency budget
+    provisional: bool = False
+
+
+async def _load_user_profile(current_user: UserResponse) -> ProfileResponse:
+    """Fetches the logged-in user's profile document."""
+    users_collection = get_async_users_collection()
+    profiles_collection = get_async_profiles_collection()
 
     # Fetch user document
     try:
-        user_doc = users_collection.find_one({"_id": ObjectId(current_user.id)})
+        user_doc = await users_collection.find_one({"_id": ObjectId(current_user.id)})
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid user ID")
 
@@ -38,14 +57,14 @@ def best_matches_route(
 
     # Fetch user's profile
     try:
-        profile_doc = profiles_collection.find_one({"_id": ObjectId(profile_id)})
+        profile_doc = await profiles_collection.find_one({"_id": ObjectId(profile_id)})
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid profile ID in user document")
 
     if not profile_doc:
         raise HTTPException(status_code=404, detail="User profile not found")
 
-    user_profile = ProfileResponse(
+    return ProfileResponse(
         id=str(profile_doc["_id"]),
         raw_profile_text=profile_doc["raw_profile_text"],
         city=profile_doc["city"],
@@ -58,6 +77,124 @@ def best_matches_route(
         food_pref=profile_doc.get("food_pref"),
     )
 
+
+@router.get("/best_matches", response_model=List[MatchResult])
+async def best_matches_route(
+    current_user: UserResponse = Depends(get_user_from_cookie),
+    top_n: int = Query(5, ge=1, le=100, description="How many matches to return"),
+    shortlist_k: int = Query(
+        MatchScorerAgent.DEFAULT_SHORTLIST_K, ge=0, le=100,
+        description="How many rule-based candidates the LLM re-ranks (0 = rule-based only)"
+    ),
+    merge: MergeStrategy = Query(
+        MergeStrategy.LLM, description="How LLM scores are merged with the rule-based scores"
+    ),
+    budget_ms: int = Query(
+        DEFAULT_LATENCY_BUDGET_MS, ge=0, le=MAX_LATENCY_BUDGET_MS,
+        description="Latency budget; past it the rule-based ranking is returned with provisional=true"
+    ),
+):
+    """
+    Get top N best matching roommate profiles for the logged-in user.
+    All candidates are ranked by the rule-based scorer; the top max(`shortlist_k`, `top_n`) are re-scored by the LLM.
+    If the LLM scores are not back within `budget_ms`, the rule-based ranking is returned (provisional)
+    and the LLM scores are cached for the next request.
+    """
+    if not match_scorer_agent:
+        raise HTTPException(status_code=503, detail="Match scorer agent not initialized")
+
+    user_profile = await _load_user_profile(current_user)
+
     # Get best matches using the agent
-    best_matches = match_scorer_agent.get_best_matches(user_profile, top_n=top_n)
-    return best_matches
\ No newline at end of file
+    # LLM re-ranking of the shortlist runs concurrently
+    best_matches = await match_scorer_agent.aget_best_matches(
+        user_profile, top_n=top_n, shortlist_k=shortlist_k, merge=merge, timeout=budget_ms / 1000
+    )
+    return best_matches
+
+
+@router.get("/best_matches/stream")
+async def best_matches_stream_route(
+    current_user: UserResponse = Depends(get_user_from_cookie),
+    top_n: int = Query(5, ge=1, le=100, description="How many matches to return"),
+    shortlist_k: int = Query(
+        MatchScorerAgent.DEFAULT_SHORTLIST_K, ge=0, le=100,
+        description="How many rule-based candidates the LLM re-ranks (0 = rule-based only)"
+    ),
+    merge: MergeStrategy = Query(
+        MergeStrategy.LLM, description="How LLM scores are merged with the rule-based scores"
+    ),
+    format: StreamFormat = Query(StreamFormat.NDJSON, description="ndjson or sse"),
+):
+    """
+    Streaming variant of /best_matches. The rule-based ranking is sent first ("provisional"),
+    then one "update" per LLM-scored candidate as it arrives, then the settled top N ("done").
+    """
+    if not match_scorer_agent:
+        raise HTTPException(status_code=503, detail="Match scorer agent not initialized")
+
+    user_profile = await _load_user_profile(current_user)
+
+    async def frames():
+        try:
+            async for frame in match_scorer_agent.astream_best_matches(
+                user_profile, top_n=top_n, shortlist_k=shortlist_k, merge=merge
+            ):
+                payload = json.dumps(frame)
+                yield f"event: {frame['event']}\ndata: {payload}\n\n" if format == StreamFormat.SSE else payload + "\n"
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            error = json.dumps({"event": "error", "detail": str(e)})
+            yield f"event: error\ndata: {error}\n\n" if format == StreamFormat.SSE else error + "\n"
+
+    return StreamingResponse(
+        frames(),
+        media_type=STREAM_MEDIA_TYPES[format],
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/match-report", response_model=List[MatchReport])
+async def match_report_route(
+    current_user: UserResponse = Depends(get_user_from_cookie),
+    candidate_ids: Optional[List[str]] = Query(
+        None, max_length=20, description="Profiles to report on; omit to use the top N matches"
+    ),
+    top_n: int = Query(3, ge=1, le=20),
+    housing_top_n: int = Query(MatchReportPipeline.DEFAULT_HOUSING_TOP_N, ge=0, le=10),
+    budget_ms: int = Query(
+        DEFAULT_LATENCY_BUDGET_MS, ge=0, le=MAX_LATENCY_BUDGET_MS,
+        description="Latency budget; LLM parts that miss it are rule-based and the report is provisional"
+    ),
+):
+    """
+    Score, red flags, shared housing and explanation for each candidate in one call.
+    Profiles are fetched once; scoring, red flags and housing run concurrently and the
+    explanation is generated from their results.
+    """
+    if not (match_scorer_agent and red_flag_agent and match_explainer_agent):
+        raise HTTPException(status_code=503, detail="Match agents not initialized")
+    if candidate_ids is not None and not all(ObjectId.is_valid(pid) for pid in candidate_ids):
+        raise HTTPException(status_code=400, detail="Invalid candidate profile ID")
+
+    user_profile = await _load_user_profile(current_user)
+    try:
+        return await match_report_pipeline.abuild(
+            user_profile.dict(), candidate_ids=candidate_ids, top_n=top_n, housing_top_n=housing_top_n,
+            timeout=budget_ms / 1000,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building match report: {e}")
+
+
+@router.get("/score-cache/stats")
+def score_cache_stats(current_user: UserResponse = Depends(get_user_from_cookie)) -> Dict[str, Any]:
+    """Hit/miss counters of the pairwise compatibility score cache (for sizing it)."""
+    return pair_score_cache.stats()
+
+
+@router.get("/llm-gateway/stats")
+def llm_gateway_stats(current_user: UserResponse = Depends(get_user_from_cookie)) -> Dict[str, Any]:
+    """Circuit breaker state plus call, latency and token counters per agent and model."""
+    return llm_gateway.stats()
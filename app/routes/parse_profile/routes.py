@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 from utils.jwt_utils import get_user_from_cookie
 from routes.users.users_response_schemas import UserResponse
 from models.profile import ProfileCreate
@@ -10,8 +11,16 @@ router = APIRouter(prefix="/ai", tags=["AI Profile Reader"])
 class ParseProfileRequest(BaseModel):
     raw_profile_text: str
 
+class ParseProfilesRequest(BaseModel):
+    raw_profile_texts: List[str] = Field(..., min_length=1, max_length=5000)
+
+class ParsedProfileItem(BaseModel):
+    profile: Optional[ProfileCreate] = None
+    source: str = Field(..., description="cache, llm or fallback")
+    error: Optional[str] = None
+
 @router.post("/parse-profile", response_model=ProfileCreate)
-def parse_profile(
+async def parse_profile(
     request: ParseProfileRequest,
     current_user: UserResponse = Depends(get_user_from_cookie)
 ):
@@ -20,7 +29,33 @@ def parse_profile(
     Does NOT save to MongoDB.
     """
     try:
-        parsed = profile_reader.parse_profile(request.raw_profile_text)
+        parsed = await profile_reader.aparse_profile(request.raw_profile_text)
         return ProfileCreate(**parsed)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/parse-profiles", response_model=List[ParsedProfileItem])
+async def parse_profiles(
+    request: ParseProfilesRequest,
+    current_user: UserResponse = Depends(get_user_from_cookie)
+):
+    """
+    Batch version of /parse-profile: one result per input text, in the same order.
+    Duplicate ads are parsed once and several ads share each LLM call.
+    Does NOT save to MongoDB.
+    """
+    if not profile_reader:
+        raise HTTPException(status_code=503, detail="Profile reader not initialized")
+    try:
+        return await profile_reader.aparse_profiles(request.raw_profile_texts)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/parse-cache/stats")
+def parse_cache_stats(current_user: UserResponse = Depends(get_user_from_cookie)) -> Dict[str, Any]:
+    """Hit/miss counters and size of the parsed-profile cache."""
+    if not profile_reader:
+        raise HTTPException(status_code=503, detail="Profile reader not initialized")
+    return profile_reader.cache.stats()
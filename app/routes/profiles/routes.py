@@ -1,45 +1,51 @@
-from fastapi import APIRouter, HTTPException, Path, Depends
+from fastapi import APIRouter, HTTPException, Path, Depends, BackgroundTasks
 from models.profile import ProfileCreate
 from routes.profiles.profiles_response_schemas import ProfileResponse
-from db.mongo import get_profiles_collection, get_users_collection
+from db.mongo import get_async_profiles_collection, get_async_users_collection
 from bson import ObjectId
 from typing import List
 from utils.jwt_utils import get_user_from_cookie
 from routes.users.users_response_schemas import UserResponse
+from services.pair_score_cache import pair_score_cache, red_flag_cache
+from services.matchmaker import matchmaker
 
 router = APIRouter(prefix="/profiles", tags=["Profiles"])
 
 
 # --- Create Profile ---
 @router.post("/", response_model=ProfileResponse)
-def create_profile(
+async def create_profile(
     request: ProfileCreate,
+    background_tasks: BackgroundTasks,
     current_user: UserResponse = Depends(get_user_from_cookie)
 ):
-    profiles_collection = get_profiles_collection()
-    users_collection = get_users_collection()
+    profiles_collection = get_async_profiles_collection()
+    users_collection = get_async_users_collection()
 
     # Check if user already has a profile
-    user_doc = users_collection.find_one({"_id": ObjectId(current_user.id)})
+    user_doc = await users_collection.find_one({"_id": ObjectId(current_user.id)})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     if user_doc.get("profile_id"):
         raise HTTPException(status_code=400, detail="User already has a profile")
 
     # Insert the new profile
-    result = profiles_collection.insert_one(request.dict())
-    db_profile = profiles_collection.find_one({"_id": result.inserted_id})
+    result = await profiles_collection.insert_one(request.dict())
+    db_profile = await profiles_collection.find_one({"_id": result.inserted_id})
 
     # Update the user's profile_id in the users collection
-    update_result = users_collection.update_one(
+    update_result = await users_collection.update_one(
         {"_id": ObjectId(current_user.id)},
         {"$set": {"profile_id": str(result.inserted_id)}}
     )
     if update_result.matched_count == 0:
         # Rollback: delete the profile if user update fails
-        profiles_collection.delete_one({"_id": result.inserted_id})
+        await profiles_collection.delete_one({"_id": result.inserted_id})
         raise HTTPException(status_code=500, detail="Failed to assign profile to user")
 
+    # Add the new profile to the match index after the response is sent
+    background_tasks.add_task(matchmaker.on_profile_upserted, str(result.inserted_id))
+
     # Return the created profile
     return ProfileResponse(
         id=str(db_profile["_id"]),
@@ -57,8 +63,8 @@ def create_profile(
 
 # --- Get All Profiles ---
 @router.get("/", response_model=List[ProfileResponse])
-def get_profiles(current_user: UserResponse = Depends(get_user_from_cookie)):
-    profiles_collection = get_profiles_collection()
+async def get_profiles(current_user: UserResponse = Depends(get_user_from_cookie)):
+    profiles_collection = get_async_profiles_collection()
     profiles = profiles_collection.find()
     return [
         ProfileResponse(
@@ -73,20 +79,20 @@ def get_profiles(current_user: UserResponse = Depends(get_user_from_cookie)):
             study_habits=profile.get("study_habits"),
             food_pref=profile.get("food_pref"),
         )
-        for profile in profiles
+        async for profile in profiles
     ]
 
 
 # --- Get Profile by ID ---
 @router.get("/{profile_id}", response_model=ProfileResponse)
-def get_profile(profile_id: str = Path(..., description="Profile ID"), current_user: UserResponse = Depends(get_user_from_cookie)):
-    profiles_collection = get_profiles_collection()
+async def get_profile(profile_id: str = Path(..., description="Profile ID"), current_user: UserResponse = Depends(get_user_from_cookie)):
+    profiles_collection = get_async_profiles_collection()
     try:
         obj_id = ObjectId(profile_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid profile ID format")
 
-    profile = profiles_collection.find_one({"_id": obj_id})
+    profile = await profiles_collection.find_one({"_id": obj_id})
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
@@ -106,23 +112,28 @@ def get_profile(profile_id: str = Path(..., description="Profile ID"), current_u
 
 # --- Delete Profile ---
 @router.delete("/{profile_id}")
-def delete_profile(profile_id: str = Path(..., description="Profile ID"), current_user: UserResponse = Depends(get_user_from_cookie)):
-    profiles_collection = get_profiles_collection()
+async def delete_profile(background_tasks: BackgroundTasks, profile_id: str = Path(..., description="Profile ID"), current_user: UserResponse = Depends(get_user_from_cookie)):
+    profiles_collection = get_async_profiles_collection()
     try:
         obj_id = ObjectId(profile_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid profile ID format")
 
-    result = profiles_collection.delete_one({"_id": obj_id})
+    result = await profiles_collection.delete_one({"_id": obj_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Profile not found")
+
+    # Drop cached pair scores and red flags involving this profile
+    await pair_score_cache.ainvalidate_profile(profile_id)
+    await red_flag_cache.ainvalidate_profile(profile_id)
+    background_tasks.add_task(matchmaker.on_profile_deleted, profile_id)
     return {"detail": "Profile deleted successfully"}
 
 
 # --- Update Profile ---
 @router.patch("/{profile_id}")
-def update_profile(profile_id: str, update: dict, current_user: UserResponse = Depends(get_user_from_cookie)):
-    profiles_collection = get_profiles_collection()
+async def update_profile(profile_id: str, update: dict, background_tasks: BackgroundTasks, current_user: UserResponse = Depends(get_user_from_cookie)):
+    profiles_collection = get_async_profiles_collection()
     try:
         obj_id = ObjectId(profile_id)
     except Exception:
@@ -131,8 +142,14 @@ def update_profile(profile_id: str, update: dict, current_user: UserResponse = D
     if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    result = profiles_collection.update_one({"_id": obj_id}, {"$set": update})
+    result = await profiles_collection.update_one({"_id": obj_id}, {"$set": update})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Profile not found")
 
+    # Cached pair scores and red flags were computed from the old content
+    if result.modified_count:
+        await pair_score_cache.ainvalidate_profile(profile_id)
+        await red_flag_cache.ainvalidate_profile(profile_id)
+        background_tasks.add_task(matchmaker.on_profile_upserted, profile_id)
+
     return {"detail": "Profile updated successfully"}
\ No newline at end of file
@@ -1,22 +1,118 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query
+from pydantic import BaseModel, Field
+from bson import ObjectId
+from bson.errors import InvalidId
+from typing import Dict, Any, List
 from utils.jwt_utils import get_user_from_cookie
 from routes.users.users_response_schemas import UserResponse
 from agents.red_flag_agent import red_flag_agent
+from agents.llm_gateway import DEFAULT_LATENCY_BUDGET_MS, MAX_LATENCY_BUDGET_MS
+from db.mongo import get_async_profiles_collection, get_async_users_collection
+from services.compatibility_engine import CompatibilityEngine
+from services.conflict_engine import conflict_engine
+from services.pair_score_cache import red_flag_cache
 
 router = APIRouter(prefix="/ai", tags=["AI Red Flag Detector"])
 
+MAX_BATCH_PROFILES = 200
+
+class BatchConflictsRequest(BaseModel):
+    profile_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_PROFILES)
+
+class PairConflicts(BaseModel):
+    profile_id: str
+    pair_id: str
+    red_flags: List[Dict[str, Any]]
+
+class BatchConflictsResponse(BaseModel):
+    profile_id: str
+    results: List[PairConflicts]
+    not_found: List[str] = []
+
+
+def _object_ids(profile_ids: List[str]) -> List[ObjectId]:
+    try:
+        return [ObjectId(pid) for pid in profile_ids]
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid profile ID in request")
+
+
+async def _load_user_profile_doc(current_user: UserResponse) -> Dict[str, Any]:
+    """Fetches the logged-in user's profile document (only the fields the conflict rules read)."""
+    try:
+        user_doc = await get_async_users_collection().find_one(
+            {"_id": ObjectId(current_user.id)}, {"profile_id": 1}
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not user_doc.get("profile_id"):
+        raise HTTPException(status_code=404, detail="No profile assigned to this user")
+
+    try:
+        profile_doc = await get_async_profiles_collection().find_one(
+            {"_id": ObjectId(user_doc["profile_id"])}, CompatibilityEngine.PROJECTION
+        )
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid profile ID in user document")
+    if not profile_doc:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    return profile_doc
+
 @router.post("/detect-conflicts")
-def detect_conflicts(
+async def detect_conflicts(
     profile_a: Dict[str, Any],
     profile_b: Dict[str, Any],
-    current_user: UserResponse = Depends(get_user_from_cookie)
+    current_user: UserResponse = Depends(get_user_from_cookie),
+    budget_ms: int = Query(
+        DEFAULT_LATENCY_BUDGET_MS, ge=0, le=MAX_LATENCY_BUDGET_MS,
+        description="Latency budget; past it the rule-based red flags are returned with provisional=true"
+    ),
 ):
     if not red_flag_agent:
         raise HTTPException(status_code=500, detail="RedFlagAgent not initialized. Check GROQ_API_KEY.")
     
     try:
-        result = red_flag_agent.detect_conflicts(profile_a, profile_b)
+        result = await red_flag_agent.adetect_conflicts(profile_a, profile_b, timeout=budget_ms / 1000)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/detect-conflicts/batch", response_model=BatchConflictsResponse)
+async def detect_conflicts_batch(
+    request: BatchConflictsRequest,
+    current_user: UserResponse = Depends(get_user_from_cookie)
+):
+    """
+    Rule-based red flags for the logged-in user against many profiles at once (e.g. the
+    conflict badges of a whole match list). All candidates are fetched in one query and
+    checked in a single vectorized pass; no LLM calls are made.
+    Results keep the order of `profile_ids`; unknown IDs are listed in `not_found`.
+    """
+    user_profile = await _load_user_profile_doc(current_user)
+    user_profile_id = str(user_profile["_id"])
+
+    object_ids = list(dict.fromkeys(_object_ids(request.profile_ids)))
+    requested = [str(oid) for oid in object_ids]
+    cursor = get_async_profiles_collection().find(
+        {"_id": {"$in": object_ids}}, CompatibilityEngine.PROJECTION
+    )
+    candidates = await cursor.to_list(length=None)
+
+    flags = conflict_engine.red_flags(user_profile, conflict_engine.encode(candidates))
+    return BatchConflictsResponse(
+        profile_id=user_profile_id,
+        results=[
+            PairConflicts(profile_id=pid, pair_id=f"{user_profile_id}_{pid}", red_flags=flags[pid])
+            for pid in requested if pid in flags
+        ],
+        not_found=[pid for pid in requested if pid not in flags],
+    )
+
+
+@router.get("/red-flag-cache/stats")
+def red_flag_cache_stats(current_user: UserResponse = Depends(get_user_from_cookie)) -> Dict[str, Any]:
+    """Hit/miss counters of the red-flag result cache."""
+    return red_flag_cache.stats()
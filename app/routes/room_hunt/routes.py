@@ -1,47 +1,68 @@
 # routes/ai/room_hunter_route.py
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Dict, Any, Optional
 from bson import ObjectId
 
-from db.mongo import get_profiles_collection
+from db.mongo import get_async_profiles_collection
 from utils.jwt_utils import get_user_from_cookie
 from routes.users.users_response_schemas import UserResponse
-from agents.room_hunter_agent import room_hunter_agent
+from agents.room_hunter_agent import room_hunter_agent, ScoringMode
+from agents.llm_gateway import DEFAULT_LATENCY_BUDGET_MS, MAX_LATENCY_BUDGET_MS
 
 router = APIRouter(prefix="/ai", tags=["Housing"])
 
 
+async def _hydrate_profiles(profiles: List[Dict[str, Any]]) -> None:
+    """Fetch full profiles if IDs are passed."""
+    profiles_collection = get_async_profiles_collection()
+    for profile in profiles:
+        if "id" in profile and not all(k in profile for k in ["city", "area", "budget_PKR"]):
+            db_profile = await profiles_collection.find_one({"_id": ObjectId(profile["id"])})
+            if not db_profile:
+                raise HTTPException(status_code=404, detail=f"Profile {profile['id']} not found")
+            profile.update({
+                "city": db_profile.get("city"),
+                "area": db_profile.get("area"),
+                "budget_PKR": db_profile.get("budget_PKR"),
+                "sleep_schedule": db_profile.get("sleep_schedule"),
+                "cleanliness": db_profile.get("cleanliness"),
+                "noise_tolerance": db_profile.get("noise_tolerance"),
+                "study_habits": db_profile.get("study_habits"),
+                "food_pref": db_profile.get("food_pref"),
+                "id": str(db_profile["_id"])  # ensure JSON-serializable
+            })
+
+
 @router.post("/top_housing_matches")
-def top_housing_matches_route(
+async def top_housing_matches_route(
     profile_a: Dict[str, Any],
     profile_b: Dict[str, Any],
     current_user: UserResponse = Depends(get_user_from_cookie),
-    top_n: int = 10
+    top_n: int = 10,
+    scoring_mode: ScoringMode = Query(
+        ScoringMode.PIPELINE, description="Score listings inside MongoDB (pipeline) or in the API process (python)"
+    ),
+    latitude: Optional[float] = Query(None, ge=-90, le=90, description="Favour listings close to this point"),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    budget_ms: int = Query(
+        DEFAULT_LATENCY_BUDGET_MS, ge=0, le=MAX_LATENCY_BUDGET_MS,
+        description="Latency budget; listings whose LLM reason misses it get a rule-based reason and provisional=true"
+    ),
 ) -> List[Dict[str, Any]]:
     if not room_hunter_agent:
         raise HTTPException(status_code=500, detail="RoomHunterAgent not initialized.")
+    if (latitude is None) != (longitude is None):
+        raise HTTPException(status_code=400, detail="latitude and longitude must be given together")
+    near = (latitude, longitude) if latitude is not None else None
 
     try:
-        # Fetch full profiles if IDs are passed
-        profiles_collection = get_profiles_collection()
-        for profile in [profile_a, profile_b]:
-            if "id" in profile and not all(k in profile for k in ["city", "area", "budget_PKR"]):
-                db_profile = profiles_collection.find_one({"_id": ObjectId(profile["id"])})
-                if not db_profile:
-                    raise HTTPException(status_code=404, detail=f"Profile {profile['id']} not found")
-                profile.update({
-                    "city": db_profile.get("city"),
-                    "area": db_profile.get("area"),
-                    "budget_PKR": db_profile.get("budget_PKR"),
-                    "sleep_schedule": db_profile.get("sleep_schedule"),
-                    "cleanliness": db_profile.get("cleanliness"),
-                    "noise_tolerance": db_profile.get("noise_tolerance"),
-                    "study_habits": db_profile.get("study_habits"),
-                    "food_pref": db_profile.get("food_pref"),
-                    "id": str(db_profile["_id"])  # ensure JSON-serializable
-                })
-
-        matches = room_hunter_agent.get_top_housing_matches([profile_a, profile_b], top_n=top_n)
+        await _hydrate_profiles([profile_a, profile_b])
+
+        # Short reasons for the top listings are generated concurrently
+        matches = await room_hunter_agent.aget_top_housing_matches(
+            [profile_a, profile_b], top_n=top_n, scoring_mode=scoring_mode, near=near,
+            timeout=budget_ms / 1000,
+        )
 
         # Convert all ObjectIds to strings in the response
         json_matches = []
@@ -55,3 +76,36 @@ def top_housing_matches_route(
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error computing housing matches: {e}")
+
+
+@router.get("/housing-reason-cache/stats")
+def housing_reason_cache_stats(current_user: UserResponse = Depends(get_user_from_cookie)) -> Dict[str, Any]:
+    """Hit/miss counters of the cached LLM short reasons."""
+    return room_hunter_agent.reason_cache.stats()
+
+
+@router.get("/nearby_listings")
+async def nearby_listings_route(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, description="Only listings within this radius; omit for k-nearest"),
+    limit: int = Query(20, ge=1, le=200),
+    min_rent: Optional[int] = Query(None, ge=0),
+    max_rent: Optional[int] = Query(None, ge=0),
+    availability: Optional[str] = Query("Available", description="Pass an empty value to include every listing"),
+    current_user: UserResponse = Depends(get_user_from_cookie),
+) -> List[Dict[str, Any]]:
+    """Closest listings first, from a $geoNear query on the 2dsphere location index."""
+    try:
+        listings = await room_hunter_agent.anearby_listings(
+            latitude,
+            longitude,
+            radius_km=radius_km,
+            limit=limit,
+            min_rent=min_rent,
+            max_rent=max_rent,
+            availability=availability,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching nearby listings: {e}")
+    return [listing.dict() for listing in listings]
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Path, Depends, Response, Query, status
+from fastapi import APIRouter, HTTPException, Path, Depends, Response, Query, status, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from models.user import UserCreate
 from routes.users.users_response_schemas import UserResponse, LoginRequest, LoginResponse, EmailRequest, GoogleAuthSchema, UserLikes
-from utils.jwt_utils import create_access_token, get_user_from_cookie
-from db.mongo import get_users_collection, get_user_likes_collection
+from utils.jwt_utils import create_access_token, get_user_from_cookie, get_token_payload
+from services.token_revocation import token_revocations
+from services.password_hasher import password_hasher, PasswordHasherBusyError
+from utils.metrics import PASSWORD_REHASHES
+from db.mongo import get_async_users_collection, get_async_user_likes_collection
 from passlib.context import CryptContext
 from bson import ObjectId
-from typing import List
-import bcrypt
+from pymongo.errors import DuplicateKeyError
+from typing import Any, Dict, List
 from fastapi.security import OAuth2PasswordRequestForm
 import os
 import smtplib
@@ -28,18 +32,46 @@ EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS", "fwala442@gmail.com")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "mxgc zjbv agtj ksam")
 GOOGLE_CLIENT_ID=os.getenv("GOOGLE_CLIENT_ID")
 
+
+# bcrypt runs in its own process pool; a full queue means "try again shortly", not a crash
+async def _hash_password(password: str) -> str:
+    try:
+        return await password_hasher.ahash(password)
+    except PasswordHasherBusyError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+
+async def _check_password(password: str, hashed: str) -> bool:
+    try:
+        return await password_hasher.averify(password, hashed)
+    except PasswordHasherBusyError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+
+async def _rehash_password(user_id: ObjectId, password: str, old_hash: str):
+    """Upgrades a hash made with another bcrypt cost; runs after the login response."""
+    try:
+        new_hash = await password_hasher.ahash(password)
+        # Only replace the hash we checked, never a password changed in the meantime
+        result = await get_async_users_collection().update_one(
+            {"_id": user_id, "password": old_hash}, {"$set": {"password": new_hash}}
+        )
+        if result.modified_count:
+            PASSWORD_REHASHES.inc()
+    except Exception as e:
+        print(f"⚠ Password rehash failed, will retry on next login: {e}")
+
+
 @router.post("/register", response_model=UserResponse)
-def register_user(request: UserCreate):
-    users_collection = get_users_collection()
+async def register_user(request: UserCreate):
+    users_collection = get_async_users_collection()
 
     # Check duplicate username
-    if users_collection.find_one({"username": request.username}):
+    if await users_collection.find_one({"username": request.username}):
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    # Hash password
-    hashed_password = bcrypt.hashpw(
-        request.password.encode("utf-8"), bcrypt.gensalt()
-    ).decode("utf-8")
+    # Hash password (CPU-bound, runs in the password hashing pool)
+    hashed_password = await _hash_password(request.password)
 
     # Create user object
     user = UserCreate(
@@ -51,21 +83,24 @@ def register_user(request: UserCreate):
         is_verified=False
     )
 
-    # Insert user
-    result = users_collection.insert_one(user.dict(by_alias=True))
-    db_user = users_collection.find_one({"_id": result.inserted_id})
+    # Insert user (the unique indexes also catch concurrent duplicate registrations)
+    try:
+        result = await users_collection.insert_one(user.dict(by_alias=True))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username or email already exists")
+    db_user = await users_collection.find_one({"_id": result.inserted_id})
 
     # Create verification token (simple random string, not JWT)
     verification_token = secrets.token_urlsafe(32)
 
     # Update DB with verification token
-    users_collection.update_one(
+    await users_collection.update_one(
         {"_id": result.inserted_id}, {"$set": {"verification_token": verification_token, "is_verified": False}}
     )
 
     # Send verification email
     email_request = EmailRequest(email=db_user["email"], token=verification_token)
-    send_verification_email(email_request)
+    await send_verification_email(email_request)
 
     return UserResponse(
         id=str(db_user["_id"]),
@@ -76,11 +111,19 @@ def register_user(request: UserCreate):
     )
 
 
-def send_verification_email(request: EmailRequest):
-    users = get_users_collection()
+def _send_email(sender: str, password: str, receiver: str, msg: MIMEMultipart):
+    """Blocking SMTP delivery, run in the threadpool."""
+    with smtplib.SMTP("smtp.gmail.com", 587) as server:
+        server.starttls()
+        server.login(sender, password)
+        server.sendmail(sender, receiver, msg.as_string())
+
+
+async def send_verification_email(request: EmailRequest):
+    users = get_async_users_collection()
 
     # ✅ Save token in DB
-    users.update_one(
+    await users.update_one(
         {"email": request.email},
         {"$set": {"verification_token": request.token}}
     )
@@ -100,10 +143,7 @@ def send_verification_email(request: EmailRequest):
 
         msg.attach(MIMEText(body, "plain"))
 
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(sender, password)
-            server.sendmail(sender, receiver, msg.as_string())
+        await run_in_threadpool(_send_email, sender, password, receiver, msg)
 
         return {"status": "success", "message": f"Verification email sent to {receiver}"}
 
@@ -111,13 +151,13 @@ def send_verification_email(request: EmailRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/verify")
-def verify_email(token: str = Query(...), email: str = Query(...)):
-    users = get_users_collection()
+async def verify_email(token: str = Query(...), email: str = Query(...)):
+    users = get_async_users_collection()
     
     print(f"Verification attempt: email={email}, token={token}")
     
     # First, check if user exists by email
-    user = users.find_one({"email": email})
+    user = await users.find_one({"email": email})
     if not user:
         print(f"User not found for email: {email}")
         raise HTTPException(status_code=400, detail="User not found")
@@ -139,7 +179,7 @@ def verify_email(token: str = Query(...), email: str = Query(...)):
         raise HTTPException(status_code=400, detail="Invalid verification token")
     
     # ✅ Mark verified
-    users.update_one(
+    await users.update_one(
         {"email": email},
         {"$set": {"is_verified": True}, "$unset": {"verification_token": ""}}
     )
@@ -153,21 +193,15 @@ def verify_email(token: str = Query(...), email: str = Query(...)):
         user.get("profile_id"),
         True  # Now verified
     )
-    
-    # ✅ Update user with new JWT token
-    users.update_one(
-        {"email": email},
-        {"$set": {"token": new_token}}
-    )
 
     print(f"Email verification successful for: {email}")
     return {"status": "success", "message": "Email verified successfully!", "access_token": new_token}
 
 @router.post("/resend-verification")
-def resend_verification_email(email: str):
-    users = get_users_collection()
+async def resend_verification_email(email: str):
+    users = get_async_users_collection()
     
-    user = users.find_one({"email": email})
+    user = await users.find_one({"email": email})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -178,22 +212,22 @@ def resend_verification_email(email: str):
     verification_token = secrets.token_urlsafe(32)
     
     # Update user with new verification token
-    users.update_one(
+    await users.update_one(
         {"email": email},
         {"$set": {"verification_token": verification_token}}
     )
     
     # Send verification email
     email_request = EmailRequest(email=email, token=verification_token)
-    send_verification_email(email_request)
+    await send_verification_email(email_request)
     
     return {"message": "Verification email sent successfully"}
 
 @router.get("/check-verification/{email}")
-def check_verification_status(email: str):
-    users = get_users_collection()
+async def check_verification_status(email: str):
+    users = get_async_users_collection()
     
-    user = users.find_one({"email": email})
+    user = await users.find_one({"email": email})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -205,12 +239,12 @@ def check_verification_status(email: str):
     }
 
 @router.post("/register-user")
-def register_user_public(username: str, password: str, listing_id: str = None, profile_id: str = None, email: str = None):
-    users_collection = get_users_collection()
-    if users_collection.find_one({"username": username}):
+async def register_user_public(username: str, password: str, listing_id: str = None, profile_id: str = None, email: str = None):
+    users_collection = get_async_users_collection()
+    if await users_collection.find_one({"username": username}):
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    hashed_password = await _hash_password(password)
     user = {
         "_id": ObjectId(),
         "username": username,
@@ -219,22 +253,27 @@ def register_user_public(username: str, password: str, listing_id: str = None, p
         "listing_id": listing_id,
         "profile_id": profile_id,
     }
-    users_collection.insert_one(user)
+    try:
+        await users_collection.insert_one(user)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username or email already exists")
     return {"message": "User registered successfully"}
 
 
 @router.post("/login", response_model=LoginResponse)
-def login_user(request: LoginRequest, response: Response):
-    users_collection = get_users_collection()
+async def login_user(request: LoginRequest, response: Response, background_tasks: BackgroundTasks):
+    users_collection = get_async_users_collection()
 
     # 🔑 Look up by email instead of username
-    user_data = users_collection.find_one({"email": request.email})
+    user_data = await users_collection.find_one({"email": request.email})
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     # ✅ Check password
-    if not bcrypt.checkpw(request.password.encode("utf-8"), user_data["password"].encode("utf-8")):
+    if not await _check_password(request.password, user_data["password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if password_hasher.needs_rehash(user_data["password"]):
+        background_tasks.add_task(_rehash_password, user_data["_id"], request.password, user_data["password"])
 
     # ✅ Create access token
     token = create_access_token(
@@ -246,9 +285,6 @@ def login_user(request: LoginRequest, response: Response):
         is_verified=user_data.get("is_verified", False)
     )
 
-    # ✅ Save token in DB
-    users_collection.update_one({"_id": user_data["_id"]}, {"$set": {"token": token}})
-
     # ✅ Set cookie
     response.set_cookie(
         key="access_token",
@@ -271,15 +307,17 @@ def login_user(request: LoginRequest, response: Response):
 
 
 @router.post("/token")
-def login_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    users_collection = get_users_collection()
+async def login_token(background_tasks: BackgroundTasks, form_data: OAuth2PasswordRequestForm = Depends()):
+    users_collection = get_async_users_collection()
     # Try to find user by email first, then by username for backward compatibility
-    user_data = users_collection.find_one({"email": form_data.username}) or users_collection.find_one({"username": form_data.username})
+    user_data = await users_collection.find_one({"email": form_data.username}) or await users_collection.find_one({"username": form_data.username})
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid email/username or password")
 
-    if not bcrypt.checkpw(form_data.password.encode("utf-8"), user_data["password"].encode("utf-8")):
+    if not await _check_password(form_data.password, user_data["password"]):
         raise HTTPException(status_code=401, detail="Invalid email/username or password")
+    if password_hasher.needs_rehash(user_data["password"]):
+        background_tasks.add_task(_rehash_password, user_data["_id"], form_data.password, user_data["password"])
 
     token = create_access_token(
         str(user_data["_id"]),
@@ -289,49 +327,46 @@ def login_token(form_data: OAuth2PasswordRequestForm = Depends()):
         user_data.get("profile_id"),
         user_data.get("is_verified", False),
     )
-    users_collection.update_one({"_id": user_data["_id"]}, {"$set": {"token": token}})
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.post("/logout")
-def logout_user(response: Response, current_user: UserResponse = Depends(get_user_from_cookie)):
-    users_collection = get_users_collection()
-    result = users_collection.update_one({"_id": ObjectId(current_user.id)}, {"$unset": {"token": ""}})
+async def logout_user(response: Response, token: Dict[str, Any] = Depends(get_token_payload)):
+    # Revoke this token; it is rejected from now on, even if the client keeps it
+    await token_revocations.arevoke(token["jti"], token["exp"], token["id"])
     response.delete_cookie("access_token")
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="User not found or already logged out")
     return {"message": "Successfully logged out"}
 
 
 @router.get("/all", response_model=List[UserResponse])
-def get_all_users():
-    users_collection = get_users_collection()
+async def get_all_users():
+    users_collection = get_async_users_collection()
     users = users_collection.find()
-    return [UserResponse(**{**user, "id": str(user["_id"])}) for user in users]
+    return [UserResponse(**{**user, "id": str(user["_id"])}) async for user in users]
 
 
 @router.delete("/{user_id}")
-def delete_user(user_id: str = Path(..., description="The ID of the user to delete")):
-    users_collection = get_users_collection()
+async def delete_user(user_id: str = Path(..., description="The ID of the user to delete")):
+    users_collection = get_async_users_collection()
     try:
         obj_id = ObjectId(user_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid user ID format")
 
-    result = users_collection.delete_one({"_id": obj_id})
+    result = await users_collection.delete_one({"_id": obj_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     return {"detail": "User deleted successfully"}
 
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: UserResponse = Depends(get_user_from_cookie)):
+async def get_me(current_user: UserResponse = Depends(get_user_from_cookie)):
     return current_user
 
 
 @router.patch("/{user_id}")
-def update_user(user_id: str, update: dict):
-    users_collection = get_users_collection()
+async def update_user(user_id: str, update: dict):
+    users_collection = get_async_users_collection()
     try:
         obj_id = ObjectId(user_id)
     except Exception:
@@ -341,7 +376,7 @@ def update_user(user_id: str, update: dict):
     if "username" in update:
         update_fields["username"] = update["username"]
     if "password" in update and update["password"]:
-        update_fields["password"] = bcrypt.hashpw(update["password"].encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        update_fields["password"] = await _hash_password(update["password"])
     if "listing_id" in update:
         update_fields["listing_id"] = update["listing_id"]
     if "profile_id" in update:
@@ -350,15 +385,18 @@ def update_user(user_id: str, update: dict):
     if not update_fields:
         raise HTTPException(status_code=400, detail="No valid fields to update")
 
-    result = users_collection.update_one({"_id": obj_id}, {"$set": update_fields})
+    try:
+        result = await users_collection.update_one({"_id": obj_id}, {"$set": update_fields})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username already exists")
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     return {"detail": "User updated successfully"}
 
 
 @router.post("/google")
-def google_login(payload: GoogleAuthSchema, response: Response):
-    users_collection = get_users_collection()
+async def google_login(payload: GoogleAuthSchema, response: Response):
+    users_collection = get_async_users_collection()
 
     if not GOOGLE_CLIENT_ID:
         raise HTTPException(
@@ -368,7 +406,8 @@ def google_login(payload: GoogleAuthSchema, response: Response):
 
     # ✅ Verify Google token
     try:
-        idinfo = google_id_token.verify_oauth2_token(
+        idinfo = await run_in_threadpool(
+            google_id_token.verify_oauth2_token,
             payload.id_token,
             google_requests.Request(),
             GOOGLE_CLIENT_ID,
@@ -389,7 +428,7 @@ def google_login(payload: GoogleAuthSchema, response: Response):
         )
 
     # ✅ Check if user exists in Mongo
-    user = users_collection.find_one({"email": email})
+    user = await users_collection.find_one({"email": email})
 
     if not user:
         # Create new user in Mongo
@@ -401,8 +440,24 @@ def google_login(payload: GoogleAuthSchema, response: Response):
             "listing_id": None,
             "profile_id": None,
         }
-        result = users_collection.insert_one(new_user)
-        user = users_collection.find_one({"_id": result.inserted_id})
+        try:
+            result = await users_collection.insert_one(new_user)
+            user = await users_collection.find_one({"_id": result.inserted_id})
+        except DuplicateKeyError:
+            # A concurrent Google login may have just created this email's user
+            user = await users_collection.find_one({"email": email})
+        if not user:
+            # Display name already taken as a username: fall back to the (unique) email
+            new_user["username"] = email
+            new_user.pop("_id", None)
+            try:
+                result = await users_collection.insert_one(new_user)
+                user = await users_collection.find_one({"_id": result.inserted_id})
+            except DuplicateKeyError:
+                user = await users_collection.find_one({"email": email})
+            if not user:
+                # The email is someone else's username
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An account with this username already exists")
 
     # ✅ Generate token
     token = create_access_token(
@@ -414,9 +469,6 @@ def google_login(payload: GoogleAuthSchema, response: Response):
         user.get("is_verified", True)  # Google users are automatically verified
     )
 
-    # Update user with token in database
-    users_collection.update_one({"_id": user["_id"]}, {"$set": {"token": token}})
-
     # Set cookie for authentication
     response.set_cookie(
         key="access_token",
@@ -430,30 +482,30 @@ def google_login(payload: GoogleAuthSchema, response: Response):
 
 
 @router.post("/like-profile/{profile_id}")
-def like_profile(profile_id: str, current_user: UserResponse = Depends(get_user_from_cookie)):
+async def like_profile(profile_id: str, current_user: UserResponse = Depends(get_user_from_cookie)):
     """Add a profile to the user's liked list"""
-    collection = get_user_likes_collection()
+    collection = get_async_user_likes_collection()
 
-    user_likes = collection.find_one({"user_id": current_user.id})
+    user_likes = await collection.find_one({"user_id": current_user.id})
     if user_likes:
         if profile_id in user_likes.get("liked_profile_ids", []):
             return {"message": "Profile already liked"}
-        collection.update_one({"user_id": current_user.id}, {"$push": {"liked_profile_ids": profile_id}})
+        await collection.update_one({"user_id": current_user.id}, {"$push": {"liked_profile_ids": profile_id}})
     else:
-        collection.insert_one({"user_id": current_user.id, "liked_profile_ids": [profile_id]})
+        await collection.insert_one({"user_id": current_user.id, "liked_profile_ids": [profile_id]})
 
     return {"message": f"Profile {profile_id} liked successfully"}
 
 @router.post("/unlike-profile/{profile_id}")
-def unlike_profile(profile_id: str, current_user: UserResponse = Depends(get_user_from_cookie)):
+async def unlike_profile(profile_id: str, current_user: UserResponse = Depends(get_user_from_cookie)):
     """Remove a profile from the user's liked list"""
-    collection = get_user_likes_collection()
-    collection.update_one({"user_id": current_user.id}, {"$pull": {"liked_profile_ids": profile_id}})
+    collection = get_async_user_likes_collection()
+    await collection.update_one({"user_id": current_user.id}, {"$pull": {"liked_profile_ids": profile_id}})
     return {"message": f"Profile {profile_id} unliked successfully"}
 
 @router.get("/liked-profiles", response_model=List[str])
-def get_liked_profiles(current_user: UserResponse = Depends(get_user_from_cookie)):
+async def get_liked_profiles(current_user: UserResponse = Depends(get_user_from_cookie)):
     """Get all profiles liked by the current user"""
-    collection = get_user_likes_collection()
-    user_likes = collection.find_one({"user_id": current_user.id})
+    collection = get_async_user_likes_collection()
+    user_likes = await collection.find_one({"user_id": current_user.id})
     return user_likes.get("liked_profile_ids", []) if user_likes else []
\ No newline at end of file
@@ -1,15 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Query
 from typing import Dict, Any, List
 from utils.jwt_utils import get_user_from_cookie
 from routes.users.users_response_schemas import UserResponse
 from agents.wingman_agent import match_explainer_agent
+from agents.llm_gateway import DEFAULT_LATENCY_BUDGET_MS, MAX_LATENCY_BUDGET_MS
+from services.explanation_cache import explanation_cache
 
 router = APIRouter(prefix="/ai", tags=["AI Match Explainer"])
 
 @router.post("/generate-explanation")
-def generate_explanation(
+async def generate_explanation(
     request: Dict[str, Any] = Body(...),
-    current_user: UserResponse = Depends(get_user_from_cookie)
+    current_user: UserResponse = Depends(get_user_from_cookie),
+    budget_ms: int = Query(
+        DEFAULT_LATENCY_BUDGET_MS, ge=0, le=MAX_LATENCY_BUDGET_MS,
+        description="Latency budget; past it the rule-based explanation is returned with provisional=true"
+    ),
 ):
     if not match_explainer_agent:
         raise HTTPException(status_code=500, detail="MatchExplainerAgent not initialized. Check GROQ_API_KEY.")
@@ -19,11 +25,18 @@ def generate_explanation(
         match_reasons = request.get("match_reasons", [])
         red_flags = request.get("red_flags", [])
 
-        result = match_explainer_agent.generate_explanation(
+        result = await match_explainer_agent.agenerate_explanation(
             match_score=match_score,
             match_reasons=match_reasons,
-            red_flags=red_flags
+            red_flags=red_flags,
+            timeout=budget_ms / 1000,
         )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/explanation-cache/stats")
+def explanation_cache_stats(current_user: UserResponse = Depends(get_user_from_cookie)) -> Dict[str, Any]:
+    """Hit/miss counters of the signature-keyed explanation cache."""
+    return explanation_cache.stats()
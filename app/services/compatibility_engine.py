@@ -0,0 +1,175 @@
+# services/compatibility_engine.py
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from models.profile import SleepSchedule, Cleanliness, NoiseTolerance, StudyHabits, FoodPref
+
+
+# --- Encoding ---
+class ProfileEncoder:
+    """
+    Maps the categorical profile fields onto stable integer codes.
+    Enum members get the first codes (in declaration order); any other value seen in the
+    database (legacy strings, None) is appended to the vocabulary on first sight, so code
+    equality is exactly value equality.
+    """
+    FIELDS = {
+        "sleep_schedule": SleepSchedule,
+        "cleanliness": Cleanliness,
+        "noise_tolerance": NoiseTolerance,
+        "study_habits": StudyHabits,
+        "food_pref": FoodPref,
+    }
+    FIELD_NAMES = list(FIELDS)
+
+    def __init__(self):
+        self._vocab: Dict[str, Dict[Any, int]] = {
+            field: {member.value: code for code, member in enumerate(enum)}
+            for field, enum in self.FIELDS.items()
+        }
+
+    def code(self, field: str, value: Any) -> int:
+        if isinstance(value, Enum):
+            value = value.value
+        try:
+            hash(value)
+        except TypeError:
+            value = repr(value)
+        vocab = self._vocab[field]
+        return vocab.setdefault(value, len(vocab))
+
+    def column(self, field: str) -> int:
+        return self.FIELD_NAMES.index(field)
+
+
+class EncodedProfiles:
+    """Column-oriented integer view of a batch of profiles."""
+
+    def __init__(self, ids: List[str], budgets: np.ndarray, codes: np.ndarray):
+        self.ids = ids
+        self.budgets = budgets  # (n,) int64
+        self.codes = codes      # (n, len(ProfileEncoder.FIELDS)) int32
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _profile_id(profile: Dict[str, Any]) -> str:
+    return str(profile.get("_id", profile.get("id")))
+
+
+# --- Engine ---
+class CompatibilityEngine:
+    """
+    Vectorized version of MatchScorerAgent._rule_based_fallback.
+    Scores one profile against a whole encoded batch in a single NumPy pass and returns
+    the same scores and reasons as the per-pair rule-based scorer.
+    """
+    # (max budget difference, points, reason); anything above the last tier scores 0
+    BUDGET_TIERS = (
+        (10000, 30, "Budgets are similar"),
+        (30000, 15, "Budgets are moderately compatible"),
+    )
+    BUDGET_MISMATCH_REASON = "Budgets differ significantly"
+
+    # (field, points, reason) awarded when both profiles have the same value
+    PREFERENCE_RULES = (
+        ("sleep_schedule", 20, "Sleep schedules match"),
+        ("cleanliness", 20, "Cleanliness preferences match"),
+        ("noise_tolerance", 15, "Noise tolerance matches"),
+        ("study_habits", 15, "Study habits match"),
+    )
+    MAX_SCORE = 100
+
+    # Only these fields are needed to score a candidate
+    PROJECTION = {"_id": 1, "budget_PKR": 1, **{field: 1 for field in ProfileEncoder.FIELDS}}
+
+    def __init__(self):
+        self.encoder = ProfileEncoder()
+        self._rule_columns = np.array([self.encoder.column(f) for f, _, _ in self.PREFERENCE_RULES])
+        self._rule_points = np.array([p for _, p, _ in self.PREFERENCE_RULES], dtype=np.int64)
+        self._tier_limits = np.array([limit for limit, _, _ in self.BUDGET_TIERS], dtype=np.int64)
+        self._tier_points = np.array([p for _, p, _ in self.BUDGET_TIERS] + [0], dtype=np.int64)
+        self._tier_reasons = [r for _, _, r in self.BUDGET_TIERS] + [self.BUDGET_MISMATCH_REASON]
+
+    def encode_one(self, profile: Dict[str, Any]) -> Tuple[int, np.ndarray]:
+        codes = np.array(
+            [self.encoder.code(field, profile.get(field)) for field in ProfileEncoder.FIELD_NAMES],
+            dtype=np.int32,
+        )
+        return int(profile.get("budget_PKR") or 0), codes
+
+    def encode(self, profiles: Iterable[Dict[str, Any]]) -> EncodedProfiles:
+        """Encodes profiles (Mongo documents or dicts) into integer arrays."""
+        ids: List[str] = []
+        budgets: List[int] = []
+        rows: List[List[int]] = []
+        code = self.encoder.code
+        fields = ProfileEncoder.FIELD_NAMES
+        for profile in profiles:
+            ids.append(_profile_id(profile))
+            budgets.append(int(profile.get("budget_PKR") or 0))
+            rows.append([code(field, profile.get(field)) for field in fields])
+
+        codes = np.array(rows, dtype=np.int32).reshape(len(rows), len(fields))
+        return EncodedProfiles(ids, np.array(budgets, dtype=np.int64), codes)
+
+    def score(self, profile: Dict[str, Any], encoded: EncodedProfiles) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Scores `profile` against every encoded candidate.
+        Returns (scores, budget tier index per candidate, preference-match matrix).
+        """
+        budget, codes = self.encode_one(profile)
+        budget_diff = np.abs(encoded.budgets - budget)
+        tiers = np.searchsorted(self._tier_limits, budget_diff, side="left")
+        matches = encoded.codes[:, self._rule_columns] == codes[self._rule_columns]
+        scores = self._tier_points[tiers] + matches.astype(np.int64) @ self._rule_points
+        return np.minimum(scores, self.MAX_SCORE), tiers, matches
+
+    def reasons_for(self, tier: int, matches_row: np.ndarray) -> List[str]:
+        reasons = [self._tier_reasons[tier]]
+        reasons.extend(reason for (_, _, reason), hit in zip(self.PREFERENCE_RULES, matches_row) if hit)
+        return reasons
+
+    def top_matches(
+        self,
+        profile: Dict[str, Any],
+        encoded: EncodedProfiles,
+        top_n: int = 5,
+        exclude_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the top N candidates as {"profile_id", "score", "reasons"} dicts.
+        Uses a partial selection (argpartition) instead of a full sort; ties keep the
+        candidates' original order, like the stable sort in the per-pair path.
+        """
+        if top_n <= 0 or len(encoded) == 0:
+            return []
+
+        scores, tiers, matches = self.score(profile, encoded)
+        positions = np.arange(len(encoded), dtype=np.int64)
+        if exclude_id is not None:
+            positions = positions[np.array(encoded.ids) != exclude_id]
+        if positions.size == 0:
+            return []
+
+        # Lower key is better; unique per candidate so the ordering is total
+        keys = -scores[positions] * len(encoded) + positions
+        k = min(top_n, positions.size)
+        selected = np.argpartition(keys, k - 1)[:k]
+        selected = selected[np.argsort(keys[selected])]
+
+        return [
+            {
+                "profile_id": encoded.ids[i],
+                "score": int(scores[i]),
+                "reasons": self.reasons_for(int(tiers[i]), matches[i]),
+            }
+            for i in positions[selected]
+        ]
+
+
+# Singleton instance
+compatibility_engine = CompatibilityEngine()
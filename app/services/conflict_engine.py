@@ -0,0 +1,141 @@
+# services/conflict_engine.py
+from enum import Enum
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from models.profile import SleepSchedule, Cleanliness, NoiseTolerance, StudyHabits, FoodPref
+from services.compatibility_engine import CompatibilityEngine, EncodedProfiles, ProfileEncoder, compatibility_engine
+
+# Severity levels; 0 means "no conflict"
+NONE, LOW, MEDIUM, HIGH = 0, 1, 2, 3
+SEVERITY_NAMES = {LOW: "LOW", MEDIUM: "MEDIUM", HIGH: "HIGH"}
+
+
+def _matrix(enum: type, conflicts: Dict[Tuple[Enum, Enum], int]) -> np.ndarray:
+    """
+    Builds a symmetric severity matrix indexed by enum code (declaration order).
+    One extra row/column at the end stands for any value outside the enum (legacy strings,
+    None), which never produces a flag.
+    """
+    size = len(enum) + 1
+    matrix = np.zeros((size, size), dtype=np.int8)
+    codes = {member: code for code, member in enumerate(enum)}
+    for (a, b), severity in conflicts.items():
+        matrix[codes[a], codes[b]] = matrix[codes[b], codes[a]] = severity
+    return matrix
+
+
+class ConflictEngine:
+    """
+    Vectorized rule-based red-flag detector.
+    Each categorical field has a severity matrix over its enum values, so checking one
+    profile against N candidates is a single row lookup per field; budgets use gap tiers.
+    Severities follow the RedFlagAgent rubric: HIGH for sleep, major cleanliness and large
+    budget gaps, MEDIUM for study, food and noise friction.
+    """
+    # (field, flag type, severity matrix)
+    FIELD_RULES = (
+        ("sleep_schedule", "Sleep Schedule Mismatch", _matrix(SleepSchedule, {
+            (SleepSchedule.NIGHT_OWL, SleepSchedule.EARLY_RISER): HIGH,
+        })),
+        ("cleanliness", "Cleanliness Mismatch", _matrix(Cleanliness, {
+            (Cleanliness.TIDY, Cleanliness.MESSY): HIGH,
+            (Cleanliness.TIDY, Cleanliness.AVERAGE): LOW,
+            (Cleanliness.AVERAGE, Cleanliness.MESSY): LOW,
+        })),
+        ("noise_tolerance", "Noise Tolerance Mismatch", _matrix(NoiseTolerance, {
+            (NoiseTolerance.QUIET, NoiseTolerance.LOUD_OK): MEDIUM,
+            (NoiseTolerance.QUIET, NoiseTolerance.MODERATE): LOW,
+        })),
+        ("study_habits", "Study Habits Mismatch", _matrix(StudyHabits, {
+            # Calls and lectures in a room someone else studies or sleeps in
+            (StudyHabits.ONLINE_CLASSES, StudyHabits.ROOM_STUDY): MEDIUM,
+            (StudyHabits.LATE_NIGHT, StudyHabits.ROOM_STUDY): MEDIUM,
+            (StudyHabits.ONLINE_CLASSES, StudyHabits.LATE_NIGHT): LOW,
+        })),
+        ("food_pref", "Food Preference Mismatch", _matrix(FoodPref, {
+            (FoodPref.VEG, FoodPref.NON_VEG): MEDIUM,
+        })),
+    )
+    BUDGET_FLAG = "Budget Mismatch"
+    # (budget difference that must be exceeded, severity), in increasing order
+    BUDGET_TIERS = (
+        (10000, MEDIUM),
+        (30000, HIGH),
+    )
+
+    def __init__(self, engine: CompatibilityEngine = compatibility_engine):
+        # Shares the compatibility engine's encoder so one EncodedProfiles batch serves both
+        self.engine = engine
+        encoder = engine.encoder
+        self._columns = np.array([encoder.column(field) for field, _, _ in self.FIELD_RULES])
+        self._sizes = np.array([len(ProfileEncoder.FIELDS[field]) for field, _, _ in self.FIELD_RULES])
+        self._values = [[m.value for m in ProfileEncoder.FIELDS[field]] for field, _, _ in self.FIELD_RULES]
+        self._tier_limits = np.array([limit for limit, _ in self.BUDGET_TIERS], dtype=np.int64)
+        self._tier_severities = np.array([NONE] + [s for _, s in self.BUDGET_TIERS], dtype=np.int8)
+
+    def encode(self, profiles) -> EncodedProfiles:
+        return self.engine.encode(profiles)
+
+    def evaluate(self, profile: Dict[str, Any], encoded: EncodedProfiles) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Checks `profile` against every encoded candidate.
+        Returns (field severities (n, fields), budget severity (n,), budget difference (n,)).
+        """
+        budget, codes = self.engine.encode_one(profile)
+        own = np.minimum(codes[self._columns], self._sizes)
+        others = np.minimum(encoded.codes[:, self._columns], self._sizes)
+        severities = np.empty(others.shape, dtype=np.int8)
+        for j, (_, _, matrix) in enumerate(self.FIELD_RULES):
+            severities[:, j] = matrix[own[j]][others[:, j]]
+
+        budget_diff = np.abs(encoded.budgets - budget)
+        budget_severity = self._tier_severities[np.searchsorted(self._tier_limits, budget_diff, side="left")]
+        return severities, budget_severity, budget_diff
+
+    def _flags(self, own: np.ndarray, other: np.ndarray, severities: np.ndarray,
+               budget_severity: int, budget_diff: int) -> List[Dict[str, Any]]:
+        red_flags = []
+        for j, (_, flag_type, _) in enumerate(self.FIELD_RULES):
+            severity = int(severities[j])
+            if severity:
+                red_flags.append({
+                    "type": flag_type,
+                    "severity": SEVERITY_NAMES[severity],
+                    "evidence": f"{self._values[j][own[j]]} vs {self._values[j][other[j]]}.",
+                })
+        if budget_severity:
+            red_flags.append({
+                "type": self.BUDGET_FLAG,
+                "severity": SEVERITY_NAMES[budget_severity],
+                "evidence": f"Budgets differ by {budget_diff} PKR.",
+            })
+        return red_flags
+
+    def red_flags(self, profile: Dict[str, Any], encoded: EncodedProfiles) -> Dict[str, List[Dict[str, Any]]]:
+        """Red flags (same shape as RedFlagAgent output) for every candidate, keyed by profile ID."""
+        if len(encoded) == 0:
+            return {}
+        severities, budget_severity, budget_diff = self.evaluate(profile, encoded)
+        _, codes = self.engine.encode_one(profile)
+        own = codes[self._columns]
+        others = encoded.codes[:, self._columns]
+
+        # Only candidates with at least one flag need Python-level work
+        flagged = severities.any(axis=1) | (budget_severity > 0)
+        result = {pid: [] for pid in encoded.ids}
+        for i in np.flatnonzero(flagged):
+            result[encoded.ids[i]] = self._flags(
+                own, others[i], severities[i], int(budget_severity[i]), int(budget_diff[i])
+            )
+        return result
+
+    def detect(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Red flags for a single pair."""
+        encoded = self.encode([profile_b])
+        return self.red_flags(profile_a, encoded)[encoded.ids[0]]
+
+
+# Singleton instance
+conflict_engine = ConflictEngine()
@@ -0,0 +1,173 @@
+# services/explanation_cache.py
+import os
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from db.mongo import get_explanations_collection, get_async_explanations_collection
+from utils.cache import LRUCache
+
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "4096"))
+EXPLANATION_CACHE_TTL_DAYS = int(os.getenv("EXPLANATION_CACHE_TTL_DAYS", "90"))
+# How many of the most used signatures are loaded into memory at startup
+EXPLANATION_PREWARM_SIZE = int(os.getenv("EXPLANATION_PREWARM_SIZE", "1000"))
+# Usage counters are written to Mongo in one bulk write every this many lookups
+FLUSH_USES_EVERY = 200
+
+
+class ExplanationCache:
+    """
+    Two-tier cache of MatchExplainerAgent responses keyed by input signature.
+    Tier 1 is an in-process LRU, tier 2 the `explanations` collection with a TTL index
+    on `last_used_at`. Each document counts its `uses`, so the most common signatures
+    can be loaded into memory at startup (prewarm) and answered without a round trip.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = EXPLANATION_CACHE_SIZE,
+        ttl_days: int = EXPLANATION_CACHE_TTL_DAYS,
+        prewarm_size: int = EXPLANATION_PREWARM_SIZE,
+    ):
+        self.memory = LRUCache("explanations", maxsize=maxsize)
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.prewarm_size = prewarm_size
+        self.mongo_hits = 0
+        self.misses = 0
+        self.prewarmed = 0
+        self._uses: Counter = Counter()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _used(self, key: str) -> bool:
+        """Counts a use of `key`; returns True when the counters are due for a flush."""
+        self._uses[key] += 1
+        return sum(self._uses.values()) >= FLUSH_USES_EVERY
+
+    def _take_use_ops(self):
+        uses, self._uses = self._uses, Counter()
+        now = datetime.now(timezone.utc)
+        return [UpdateOne({"_id": key}, {"$inc": {"uses": n}, "$set": {"last_used_at": now}}) for key, n in uses.items()]
+
+    def flush_uses(self) -> None:
+        ops = self._take_use_ops()
+        if not ops:
+            return
+        try:
+            get_explanations_collection().bulk_write(ops, ordered=False)
+        except Exception as e:
+            print(f"⚠ Explanation cache usage flush failed: {e}")
+
+    async def aflush_uses(self) -> None:
+        ops = self._take_use_ops()
+        if not ops:
+            return
+        try:
+            await get_async_explanations_collection().bulk_write(ops, ordered=False)
+        except Exception as e:
+            print(f"⚠ Explanation cache usage flush failed: {e}")
+
+    def _schedule_flush(self) -> None:
+        # Runs off the request path; one flush at a time
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.aflush_uses())
+
+    # --- Lookups ---
+    def _remember(self, key: str, doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if doc is None:
+            self.misses += 1
+            return None
+        self.mongo_hits += 1
+        self.memory.set(key, doc["result"])
+        return doc["result"]
+
+    def _doc(self, signature: Dict[str, Any], model: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        return {
+            "$set": {"signature": signature, "model": model, "result": result, "last_used_at": now},
+            "$setOnInsert": {"created_at": now},
+            "$inc": {"uses": 1},
+        }
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.memory.get(key)
+        if result is None:
+            try:
+                doc = get_explanations_collection().find_one({"_id": key}, {"result": 1})
+            except Exception as e:
+                print(f"⚠ Explanation cache lookup failed: {e}")
+                doc = None
+            result = self._remember(key, doc)
+        if result is not None and self._used(key):
+            self.flush_uses()
+        return result
+
+    def set(self, key: str, signature: Dict[str, Any], model: str, result: Dict[str, Any]) -> None:
+        self.memory.set(key, result)
+        try:
+            get_explanations_collection().update_one({"_id": key}, self._doc(signature, model, result), upsert=True)
+        except Exception as e:
+            print(f"⚠ Explanation cache write failed: {e}")
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """Memory hits never leave the event loop."""
+        result = self.memory.get(key)
+        if result is None:
+            try:
+                doc = await get_async_explanations_collection().find_one({"_id": key}, {"result": 1})
+            except Exception as e:
+                print(f"⚠ Explanation cache lookup failed: {e}")
+                doc = None
+            result = self._remember(key, doc)
+        if result is not None and self._used(key):
+            self._schedule_flush()
+        return result
+
+    async def aset(self, key: str, signature: Dict[str, Any], model: str, result: Dict[str, Any]) -> None:
+        self.memory.set(key, result)
+        try:
+            await get_async_explanations_collection().update_one(
+                {"_id": key}, self._doc(signature, model, result), upsert=True
+            )
+        except Exception as e:
+            print(f"⚠ Explanation cache write failed: {e}")
+
+    # --- Setup / stats ---
+    def ensure_indexes(self) -> None:
+        collection = get_explanations_collection()
+        collection.create_index([("uses", DESCENDING)], name="uses")
+        collection.create_index(
+            [("last_used_at", ASCENDING)], name="last_used_at_ttl", expireAfterSeconds=self.ttl_seconds
+        )
+
+    def prewarm(self) -> int:
+        """Loads the most used signatures into the memory tier."""
+        if self.prewarm_size <= 0:
+            return 0
+        cursor = (
+            get_explanations_collection()
+            .find({}, {"result": 1})
+            .sort("uses", DESCENDING)
+            .limit(min(self.prewarm_size, self.memory.maxsize))
+        )
+        docs = list(cursor)
+        # Least used first, so the most used end up most recently used in the LRU
+        for doc in reversed(docs):
+            self.memory.set(doc["_id"], doc["result"])
+        self.prewarmed = len(docs)
+        return self.prewarmed
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + self.mongo_hits + self.misses
+        return {
+            "memory": memory,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "hit_ratio": round((memory["hits"] + self.mongo_hits) / lookups, 4) if lookups else 0.0,
+            "prewarmed": self.prewarmed,
+        }
+
+
+# Singleton instance
+explanation_cache = ExplanationCache()
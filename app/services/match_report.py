@@ -0,0 +1,163 @@
+# services/match_report.py
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from bson import ObjectId
+
+from db.mongo import get_async_profiles_collection
+from agents.match_scorer_agent import match_scorer_agent
+from agents.red_flag_agent import red_flag_agent
+from agents.room_hunter_agent import room_hunter_agent
+from agents.wingman_agent import match_explainer_agent
+
+
+class RequestMemo:
+    """
+    Per-request memo of pipeline nodes. Each node runs at most once per request; every
+    consumer awaits the same task, so shared intermediate results are never recomputed.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> "asyncio.Task":
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+        return task
+
+    def cancel_pending(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until `deadline` (a time.monotonic() value); None means no budget."""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def _as_profile(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Mongo document -> the JSON-safe profile dict the agents take."""
+    profile = {k: v for k, v in doc.items() if k != "_id"}
+    profile["id"] = str(doc["_id"])
+    return profile
+
+
+class MatchReportPipeline:
+    """
+    Builds full match reports (score, red flags, housing, explanation) in one request,
+    following the agents' Sense / Plan / Act / Observe flow as a DAG:
+
+        sense:   candidate profiles are fetched once (one $in query)
+        plan:    without explicit candidates, the rule-based ranking picks the top N
+        act:     per candidate, scoring, red flags and housing run concurrently
+        observe: the explainer runs on the score, reasons and red flags
+
+    All nodes of a request share a RequestMemo. With a latency budget, every LLM-backed
+    node answers rule-based (provisional) once the budget is spent; its LLM call keeps
+    running to fill the agent's cache.
+    """
+    DEFAULT_HOUSING_TOP_N = 3
+
+    async def _fetch_profiles(self, profile_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        object_ids = [ObjectId(pid) for pid in profile_ids]
+        cursor = get_async_profiles_collection().find({"_id": {"$in": object_ids}})
+        return {str(doc["_id"]): _as_profile(doc) async for doc in cursor}
+
+    async def _plan_candidates(self, user_profile: Dict[str, Any], top_n: int) -> List[str]:
+        # Rule-based only: the LLM score for each picked candidate is computed in the act stage
+        ranked = await match_scorer_agent.aget_best_matches(user_profile, top_n=top_n, shortlist_k=0)
+        return [match.profile_id for match in ranked]
+
+    async def _explain(
+        self, score_node: "asyncio.Task", red_flags_node: "asyncio.Task", deadline: Optional[float]
+    ) -> Dict[str, Any]:
+        score, conflicts = await asyncio.gather(score_node, red_flags_node)
+        return await match_explainer_agent.agenerate_explanation(
+            match_score=score["score"], match_reasons=score["reasons"], red_flags=conflicts["red_flags"],
+            timeout=_remaining(deadline),
+        )
+
+    def _schedule(
+        self, memo: RequestMemo, user_profile: Dict[str, Any], candidate: Dict[str, Any],
+        housing_top_n: int, deadline: Optional[float] = None,
+    ) -> Dict[str, asyncio.Task]:
+        """Creates every node of one candidate's report; nothing is awaited here."""
+        cid = candidate["id"]
+        timeout = _remaining(deadline)
+        nodes = {
+            "score": memo.run(
+                ("score", cid), lambda: match_scorer_agent.ascore_profiles(user_profile, candidate, timeout=timeout)
+            ),
+            "red_flags": memo.run(
+                ("red_flags", cid), lambda: red_flag_agent.adetect_conflicts(user_profile, candidate, timeout=timeout)
+            ),
+            "housing": memo.run(
+                ("housing", cid),
+                lambda: room_hunter_agent.aget_top_housing_matches(
+                    [user_profile, candidate], top_n=housing_top_n, timeout=timeout
+                ),
+            ),
+        }
+        nodes["explanation"] = memo.run(
+            ("explanation", cid), lambda: self._explain(nodes["score"], nodes["red_flags"], deadline)
+        )
+        return nodes
+
+    async def abuild(
+        self,
+        user_profile: Dict[str, Any],
+        candidate_ids: Optional[List[str]] = None,
+        top_n: int = 3,
+        housing_top_n: int = DEFAULT_HOUSING_TOP_N,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Reports for `candidate_ids` (in that order), or for the user's top N rule-based
+        candidates (ordered by final score) when no IDs are given.
+        `timeout` is the latency budget of the whole build, in seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        memo = RequestMemo()
+        try:
+            ranked = candidate_ids is None
+            if ranked:
+                candidate_ids = await self._plan_candidates(user_profile, top_n)
+            candidate_ids = list(dict.fromkeys(candidate_ids))
+            candidates = await self._fetch_profiles(candidate_ids)
+
+            scheduled = [
+                (cid, self._schedule(memo, user_profile, candidates[cid], housing_top_n, deadline))
+                for cid in candidate_ids if cid in candidates
+            ]
+            await asyncio.gather(*(task for _, nodes in scheduled for task in nodes.values()))
+        finally:
+            # A failed node (or a cancelled request) must not leave the others running
+            memo.cancel_pending()
+
+        reports = []
+        for cid, nodes in scheduled:
+            score = nodes["score"].result()
+            conflicts = nodes["red_flags"].result()
+            housing = nodes["housing"].result()
+            explanation = nodes["explanation"].result()
+            reports.append({
+                "profile_id": cid,
+                "score": score["score"],
+                "reasons": score["reasons"],
+                "red_flags": conflicts["red_flags"],
+                "housing": [listing.dict() for listing in housing],
+                "explanation": explanation,
+                "provisional": bool(
+                    score.get("provisional") or conflicts.get("provisional") or explanation.get("provisional")
+                    or any(listing.provisional for listing in housing)
+                ),
+            })
+        if ranked:
+            reports.sort(key=lambda report: report["score"], reverse=True)
+        return reports
+
+
+# Singleton instance
+match_report_pipeline = MatchReportPipeline()
@@ -0,0 +1,176 @@
+# services/matchmaker.py
+import os
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import ASCENDING, ReplaceOne, UpdateMany
+from db.mongo import get_profiles_collection, get_profile_matches_collection, get_async_profile_matches_collection
+from services.compatibility_engine import compatibility_engine, EncodedProfiles
+
+MATCH_INDEX_SIZE = int(os.getenv("MATCH_INDEX_SIZE", "50"))
+
+
+class Matchmaker:
+    """
+    Keeps a materialized top-N candidate list per profile in the `profile_matches` collection:
+        {_id: <profile id>, matches: [{profile_id, score, reasons}, ...], updated_at}
+    Rows are sorted by score (desc) then profile id (asc) and capped at `index_size`.
+    Profile writes only recompute the affected rows, so best-match reads are a single
+    indexed lookup. Scores come from the (symmetric) rule-based CompatibilityEngine.
+    """
+
+    def __init__(self, index_size: int = MATCH_INDEX_SIZE):
+        self.index_size = index_size
+
+    # --- Helpers ---
+    def _load_profiles(self) -> Tuple[Dict[str, Dict[str, Any]], EncodedProfiles]:
+        """Loads every profile (scoring fields only), ordered by _id so ties break by id."""
+        docs = list(get_profiles_collection().find({}, compatibility_engine.PROJECTION).sort("_id", ASCENDING))
+        by_id = {str(doc["_id"]): doc for doc in docs}
+        return by_id, compatibility_engine.encode(docs)
+
+    def _compute_row(self, profile_id: str, profile: Dict[str, Any], encoded: EncodedProfiles) -> List[Dict[str, Any]]:
+        return compatibility_engine.top_matches(profile, encoded, top_n=self.index_size, exclude_id=profile_id)
+
+    def _row_op(self, profile_id: str, matches: List[Dict[str, Any]]) -> ReplaceOne:
+        return ReplaceOne(
+            {"_id": profile_id},
+            {"matches": matches, "updated_at": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+
+    def _rows_containing(self, profile_id: str) -> List[str]:
+        return [doc["_id"] for doc in get_profile_matches_collection().find({"matches.profile_id": profile_id}, {"_id": 1})]
+
+    def _recompute_rows(self, row_ids: List[str], by_id: Dict[str, Dict[str, Any]], encoded: EncodedProfiles) -> List[ReplaceOne]:
+        return [
+            self._row_op(row_id, self._compute_row(row_id, by_id[row_id], encoded))
+            for row_id in row_ids
+            if row_id in by_id
+        ]
+
+    def _insert_ops(self, profile_id: str, profile: Dict[str, Any], encoded: EncodedProfiles, skip: set) -> List[UpdateMany]:
+        """
+        Offers `profile_id` to every other row. Candidates are grouped by (budget tier,
+        matched preferences) so each group is one UpdateMany carrying the same entry; the
+        filter only touches rows that are not full or whose last entry does not outrank it.
+        """
+        scores, tiers, matches = compatibility_engine.score(profile, encoded)
+        groups: Dict[tuple, List[str]] = defaultdict(list)
+        for i, row_id in enumerate(encoded.ids):
+            if row_id != profile_id and row_id not in skip:
+                groups[(int(tiers[i]), tuple(bool(m) for m in matches[i]), int(scores[i]))].append(row_id)
+
+        last = f"matches.{self.index_size - 1}"
+        ops = []
+        for (tier, matched, score), row_ids in groups.items():
+            entry = {
+                "profile_id": profile_id,
+                "score": score,
+                "reasons": compatibility_engine.reasons_for(tier, matched),
+            }
+            ops.append(UpdateMany(
+                {
+                    "_id": {"$in": row_ids},
+                    "$or": [{last: {"$exists": False}}, {f"{last}.score": {"$lte": score}}],
+                },
+                {"$push": {"matches": {
+                    "$each": [entry],
+                    "$sort": {"score": -1, "profile_id": 1},
+                    "$slice": self.index_size,
+                }}},
+            ))
+        return ops
+
+    # --- Write hooks ---
+    def on_profile_upserted(self, profile_id: str) -> None:
+        """Call after a profile is created or patched."""
+        by_id, encoded = self._load_profiles()
+        profile = by_id.get(profile_id)
+        if profile is None:
+            self.on_profile_deleted(profile_id)
+            return
+
+        # Rows that held the old version may lose it from their top N, so rebuild them
+        stale_rows = set(self._rows_containing(profile_id))
+        ops = self._recompute_rows([profile_id, *stale_rows], by_id, encoded)
+        ops.extend(self._insert_ops(profile_id, profile, encoded, skip=stale_rows))
+        get_profile_matches_collection().bulk_write(ops, ordered=True)
+
+    def on_profile_deleted(self, profile_id: str) -> None:
+        """Call after a profile is deleted."""
+        matches_collection = get_profile_matches_collection()
+        matches_collection.delete_one({"_id": profile_id})
+
+        stale_rows = self._rows_containing(profile_id)
+        if not stale_rows:
+            return
+        by_id, encoded = self._load_profiles()
+        ops = self._recompute_rows(stale_rows, by_id, encoded)
+        if ops:
+            matches_collection.bulk_write(ops, ordered=False)
+
+    # --- Reads ---
+    def get_matches(self, profile_id: str, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the stored top matches for a profile, building the row on first access.
+        Returns None when more than `index_size` matches are requested.
+        """
+        limit = self.index_size if limit is None else limit
+        if limit > self.index_size:
+            return None
+
+        row = get_profile_matches_collection().find_one({"_id": profile_id}, {"matches": {"$slice": limit}})
+        if row is not None:
+            return row["matches"]
+
+        by_id, encoded = self._load_profiles()
+        profile = by_id.get(profile_id)
+        if profile is None:
+            return None
+        matches = self._compute_row(profile_id, profile, encoded)
+        get_profile_matches_collection().bulk_write([self._row_op(profile_id, matches)])
+        return matches[:limit]
+
+    async def aget_matches(self, profile_id: str, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Async version of get_matches; only a missing row is built in a worker thread."""
+        limit = self.index_size if limit is None else limit
+        if limit > self.index_size:
+            return None
+
+        row = await get_async_profile_matches_collection().find_one({"_id": profile_id}, {"matches": {"$slice": limit}})
+        if row is not None:
+            return row["matches"]
+        return await asyncio.to_thread(self.get_matches, profile_id, limit)
+
+    # --- Maintenance ---
+    def rebuild(self, batch_size: int = 500) -> int:
+        """Recomputes every row from scratch (backfill or repair)."""
+        by_id, encoded = self._load_profiles()
+        matches_collection = get_profile_matches_collection()
+        matches_collection.delete_many({"_id": {"$nin": list(by_id)}})
+
+        ops: List[ReplaceOne] = []
+        for profile_id, profile in by_id.items():
+            ops.append(self._row_op(profile_id, self._compute_row(profile_id, profile, encoded)))
+            if len(ops) >= batch_size:
+                matches_collection.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            matches_collection.bulk_write(ops, ordered=False)
+        return len(by_id)
+
+    def ensure_indexes(self) -> None:
+        get_profile_matches_collection().create_index(
+            [("matches.profile_id", ASCENDING)], name="matches_profile_id"
+        )
+
+
+# Singleton instance
+matchmaker = Matchmaker()
+
+
+if __name__ == "__main__":
+    # Backfill: python -m services.matchmaker (run from app/)
+    print(f"✅ Rebuilt match index for {matchmaker.rebuild()} profiles.")
@@ -0,0 +1,155 @@
+# services/pair_score_cache.py
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+from pymongo import ASCENDING
+from db.mongo import (
+    get_pair_scores_collection,
+    get_async_pair_scores_collection,
+    get_red_flags_collection,
+    get_async_red_flags_collection,
+)
+from utils.cache import LRUCache, content_hash, profile_content_hash, profile_id_of
+
+PAIR_SCORE_CACHE_SIZE = int(os.getenv("PAIR_SCORE_CACHE_SIZE", "10000"))
+PAIR_SCORE_CACHE_TTL_DAYS = int(os.getenv("PAIR_SCORE_CACHE_TTL_DAYS", "30"))
+RED_FLAG_CACHE_SIZE = int(os.getenv("RED_FLAG_CACHE_SIZE", "10000"))
+
+
+class PairScoreCache:
+    """
+    Two-tier cache of pairwise agent results (compatibility scores, red flags).
+    Key: order-normalized content hashes of both profiles + model name + prompt version,
+    so A vs B and B vs A share one entry.
+    Tier 1 is an in-process LRU, tier 2 a Mongo collection with a TTL index.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = PAIR_SCORE_CACHE_SIZE,
+        ttl_days: int = PAIR_SCORE_CACHE_TTL_DAYS,
+        name: str = "pair_scores",
+        collection: Callable = get_pair_scores_collection,
+        async_collection: Callable = get_async_pair_scores_collection,
+    ):
+        self.memory = LRUCache(name, maxsize=maxsize)
+        self._collection = collection
+        self._async_collection = async_collection
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.mongo_hits = 0
+        self.misses = 0
+
+    # --- Keys ---
+    def make_key(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any], model: str, prompt_version: str) -> str:
+        hashes = sorted([profile_content_hash(profile_a), profile_content_hash(profile_b)])
+        return content_hash([hashes, model, prompt_version])
+
+    # --- Lookups ---
+    def _remember(self, key: str, doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Records the outcome of a Mongo lookup and promotes hits to the memory tier."""
+        if doc is None:
+            self.misses += 1
+            return None
+        self.mongo_hits += 1
+        self.memory.set(key, {"result": doc["result"], "profile_ids": doc.get("profile_ids", [])})
+        return doc["result"]
+
+    def _entry(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any], model: str, prompt_version: str, result: Dict[str, Any]):
+        key = self.make_key(profile_a, profile_b, model, prompt_version)
+        profile_ids = [pid for pid in (profile_id_of(profile_a), profile_id_of(profile_b)) if pid]
+        self.memory.set(key, {"result": result, "profile_ids": profile_ids})
+        doc = {
+            "profile_ids": profile_ids,
+            "model": model,
+            "prompt_version": prompt_version,
+            "result": result,
+            "created_at": datetime.now(timezone.utc),
+        }
+        return key, doc
+
+    def get(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any], model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        key = self.make_key(profile_a, profile_b, model, prompt_version)
+        entry = self.memory.get(key)
+        if entry is not None:
+            return entry["result"]
+
+        try:
+            doc = self._collection().find_one({"_id": key}, {"result": 1, "profile_ids": 1})
+        except Exception as e:
+            print(f"⚠ Pair cache '{self.memory.name}' lookup failed: {e}")
+            doc = None
+        return self._remember(key, doc)
+
+    def set(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any], model: str, prompt_version: str, result: Dict[str, Any]) -> None:
+        key, doc = self._entry(profile_a, profile_b, model, prompt_version, result)
+        try:
+            self._collection().replace_one({"_id": key}, doc, upsert=True)
+        except Exception as e:
+            print(f"⚠ Pair cache '{self.memory.name}' write failed: {e}")
+
+    async def aget(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any], model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        key = self.make_key(profile_a, profile_b, model, prompt_version)
+        entry = self.memory.get(key)
+        if entry is not None:
+            return entry["result"]
+
+        try:
+            doc = await self._async_collection().find_one({"_id": key}, {"result": 1, "profile_ids": 1})
+        except Exception as e:
+            print(f"⚠ Pair cache '{self.memory.name}' lookup failed: {e}")
+            doc = None
+        return self._remember(key, doc)
+
+    async def aset(self, profile_a: Dict[str, Any], profile_b: Dict[str, Any], model: str, prompt_version: str, result: Dict[str, Any]) -> None:
+        key, doc = self._entry(profile_a, profile_b, model, prompt_version, result)
+        try:
+            await self._async_collection().replace_one({"_id": key}, doc, upsert=True)
+        except Exception as e:
+            print(f"⚠ Pair cache '{self.memory.name}' write failed: {e}")
+
+    # --- Invalidation ---
+    def invalidate_profile(self, profile_id: str) -> int:
+        """Drops every cached pair involving `profile_id` from both tiers."""
+        removed = self.memory.delete_where(lambda _, entry: profile_id in entry["profile_ids"])
+        try:
+            removed += self._collection().delete_many({"profile_ids": profile_id}).deleted_count
+        except Exception as e:
+            print(f"⚠ Pair cache '{self.memory.name}' invalidation failed for {profile_id}: {e}")
+        return removed
+
+    async def ainvalidate_profile(self, profile_id: str) -> int:
+        removed = self.memory.delete_where(lambda _, entry: profile_id in entry["profile_ids"])
+        try:
+            result = await self._async_collection().delete_many({"profile_ids": profile_id})
+            removed += result.deleted_count
+        except Exception as e:
+            print(f"⚠ Pair cache '{self.memory.name}' invalidation failed for {profile_id}: {e}")
+        return removed
+
+    # --- Setup / stats ---
+    def ensure_indexes(self) -> None:
+        collection = self._collection()
+        collection.create_index([("profile_ids", ASCENDING)], name="profile_ids")
+        collection.create_index(
+            [("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=self.ttl_seconds
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + self.mongo_hits + self.misses
+        return {
+            "memory": memory,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "hit_ratio": round((memory["hits"] + self.mongo_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Singleton instances
+pair_score_cache = PairScoreCache()
+red_flag_cache = PairScoreCache(
+    maxsize=RED_FLAG_CACHE_SIZE,
+    name="red_flags",
+    collection=get_red_flags_collection,
+    async_collection=get_async_red_flags_collection,
+)
@@ -0,0 +1,109 @@
+# services/password_hasher.py
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+import bcrypt
+from utils.metrics import PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+
+# bcrypt cost factor for new hashes; stored hashes with another cost are rehashed on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Processes per app worker (each uvicorn worker gets its own pool)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash/verify jobs allowed in flight (running + queued) before new ones are turned away
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised without queueing the job while PASSWORD_HASH_MAX_QUEUE jobs are in flight."""
+
+
+# --- Run in the pool processes ---
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # Not a bcrypt hash (e.g. accounts created through Google sign-in)
+        return False
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and verification in a dedicated process pool, so login bursts use
+    their own cores instead of the threadpool (and GIL) that serves every other route.
+    Each app process starts its own pool (at startup, or on first use) with the spawn
+    start method, so the workers don't inherit the server's threads and Mongo clients.
+    """
+
+    def __init__(
+        self,
+        rounds: int = BCRYPT_ROUNDS,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, operation: str, fn: Callable[..., Any], *args: Any) -> Any:
+        # in_flight is only touched on the event loop, so the check and increment can't race
+        if self.in_flight >= self.max_queue:
+            PASSWORD_HASH_REJECTED.labels(operation).inc()
+            raise PasswordHasherBusyError(f"{self.in_flight} password jobs already in flight")
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            self._executor = None
+            raise
+        finally:
+            self.in_flight -= 1
+            PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+    async def ahash(self, password: str) -> str:
+        hashed = await self._run("hash", _hash, password.encode("utf-8"), self.rounds)
+        return hashed.decode("utf-8")
+
+    async def averify(self, password: str, hashed: str) -> bool:
+        if not hashed:
+            return False
+        return await self._run("verify", _check, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True if `hashed` is a bcrypt hash made with a cost other than the configured one."""
+        parts = hashed.split("$")  # $2b$<cost>$<salt + hash>
+        return len(parts) == 4 and parts[2].isdigit() and int(parts[2]) != self.rounds
+
+    def start(self) -> None:
+        """Boots the workers now, so the first logins don't wait for interpreters to start."""
+        pool = self._pool()
+        for _ in range(self.workers):
+            pool.submit(int)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+password_hasher = PasswordHasher()
+PASSWORD_HASH_IN_FLIGHT.set_function(lambda: password_hasher.in_flight)
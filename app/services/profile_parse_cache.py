@@ -0,0 +1,282 @@
+# services/profile_parse_cache.py
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+from utils.cache import LRUCache
+
+PROFILE_CACHE_DB_PATH = os.getenv("PROFILE_CACHE_DB_PATH", "profile_cache.db")
+PROFILE_CACHE_MEMORY_SIZE = int(os.getenv("PROFILE_CACHE_MEMORY_SIZE", "2048"))
+PROFILE_CACHE_MAX_ROWS = int(os.getenv("PROFILE_CACHE_MAX_ROWS", "50000"))
+PROFILE_CACHE_MAX_AGE_DAYS = float(os.getenv("PROFILE_CACHE_MAX_AGE_DAYS", "90"))
+# Eviction runs once every this many writes instead of on every insert
+EVICT_EVERY_WRITES = 200
+BUSY_TIMEOUT_MS = 5000
+# Stay below SQLite's host-parameter limit in IN (...) lookups
+MAX_SQL_PARAMS = 900
+
+
+class ProfileParseCache:
+    """
+    Cache of parsed profiles keyed by the preprocessed ad text.
+    Tier 1 is an in-process LRU; tier 2 a SQLite table in WAL mode, accessed through one
+    long-lived connection per thread. Keys are SHA-256 digests, so rows are fixed size no
+    matter how long the ad is. Rows older than `max_age_days` are evicted, and the table
+    is trimmed to `max_rows` oldest-first using the `timestamp` column.
+    Nothing touches the database file until first use. Converting a table from an older
+    schema is an explicit step: ensure_schema(), run at app startup or via
+        python -m services.profile_parse_cache    (run from app/)
+    """
+
+    def __init__(
+        self,
+        db_path: str = PROFILE_CACHE_DB_PATH,
+        memory_size: int = PROFILE_CACHE_MEMORY_SIZE,
+        max_rows: int = PROFILE_CACHE_MAX_ROWS,
+        max_age_days: float = PROFILE_CACHE_MAX_AGE_DAYS,
+    ):
+        self.db_path = db_path
+        self.memory = LRUCache("profile_parse", maxsize=memory_size)
+        self.max_rows = max_rows
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.disk_hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    # --- Connections ---
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+            self._create_table(conn)
+        return conn
+
+    def _create_table(self, conn: sqlite3.Connection):
+        """Creates the table on first use; never alters an existing one."""
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            self._create_table_sql(conn)
+            self._schema_ready = True
+
+    def _create_table_sql(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS parsed_profiles (
+                key BLOB PRIMARY KEY,
+                parsed_json TEXT NOT NULL,
+                timestamp INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS parsed_profiles_timestamp ON parsed_profiles (timestamp)")
+
+    def ensure_schema(self) -> bool:
+        """Converts an old-schema table in place, then creates what is missing. Returns True if it migrated."""
+        conn = self._conn()
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(parsed_profiles)")]
+        migrated = "raw_text" in columns
+        if migrated:
+            self._migrate_text_keys(conn)
+        self._create_table_sql(conn)
+        return migrated
+
+    def _migrate_text_keys(self, conn: sqlite3.Connection):
+        """Converts the old table (full ad text as PRIMARY KEY) to hashed keys."""
+        rows = conn.execute("SELECT raw_text, parsed_json, timestamp FROM parsed_profiles").fetchall()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DROP TABLE parsed_profiles")
+        conn.execute("""
+            CREATE TABLE parsed_profiles (
+                key BLOB PRIMARY KEY,
+                parsed_json TEXT NOT NULL,
+                timestamp INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.executemany(
+            "INSERT OR REPLACE INTO parsed_profiles (key, parsed_json, timestamp) VALUES (?, ?, ?)",
+            [(self.make_key(text), parsed, ts or 0) for text, parsed, ts in rows if parsed],
+        )
+        conn.execute("COMMIT")
+
+    # --- Keys ---
+    @staticmethod
+    def make_key(preprocessed_text: str) -> bytes:
+        return hashlib.sha256(preprocessed_text.encode("utf-8")).digest()
+
+    # --- Lookups ---
+    def _disk_get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT parsed_json, timestamp FROM parsed_profiles WHERE key = ?", (key,)).fetchone()
+        if row is None or (self.max_age_seconds and row[1] < time.time() - self.max_age_seconds):
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        parsed = json.loads(row[0])
+        self.memory.set(key, parsed)
+        return parsed
+
+    def _disk_set(self, key: bytes, parsed_profile: Dict[str, Any]):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO parsed_profiles (key, parsed_json, timestamp) VALUES (?, ?, ?)",
+            (key, json.dumps(parsed_profile), int(time.time())),
+        )
+        with self._write_lock:
+            self._writes += 1
+            due = self._writes % EVICT_EVERY_WRITES == 0
+        if due:
+            self.evict()
+
+    def _disk_lookup(self, key: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            parsed = self._disk_get(key)
+        except sqlite3.Error as e:
+            print(f"⚠ Profile cache lookup failed: {e}")
+            return None
+        return dict(parsed) if parsed is not None else None
+
+    def get(self, preprocessed_text: str) -> Optional[Dict[str, Any]]:
+        key = self.make_key(preprocessed_text)
+        parsed = self.memory.get(key)
+        if parsed is not None:
+            return dict(parsed)
+        return self._disk_lookup(key)
+
+    def set(self, preprocessed_text: str, parsed_profile: Dict[str, Any]):
+        key = self.make_key(preprocessed_text)
+        self.memory.set(key, dict(parsed_profile))
+        try:
+            self._disk_set(key, parsed_profile)
+        except sqlite3.Error as e:
+            print(f"⚠ Profile cache write failed: {e}")
+
+    def get_many(self, preprocessed_texts: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Looks up many texts: memory first, then the remaining keys in one SQLite query per chunk."""
+        found: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[bytes, str] = {}
+        for text in preprocessed_texts:
+            key = self.make_key(text)
+            parsed = self.memory.get(key)
+            if parsed is not None:
+                found[text] = dict(parsed)
+            else:
+                pending[key] = text
+
+        keys = list(pending)
+        cutoff = time.time() - self.max_age_seconds if self.max_age_seconds else 0
+        try:
+            for start in range(0, len(keys), MAX_SQL_PARAMS):
+                chunk = keys[start:start + MAX_SQL_PARAMS]
+                rows = self._conn().execute(
+                    f"SELECT key, parsed_json FROM parsed_profiles WHERE timestamp >= ? "
+                    f"AND key IN ({','.join('?' * len(chunk))})",
+                    (int(cutoff), *chunk),
+                ).fetchall()
+                for key, parsed_json in rows:
+                    parsed = json.loads(parsed_json)
+                    self.memory.set(key, parsed)
+                    found[pending[key]] = dict(parsed)
+        except sqlite3.Error as e:
+            print(f"⚠ Profile cache lookup failed: {e}")
+
+        disk_hits = sum(1 for text in pending.values() if text in found)
+        self.disk_hits += disk_hits
+        self.misses += len(pending) - disk_hits
+        return found
+
+    def set_many(self, items: Dict[str, Dict[str, Any]]):
+        """Stores many parsed profiles in a single transaction."""
+        now = int(time.time())
+        rows = []
+        for text, parsed_profile in items.items():
+            key = self.make_key(text)
+            self.memory.set(key, dict(parsed_profile))
+            rows.append((key, json.dumps(parsed_profile), now))
+        if not rows:
+            return
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO parsed_profiles (key, parsed_json, timestamp) VALUES (?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"⚠ Profile cache write failed: {e}")
+            return
+        self.evict()
+
+    async def aget(self, preprocessed_text: str) -> Optional[Dict[str, Any]]:
+        """Memory hits are answered on the event loop; only SQLite reads go to a worker thread."""
+        key = self.make_key(preprocessed_text)
+        parsed = self.memory.get(key)
+        if parsed is not None:
+            return dict(parsed)
+        return await asyncio.to_thread(self._disk_lookup, key)
+
+    async def aset(self, preprocessed_text: str, parsed_profile: Dict[str, Any]):
+        await asyncio.to_thread(self.set, preprocessed_text, parsed_profile)
+
+    async def aget_many(self, preprocessed_texts: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await asyncio.to_thread(self.get_many, preprocessed_texts)
+
+    async def aset_many(self, items: Dict[str, Dict[str, Any]]):
+        await asyncio.to_thread(self.set_many, items)
+
+    # --- Eviction / stats ---
+    def evict(self) -> int:
+        """Drops rows older than max_age, then the oldest rows beyond max_rows."""
+        conn = self._conn()
+        removed = 0
+        try:
+            if self.max_age_seconds:
+                cutoff = int(time.time() - self.max_age_seconds)
+                removed += conn.execute("DELETE FROM parsed_profiles WHERE timestamp < ?", (cutoff,)).rowcount
+            overflow = conn.execute("SELECT COUNT(*) FROM parsed_profiles").fetchone()[0] - self.max_rows
+            if overflow > 0:
+                removed += conn.execute(
+                    "DELETE FROM parsed_profiles WHERE key IN "
+                    "(SELECT key FROM parsed_profiles ORDER BY timestamp LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+        except sqlite3.Error as e:
+            print(f"⚠ Profile cache eviction failed: {e}")
+        self.evicted += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + self.disk_hits + self.misses
+        try:
+            rows = self._conn().execute("SELECT COUNT(*) FROM parsed_profiles").fetchone()[0]
+        except sqlite3.Error:
+            rows = None
+        return {
+            "memory": memory,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((memory["hits"] + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "rows": rows,
+            "max_rows": self.max_rows,
+            "evicted": self.evicted,
+        }
+
+
+if __name__ == "__main__":
+    cache = ProfileParseCache()
+    migrated = cache.ensure_schema()
+    print(f"✅ Profile parse cache at '{cache.db_path}' is up to date" + (" (migrated to hashed keys)" if migrated else ""))
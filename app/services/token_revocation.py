@@ -0,0 +1,112 @@
+# services/token_revocation.py
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from db.mongo import get_async_revoked_tokens_collection
+
+# How often each process pulls the revocations made by other processes
+TOKEN_REVOCATION_REFRESH_SECONDS = float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", "5"))
+# Each refresh re-reads this far behind the newest revocation it has seen, so a write
+# that commits after a later one (or lands during a refresh) is not skipped
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+class TokenRevocationList:
+    """
+    Revoked access tokens, by token ID (jti). The `revoked_tokens` collection is the shared
+    record, one document per logout; a TTL index drops each document once its token has
+    expired anyway. Every process mirrors the collection into memory, so checking a token
+    costs no round trip. A background task pulls only the revocations stamped (server time)
+    since the last refresh: a logout takes effect at once in the process that served it and
+    within TOKEN_REVOCATION_REFRESH_SECONDS everywhere else.
+    """
+
+    def __init__(self, refresh_seconds: float = TOKEN_REVOCATION_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        # jti -> exp (epoch seconds). Only replaced or added to on the event loop; the
+        # auth dependency reads it from worker threads.
+        self._revoked: Dict[str, float] = {}
+        self._watermark: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def _prune(self) -> None:
+        now = time.time()
+        if any(exp <= now for exp in self._revoked.values()):
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+
+    async def arevoke(self, jti: str, exp: float, user_id: Optional[str] = None) -> None:
+        self._revoked[jti] = exp
+        await get_async_revoked_tokens_collection().update_one(
+            {"_id": jti},
+            {
+                "$set": {
+                    "exp": exp,
+                    "expires_at": datetime.fromtimestamp(exp, timezone.utc),
+                    "user_id": user_id,
+                },
+                # Server time, so the watermark does not depend on each worker's clock
+                "$currentDate": {"revoked_at": True},
+            },
+            upsert=True,
+        )
+
+    async def arefresh(self) -> int:
+        """Pulls new revocations (all of them on the first call); returns how many were new."""
+        query = {} if self._watermark is None else {"revoked_at": {"$gte": self._watermark - REFRESH_OVERLAP}}
+        added = 0
+        async for doc in get_async_revoked_tokens_collection().find(query, {"exp": 1, "revoked_at": 1}):
+            if doc["_id"] not in self._revoked:
+                added += 1
+                self._revoked[doc["_id"]] = doc["exp"]
+            if self._watermark is None or doc["revoked_at"] > self._watermark:
+                self._watermark = doc["revoked_at"]
+        self._prune()
+        self.refreshes += 1
+        return added
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.arefresh()
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"⚠ Token revocation refresh failed: {e}")
+
+    async def start(self) -> None:
+        """Loads the current list, then keeps it in sync from a background task."""
+        try:
+            await self.arefresh()
+            print(f"✅ Loaded {len(self._revoked)} revoked tokens")
+        except Exception as e:
+            self.refresh_failures += 1
+            print(f"⚠ Failed to load revoked tokens, retrying in the background: {e}")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "revoked": len(self._revoked),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+# Singleton instance
+token_revocations = TokenRevocationList()
@@ -0,0 +1,5 @@
+# Tests import the app's modules the way the app does (run from app/: python -m pytest tests)
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
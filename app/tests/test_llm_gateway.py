@@ -0,0 +1,74 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from agents.llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailableError
+
+
+class _HangingCompletions:
+    """Stands in for the Groq client: every call waits until it is cancelled."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+
+    async def create(self, **kwargs):
+        self.started.set()
+        await asyncio.sleep(3600)
+
+
+def _open_gateway(cooldown_seconds: float) -> LLMGateway:
+    gateway = LLMGateway(api_key=None, breaker=CircuitBreaker(failure_threshold=1, cooldown_seconds=cooldown_seconds))
+    gateway.breaker.record_failure()
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+    return gateway
+
+
+def test_cancelled_half_open_trial_reopens_the_breaker():
+    gateway = _open_gateway(cooldown_seconds=0.05)
+    completions = _HangingCompletions()
+    gateway.async_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def scenario():
+        await asyncio.sleep(0.06)
+        trial = asyncio.create_task(
+            gateway.acomplete("red_flag", model="m", messages=[{"role": "user", "content": "hi"}])
+        )
+        await completions.started.wait()
+        assert gateway.breaker.state == CircuitBreaker.HALF_OPEN
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(scenario())
+
+    breaker = gateway.breaker
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()  # A fresh cool-down started
+    time.sleep(0.06)
+    assert breaker.allow()  # ...after which the next trial is let through
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_cancelled_call_while_closed_leaves_the_breaker_closed():
+    gateway = LLMGateway(api_key=None)
+    completions = _HangingCompletions()
+    gateway.async_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def scenario():
+        call = asyncio.create_task(gateway.acomplete("wingman", model="m", messages=[{"role": "user", "content": "hi"}]))
+        await completions.started.wait()
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    asyncio.run(scenario())
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_rejects_without_calling():
+    gateway = _open_gateway(cooldown_seconds=60)
+    gateway.async_client = SimpleNamespace(chat=SimpleNamespace(completions=_HangingCompletions()))
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(gateway.acomplete("red_flag", model="m", messages=[{"role": "user", "content": "hi"}]))
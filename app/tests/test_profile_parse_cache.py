@@ -0,0 +1,29 @@
+import sqlite3
+
+from services.profile_parse_cache import ProfileParseCache
+
+
+def test_constructor_does_not_touch_the_database(tmp_path):
+    db_path = tmp_path / "cache.db"
+    ProfileParseCache(str(db_path))
+    assert not db_path.exists()
+
+
+def test_first_use_creates_the_table(tmp_path):
+    cache = ProfileParseCache(str(tmp_path / "cache.db"), memory_size=0)
+    cache.set("student in lahore", {"city": "Lahore"})
+    assert ProfileParseCache(str(tmp_path / "cache.db")).get("student in lahore") == {"city": "Lahore"}
+
+
+def test_ensure_schema_migrates_text_keys(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE parsed_profiles (raw_text TEXT PRIMARY KEY, parsed_json TEXT, timestamp INTEGER)")
+    conn.execute("INSERT INTO parsed_profiles VALUES ('student in lahore', '{\"city\": \"Lahore\"}', strftime('%s','now'))")
+    conn.commit()
+    conn.close()
+
+    cache = ProfileParseCache(db_path)
+    assert cache.ensure_schema() is True
+    assert cache.get("student in lahore") == {"city": "Lahore"}
+    assert cache.ensure_schema() is False
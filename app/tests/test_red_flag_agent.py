@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import agents.red_flag_agent as red_flag_module
+from agents.red_flag_agent import RedFlagAgent
+from utils.metrics import AGENT_FALLBACKS
+
+PROFILE_A = {"id": "A", "sleep_schedule": "early_bird", "budget_PKR": 20000}
+PROFILE_B = {"id": "B", "sleep_schedule": "night_owl", "budget_PKR": 45000}
+
+
+class _NoToolCall:
+    """Gateway stand-in whose completions never call the tool."""
+
+    def _completion(self):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(tool_calls=None))])
+
+    def complete(self, agent, **request):
+        return self._completion()
+
+    async def acomplete(self, agent, **request):
+        return self._completion()
+
+
+class _RecordingCache:
+    def __init__(self):
+        self.writes = []
+
+    def make_key(self, *args):
+        return "key"
+
+    def get(self, *args):
+        return None
+
+    def set(self, *args):
+        self.writes.append(args)
+
+    async def aget(self, *args):
+        return None
+
+    async def aset(self, *args):
+        self.writes.append(args)
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    cache = _RecordingCache()
+    monkeypatch.setattr(red_flag_module, "red_flag_cache", cache)
+    agent = RedFlagAgent(api_key=None)
+    agent.llm = _NoToolCall()
+    agent.cache = cache
+    return agent
+
+
+def _fallbacks() -> float:
+    return AGENT_FALLBACKS.labels(RedFlagAgent.LLM_AGENT)._value.get()
+
+
+def test_missing_tool_call_falls_back_without_caching(agent):
+    before = _fallbacks()
+    result = agent.detect_conflicts(PROFILE_A, PROFILE_B)
+    assert result["pair_id"] == "A_B"
+    assert agent.cache.writes == []
+    assert _fallbacks() == before + 1
+
+
+def test_async_missing_tool_call_falls_back_without_caching(agent):
+    before = _fallbacks()
+    result = asyncio.run(agent.adetect_conflicts(PROFILE_A, PROFILE_B))
+    assert result["pair_id"] == "A_B"
+    assert "provisional" not in result
+    assert agent.cache.writes == []
+    assert _fallbacks() == before + 1
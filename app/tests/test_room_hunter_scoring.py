@@ -0,0 +1,88 @@
+import os
+from typing import Any, Dict
+
+import pytest
+
+from agents.room_hunter_agent import RoomHunterAgent
+
+LISTINGS = [
+    {"_id": 1, "city": "Lahore", "area": "Gulberg", "monthly_rent_PKR": 20000, "amenities": ["WiFi"],
+     "sleep_schedule": "early_bird"},
+    {"_id": 2, "city": "Gulberg", "area": "Gulberg", "monthly_rent_PKR": 90000, "amenities": []},
+    {"_id": 3, "city": "$$x", "area": "DHA", "monthly_rent_PKR": 5000, "amenities": ["Security guard", "WiFi"]},
+]
+
+HOSTILE_PROFILES = [
+    {"city": "$area", "area": "Gulberg", "budget_PKR": 30000},
+    {"city": "$$x", "area": "$city", "budget_PKR": {"$function": {"body": "return 1", "args": [], "lang": "js"}}},
+    {"city": "Lahore", "area": {"$literal": "Gulberg"}, "budget_PKR": "50000", "sleep_schedule": "$sleep_schedule"},
+]
+
+
+def _evaluate(expression: Any, doc: Dict[str, Any]) -> Any:
+    """Evaluates the aggregation operators _score_expression uses, with Mongo's path and operator rules."""
+    if isinstance(expression, str):
+        return doc.get(expression[1:]) if expression.startswith("$") else expression
+    if isinstance(expression, list):
+        return [_evaluate(e, doc) for e in expression]
+    if not isinstance(expression, dict):
+        return expression
+    (op, args), = expression.items()
+    if op == "$literal":
+        return args
+    if not op.startswith("$"):
+        return {k: _evaluate(v, doc) for k, v in expression.items()}
+    values = _evaluate(args, doc)
+    if op == "$add":
+        return sum(values)
+    if op == "$multiply":
+        return values[0] * values[1]
+    if op == "$cond":
+        return values[1] if values[0] else values[2]
+    if op == "$eq":
+        return values[0] == values[1]
+    if op == "$lte":
+        return values[0] is None if values[1] is None else values[0] <= values[1]
+    if op == "$gte":
+        return values[0] >= values[1]
+    if op == "$ifNull":
+        return values[1] if values[0] is None else values[0]
+    if op == "$size":
+        return len(values)
+    if op == "$setIntersection":
+        return [v for v in dict.fromkeys(values[0]) if v in values[1]]
+    raise ValueError(f"User input reached the pipeline as operator {op}")
+
+
+@pytest.mark.parametrize("profile", HOSTILE_PROFILES)
+def test_user_values_are_literals_in_the_score_expression(profile):
+    agent = RoomHunterAgent.__new__(RoomHunterAgent)
+    expression = agent._score_expression(profile)
+    for listing in LISTINGS:
+        assert _evaluate(expression, listing) == agent.score_listing(profile, listing)["score"]
+
+
+def _test_collection():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"), serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB is not reachable")
+    collection = client["flatwaley_test"]["room_hunter_scoring"]
+    collection.drop()
+    collection.insert_many([{**listing, "availability": "Available"} for listing in LISTINGS])
+    return collection
+
+
+@pytest.mark.parametrize("profile", HOSTILE_PROFILES)
+def test_pipeline_scores_hostile_profiles_like_score_listing(profile):
+    collection = _test_collection()
+    agent = RoomHunterAgent.__new__(RoomHunterAgent)
+    docs = list(collection.aggregate(agent._scoring_pipeline([profile], top_n=len(LISTINGS))))
+    assert {doc["_id"]: doc["_score"] for doc in docs} == {
+        listing["_id"]: agent.score_listing(profile, listing)["score"] for listing in LISTINGS
+    }
+    collection.drop()
@@ -0,0 +1,101 @@
+# utils/cache.py
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Profile fields that define its content (ids and bookkeeping fields are excluded)
+PROFILE_CONTENT_FIELDS = (
+    "raw_profile_text",
+    "city",
+    "area",
+    "budget_PKR",
+    "sleep_schedule",
+    "cleanliness",
+    "noise_tolerance",
+    "study_habits",
+    "food_pref",
+    "context_notes",
+)
+
+
+def content_hash(obj: Any) -> str:
+    """Stable SHA-256 of any JSON-like object."""
+    payload = json.dumps(obj, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def profile_content_hash(profile: Dict[str, Any]) -> str:
+    """Hash of a profile's content, identical for a Mongo document and its API representation."""
+    return content_hash({field: profile.get(field) for field in PROFILE_CONTENT_FIELDS})
+
+
+def profile_id_of(profile: Dict[str, Any]) -> Optional[str]:
+    pid = profile.get("id", profile.get("_id"))
+    return str(pid) if pid is not None else None
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional TTL and hit/miss counters."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl_seconds: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Removes every entry for which predicate(key, value) is true."""
+        with self._lock:
+            doomed = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            for k in doomed:
+                del self._data[k]
+            return len(doomed)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -2,12 +2,16 @@ from jose import jwt
 from jose.exceptions import JWTError, ExpiredSignatureError
 from datetime import datetime, timedelta
 import os
+import secrets
+from typing import Any, Dict
 from fastapi import HTTPException, status, Depends, Cookie
 from fastapi.security import OAuth2PasswordBearer
 from routes.users.users_response_schemas import UserResponse
+from services.token_revocation import token_revocations
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", str(7 * 24 * 60)))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/token")
 
 
@@ -21,38 +25,40 @@ def create_access_token(user_id: str, username: str, email: str = None, listing_
         "is_verified": is_verified,
     }
 
-    # Only add expiration if explicitly requested
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-        payload["exp"] = expire
+    # Every token expires and carries an ID, so logout can revoke exactly this token
+    now = datetime.utcnow()
+    payload["jti"] = secrets.token_urlsafe(16)
+    payload["iat"] = now
+    payload["exp"] = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
 
     encoded_jwt = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# Dependency to get user from cookie
-def get_user_from_cookie(access_token: str = Cookie(None)):
+# Dependency to get the verified token claims from cookie (no database access)
+def get_token_payload(access_token: str = Cookie(None)) -> Dict[str, Any]:
     if not access_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     try:
         payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        user_id: str = payload.get("id")
-        email: str = payload.get("email")
-        listing_id = payload.get("listing_id")
-        profile_id = payload.get("profile_id")
-        is_verified = payload.get("is_verified", False)
-
-        if username is None or user_id is None:
-            raise HTTPException(status_code=401, detail="Could not validate credentials")
-        return UserResponse(
-            id=user_id, 
-            username=username, 
-            email=email,
-            listing_id=listing_id, 
-            profile_id=profile_id,
-            is_verified=is_verified
-        )
     except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except JWTError:
-        raise HTTPException(status_code=401, detail="Could not validate credentials")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+    # Tokens minted without an ID or expiry can't be revoked, so they are not accepted
+    if payload.get("sub") is None or payload.get("id") is None or not payload.get("jti") or "exp" not in payload:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    if token_revocations.is_revoked(payload["jti"]):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    return payload
+
+# Dependency to get user from cookie
+def get_user_from_cookie(payload: Dict[str, Any] = Depends(get_token_payload)):
+    return UserResponse(
+        id=payload["id"], 
+        username=payload["sub"], 
+        email=payload.get("email"),
+        listing_id=payload.get("listing_id"), 
+        profile_id=payload.get("profile_id"),
+        is_verified=payload.get("is_verified", False)
+    )
\ No newline at end of file
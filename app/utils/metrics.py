@@ -0,0 +1,199 @@
+# utils/metrics.py
+"""
+Prometheus metrics, served by GET /metrics.
+
+- http_request_duration_seconds{method, route, status}: route is the path template
+- mongo_command_duration_seconds{collection, command}: from a pymongo CommandListener
+  installed on both Mongo clients
+- llm_calls_total / llm_call_duration_seconds / llm_tokens_total{agent, model}:
+  recorded by the LLM gateway
+- agent_requests_total / agent_fallbacks_total / agent_provisional_total{agent}:
+  fallbacks / requests is each agent's fallback rate
+- cache_*{cache}: read from every registered cache's stats() at scrape time
+- threadpool_*{pool}: the anyio pool behind run_in_threadpool and sync routes, and the
+  asyncio default executor behind asyncio.to_thread
+- password_hash_*: the bcrypt process pool (latency, jobs in flight, jobs turned away)
+
+Each process keeps its own counters; with several uvicorn workers, scrape each one.
+"""
+import time
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency until the response starts",
+    ["method", "route", "status"],
+)
+
+# --- Mongo ---
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency",
+    ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+MONGO_COMMAND_FAILURES = Counter("mongo_command_failures_total", "Failed Mongo commands", ["collection", "command"])
+
+# --- LLM gateway ---
+LLM_CALLS = Counter("llm_calls_total", "LLM calls by outcome (success, error, rejected)", ["agent", "model", "outcome"])
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_duration_seconds", "LLM call latency, retries included",
+    ["agent", "model"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0),
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM", ["agent", "model", "kind"])
+LLM_RETRIES = Counter("llm_retries_total", "Retries after transient LLM failures", ["agent", "model"])
+LLM_BREAKER_OPEN = Gauge("llm_circuit_breaker_open", "1 while the LLM circuit breaker is open or half-open")
+
+# --- Agents ---
+AGENT_REQUESTS = Counter("agent_requests_total", "Agent results requested", ["agent"])
+AGENT_FALLBACKS = Counter("agent_fallbacks_total", "Agent results served by the rule-based path", ["agent"])
+AGENT_PROVISIONAL = Counter(
+    "agent_provisional_total", "Rule-based results returned because the LLM missed the latency budget", ["agent"]
+)
+
+# --- Password hashing ---
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "bcrypt job latency, time queued for a pool process included",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0, 10.0),
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge("password_hash_in_flight", "bcrypt jobs running or queued")
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "bcrypt jobs turned away because the queue was full", ["operation"]
+)
+PASSWORD_REHASHES = Counter("password_rehashes_total", "Stored hashes upgraded to the configured bcrypt cost")
+
+
+# --- HTTP middleware ---
+async def track_requests(request, call_next):
+    """Times every request under its route template (unmatched paths share one label)."""
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, getattr(route, "path", "unmatched"), status
+        ).observe(time.perf_counter() - started)
+
+
+# --- Mongo listener ---
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every command by collection; the collection is only known at start."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event) -> None:
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else "-"
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event) -> str:
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), "-")
+
+    def succeeded(self, event) -> None:
+        collection = self._finish(event)
+        MONGO_COMMAND_SECONDS.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        collection = self._finish(event)
+        MONGO_COMMAND_SECONDS.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+# --- Caches ---
+_caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_cache(name: str, cache: Any) -> None:
+    """Exports `cache.stats()` (an LRUCache, or a tiered cache with a `memory` LRU) as cache_* series."""
+    _caches[name] = cache.stats
+
+
+def _cache_counts(stats: Dict[str, Any]) -> Tuple[Dict[str, int], int, int]:
+    """(hits per tier, final misses, entries in memory)."""
+    if "memory" not in stats:
+        return {"memory": stats["hits"]}, stats["misses"], stats["size"]
+    memory = stats["memory"]
+    hits = {"memory": memory["hits"]}
+    if "mongo_hits" in stats:
+        hits["mongo"] = stats["mongo_hits"]
+    if "disk_hits" in stats:
+        hits["sqlite"] = stats["disk_hits"]
+    return hits, stats["misses"], memory["size"]
+
+
+class _CacheCollector:
+    def collect(self) -> Iterator:
+        hits = CounterMetricFamily("cache_hits", "Cache hits by tier", labels=["cache", "tier"])
+        misses = CounterMetricFamily("cache_misses", "Lookups no tier could answer", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Hits / lookups since start", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries in the in-memory tier", labels=["cache"])
+        for name, stats_fn in sorted(_caches.items()):
+            try:
+                tier_hits, miss_count, size = _cache_counts(stats_fn())
+            except Exception as e:
+                print(f"⚠ Metrics: could not read stats of cache '{name}': {e}")
+                continue
+            for tier, count in tier_hits.items():
+                hits.add_metric([name, tier], count)
+            misses.add_metric([name], miss_count)
+            lookups = sum(tier_hits.values()) + miss_count
+            ratio.add_metric([name], sum(tier_hits.values()) / lookups if lookups else 0.0)
+            entries.add_metric([name], size)
+        yield from (hits, misses, ratio, entries)
+
+
+# --- Thread pools ---
+class _ThreadpoolCollector:
+    """Read at scrape time; both pools belong to the event loop serving /metrics."""
+
+    def collect(self) -> Iterator:
+        busy = GaugeMetricFamily("threadpool_busy_threads", "Threads running a task", labels=["pool"])
+        limit = GaugeMetricFamily("threadpool_max_threads", "Pool size", labels=["pool"])
+        waiting = GaugeMetricFamily("threadpool_waiting_tasks", "Tasks queued for a free thread", labels=["pool"])
+        try:
+            from anyio.to_thread import current_default_thread_limiter
+
+            limiter = current_default_thread_limiter()
+            busy.add_metric(["anyio"], limiter.borrowed_tokens)
+            limit.add_metric(["anyio"], limiter.total_tokens)
+            waiting.add_metric(["anyio"], limiter.statistics().tasks_waiting)
+        except Exception:
+            pass  # No running event loop (e.g. a scrape from a worker thread)
+        try:
+            executor = getattr(asyncio.get_running_loop(), "_default_executor", None)
+        except RuntimeError:
+            executor = None
+        if executor is not None:
+            # ThreadPoolExecutor has no public counters: started threads minus the idle ones
+            idle = getattr(getattr(executor, "_idle_semaphore", None), "_value", 0)
+            busy.add_metric(["asyncio"], max(0, len(getattr(executor, "_threads", ())) - idle))
+            limit.add_metric(["asyncio"], getattr(executor, "_max_workers", 0))
+            waiting.add_metric(["asyncio"], executor._work_queue.qsize() if hasattr(executor, "_work_queue") else 0)
+        yield from (busy, limit, waiting)
+
+
+REGISTRY.register(_CacheCollector())
+REGISTRY.register(_ThreadpoolCollector())
+
+
+def render() -> Tuple[bytes, str]:
+    """(exposition body, content type) for the /metrics route."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
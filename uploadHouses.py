@@ -76,7 +76,9 @@ def create_housing_documents(listings: List[Dict]) -> List[Dict]:
             "listing_id": listing.get('listing_id', str(listing_obj_id)),
             **{k: v for k, v in listing.items() if k != 'listing_id'},
             "latitude": latitude,
-            "longitude": longitude
+            "longitude": longitude,
+            # GeoJSON point for the 2dsphere index ([longitude, latitude] order)
+            "location": {"type": "Point", "coordinates": [longitude, latitude]}
         }
         
         # Ensure rent and rooms are integers